@@ -0,0 +1,94 @@
+"""
+Set-based attendance writes for whole classes and staff lists.
+
+Inside one transaction, the submitted students or teachers are locked,
+one query validates their IDs and reads any attendance already recorded
+for the date, one conflict-aware INSERT ... ON CONFLICT DO UPDATE writes
+every row, and the daily summaries are adjusted per class.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from core.caching import ATTENDANCE, invalidate_namespace
+from core.dashboard import invalidate_attendance_chart
+
+from .models import AttendanceDailySummary, TeacherAttendance
+from .rollup import apply_counts
+
+
+def bulk_upsert_attendance(model, statuses, date, remarks='', recorded_by=None):
+    """
+    Create or update the attendance of many students (model=Attendance) or
+    teachers (model=TeacherAttendance) for one date.
+
+    `statuses` maps student/teacher IDs to a status; IDs that do not exist
+    and statuses that are not valid choices are skipped.
+    Returns a dict with 'created', 'updated' and the skipped 'invalid_ids'.
+    """
+    owner_field = 'teacher' if model is TeacherAttendance else 'student'
+    owner_model = model._meta.get_field(owner_field).related_model
+    date = model._meta.get_field('date').to_python(date)
+    valid_statuses = {value for value, _ in model.STATUS_CHOICES}
+
+    requested = {}
+    invalid_ids = []
+    for owner_id, status in statuses.items():
+        if str(owner_id).isdigit() and status in valid_statuses:
+            requested[int(owner_id)] = status
+        else:
+            invalid_ids.append(owner_id)
+
+    previous_status = model.objects.filter(**{owner_field: OuterRef('pk')}, date=date).values('status')[:1]
+    fields = ['pk', 'previous_status'] + (['class_name'] if owner_field == 'student' else [])
+    kind = AttendanceDailySummary.TEACHER if owner_field == 'teacher' else AttendanceDailySummary.STUDENT
+
+    records = []
+    created = updated = 0
+    summary_deltas = defaultdict(lambda: defaultdict(int))
+    with transaction.atomic():
+        # Lock the owners (in pk order, so concurrent submissions cannot
+        # deadlock) before reading their previous statuses: a concurrent
+        # submission for the same date waits here, then reads the statuses this
+        # one wrote, so no change is counted twice in the summaries. The read
+        # is a separate statement so it sees rows committed while waiting.
+        list(owner_model.objects.select_for_update().filter(pk__in=requested).order_by('pk').values_list('pk'))
+        owners = owner_model.objects.filter(pk__in=requested).annotate(
+            previous_status=Subquery(previous_status)
+        ).values(*fields)
+
+        for owner in owners:
+            status = requested.pop(owner['pk'])
+            records.append(model(
+                **{f'{owner_field}_id': owner['pk']},
+                date=date,
+                status=status,
+                remarks=remarks,
+                recorded_by=recorded_by,
+            ))
+            deltas = summary_deltas[owner.get('class_name', '')]
+            deltas[f'{status}_count'] += 1
+            if owner['previous_status']:
+                deltas[f"{owner['previous_status']}_count"] -= 1
+                updated += 1
+            else:
+                deltas['total_count'] += 1
+                created += 1
+
+        model.objects.bulk_create(
+            records,
+            update_conflicts=True,
+            unique_fields=[owner_field, 'date'],
+            update_fields=['status', 'remarks', 'recorded_by', 'updated_at'],
+        )
+        # bulk_create skips the signals that maintain the daily summaries
+        for class_name, deltas in summary_deltas.items():
+            apply_counts(kind, class_name, date, deltas)
+    invalid_ids.extend(requested)
+
+    if records:
+        # bulk_create sends no post_save either, so the caches are invalidated here
+        invalidate_attendance_chart(date)
+        invalidate_namespace(ATTENDANCE)
+    return {'created': created, 'updated': updated, 'invalid_ids': invalid_ids}
@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 from students.models import Student
 from school_teachers.models import Teacher
 from attendance.models import Attendance, TeacherAttendance
+from attendance.rollup import rebuild_daily_summaries
 from django.db import transaction
 from datetime import datetime, timedelta
 import random
@@ -65,6 +66,9 @@ class Command(BaseCommand):
         # Generate teacher attendance
         self.generate_teacher_attendance(teachers, start_date, end_date, admin_user)
         
+        # bulk_create skips the signals that maintain the daily summaries
+        rebuild_daily_summaries(start_date, end_date)
+        
         self.stdout.write(self.style.SUCCESS(f'Successfully generated attendance data from {start_date} to {end_date}'))
     
     def generate_student_attendance(self, students, start_date, end_date, admin_user):
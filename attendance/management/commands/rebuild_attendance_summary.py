@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from datetime import datetime
+
+from attendance.rollup import rebuild_daily_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily attendance summaries (per class and school-wide teacher totals) from raw attendance'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', help='First date to rebuild (YYYY-MM-DD); default: all history')
+        parser.add_argument('--end-date', help='Last date to rebuild (YYYY-MM-DD); default: all history')
+
+    def handle(self, *args, **options):
+        try:
+            start_date, end_date = (
+                datetime.strptime(options[key], '%Y-%m-%d').date() if options[key] else None
+                for key in ('start_date', 'end_date')
+            )
+        except ValueError:
+            raise CommandError('Dates must be in YYYY-MM-DD format')
+
+        rows = rebuild_daily_summaries(start_date, end_date)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} daily attendance summaries'))
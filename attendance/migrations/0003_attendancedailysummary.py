@@ -0,0 +1,59 @@
+# Generated by Django 5.2 on 2026-10-18 12:09
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+STATUSES = ('present', 'absent', 'late', 'half_day')
+
+
+def backfill_summaries(apps, schema_editor):
+    Attendance = apps.get_model('attendance', 'Attendance')
+    TeacherAttendance = apps.get_model('attendance', 'TeacherAttendance')
+    AttendanceDailySummary = apps.get_model('attendance', 'AttendanceDailySummary')
+
+    def grouped(queryset, *group_by):
+        return queryset.values(*group_by).annotate(
+            total_count=Count('pk'),
+            **{f'{status}_count': Count('pk', filter=Q(status=status)) for status in STATUSES}
+        ).order_by()
+
+    summaries = [
+        AttendanceDailySummary(kind='student', class_name=row.pop('student__class_name'), **row)
+        for row in grouped(Attendance.objects.all(), 'student__class_name', 'date')
+    ]
+    summaries += [
+        AttendanceDailySummary(kind='teacher', **row)
+        for row in grouped(TeacherAttendance.objects.all(), 'date')
+    ]
+    AttendanceDailySummary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0002_auto_20250507_1247'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceDailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('student', 'Student'), ('teacher', 'Teacher')], max_length=10)),
+                ('class_name', models.CharField(blank=True, default='', max_length=10)),
+                ('date', models.DateField()),
+                ('present_count', models.IntegerField(default=0)),
+                ('absent_count', models.IntegerField(default=0)),
+                ('late_count', models.IntegerField(default=0)),
+                ('half_day_count', models.IntegerField(default=0)),
+                ('total_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Attendance daily summaries',
+                'ordering': ['-date', 'class_name'],
+                'indexes': [models.Index(fields=['kind', 'date'], name='attendance__kind_352443_idx')],
+                'unique_together': {('kind', 'class_name', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
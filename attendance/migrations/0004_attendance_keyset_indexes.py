@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 12:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0003_attendancedailysummary'),
+        ('school_teachers', '0001_initial'),
+        ('students', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['date', 'id'], name='attendance_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teacherattendance',
+            index=models.Index(fields=['date', 'id'], name='teacher_att_date_id_idx'),
+        ),
+    ]
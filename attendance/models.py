@@ -22,6 +22,11 @@ class Attendance(models.Model):
     class Meta:
         ordering = ['-date', 'student__first_name']
         unique_together = ['student', 'date']
+        indexes = [
+            # Keyset pagination of the attendance list seeks on (date, id)
+            models.Index(fields=['date', 'id'], name='attendance_date_id_idx'),
+            models.Index(fields=['date', 'status'], name='attendance_date_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.first_name} {self.student.last_name} - {self.date} - {self.status}"
@@ -45,6 +50,7 @@ class TeacherAttendance(models.Model):
     class Meta:
         ordering = ['-date', 'teacher__first_name']
         unique_together = ['teacher', 'date']
+        indexes = [models.Index(fields=['date', 'id'], name='teacher_att_date_id_idx')]
 
     def __str__(self):
         return f"{self.teacher.first_name} {self.teacher.last_name} - {self.date} - {self.status}"
@@ -91,3 +97,39 @@ class AttendanceReport(models.Model):
         self.half_day_percentage = round((self.half_day_count / total) * 100, 2)
         
         super().save(*args, **kwargs)
+
+class AttendanceDailySummary(models.Model):
+    """
+    Daily attendance counts kept up to date by the signal handlers in
+    attendance.signals: one row per class per date for students, and one
+    school-wide row per date for teachers (class_name is blank).
+
+    Charts and class reports sum these rows instead of scanning Attendance,
+    so their cost grows with the number of days rather than records.
+    Rebuild with `manage.py rebuild_attendance_summary`.
+    """
+    STUDENT = 'student'
+    TEACHER = 'teacher'
+    KIND_CHOICES = [
+        (STUDENT, 'Student'),
+        (TEACHER, 'Teacher'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    class_name = models.CharField(max_length=10, blank=True, default='')
+    date = models.DateField()
+    present_count = models.IntegerField(default=0)
+    absent_count = models.IntegerField(default=0)
+    late_count = models.IntegerField(default=0)
+    half_day_count = models.IntegerField(default=0)
+    total_count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date', 'class_name']
+        unique_together = ['kind', 'class_name', 'date']
+        indexes = [models.Index(fields=['kind', 'date'])]
+        verbose_name_plural = 'Attendance daily summaries'
+
+    def __str__(self):
+        scope = f"Class {self.class_name}" if self.kind == self.STUDENT else 'Teachers'
+        return f"{scope} - {self.date} - {self.present_count}/{self.total_count} present"
@@ -0,0 +1,107 @@
+"""
+Keyset (seek) pagination for the attendance lists.
+
+Records are ordered newest first on (date, id) and each page starts from
+the (date, id) of the last row shown instead of an OFFSET, so page N costs
+the same indexed range scan as page 1. The total shown beside the list is
+counted once per filter combination and cached briefly in the 'attendance'
+cache namespace, which attendance writes invalidate.
+"""
+import hashlib
+from datetime import date
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from core.caching import ATTENDANCE, cache_key
+
+ATTENDANCE_PAGE_SIZE = 50
+LIST_COUNT_CACHE_TIMEOUT = 60  # 1 minute
+
+
+def encode_cursor(record):
+    return f'{record.date.isoformat()}_{record.pk}'
+
+
+def decode_cursor(value):
+    """
+    (date, id) from a cursor produced by encode_cursor(), or None if it is missing or malformed.
+    """
+    try:
+        day, pk = value.split('_')
+        return date.fromisoformat(day), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def cached_count(queryset):
+    """
+    COUNT(*) of a filtered queryset, cached for a minute per distinct query.
+    """
+    queryset = queryset.order_by()
+    key = cache_key(ATTENDANCE, 'list_count', hashlib.md5(str(queryset.query).encode()).hexdigest())
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, LIST_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+class KeysetPage:
+    """
+    One page of records with links to the neighbouring pages.
+
+    The links are query strings that keep the list's other GET parameters
+    (the filters) and replace the 'after'/'before' cursor.
+    """
+    def __init__(self, records, total_count, params, has_next, has_previous):
+        self.records = records
+        self.total_count = total_count
+        self.has_next = has_next and bool(records)
+        self.has_previous = has_previous and bool(records)
+        self.next_query = self._query(params, after=encode_cursor(records[-1])) if self.has_next else ''
+        self.previous_query = self._query(params, before=encode_cursor(records[0])) if self.has_previous else ''
+        self.first_query = self._query(params)
+
+    @staticmethod
+    def _query(params, **cursor):
+        params = params.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        params.update(cursor)
+        return params.urlencode()
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+
+def keyset_paginate(request, queryset, page_size=ATTENDANCE_PAGE_SIZE):
+    """
+    Return the KeysetPage of `queryset` selected by the request's 'after' or
+    'before' cursor, ordered by date and id, newest first.
+    """
+    after = decode_cursor(request.GET.get('after'))
+    before = decode_cursor(request.GET.get('before'))
+    total_count = cached_count(queryset)
+
+    if before:
+        day, pk = before
+        rows = list(
+            queryset.filter(Q(date__gt=day) | Q(date=day, pk__gt=pk)).order_by('date', 'id')[:page_size + 1]
+        )
+        has_previous = len(rows) > page_size
+        records = rows[:page_size][::-1]
+        has_next = True
+    else:
+        if after:
+            day, pk = after
+            queryset = queryset.filter(Q(date__lt=day) | Q(date=day, pk__lt=pk))
+        rows = list(queryset.order_by('-date', '-id')[:page_size + 1])
+        has_next = len(rows) > page_size
+        records = rows[:page_size]
+        has_previous = after is not None
+
+    return KeysetPage(records, total_count, request.GET, has_next, has_previous)
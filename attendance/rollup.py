@@ -0,0 +1,158 @@
+"""
+Maintenance and queries for the AttendanceDailySummary rollup.
+
+Single Attendance/TeacherAttendance saves and deletes adjust the matching
+summary row by +/-1 (see attendance.signals). Bulk writes that bypass
+signals either apply their own counts (attendance.bulk) or call
+rebuild_daily_summaries() for the dates they touched.
+
+Student rows are counted under the class the student is in when the
+attendance is recorded; a rebuild re-derives them from current classes.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Attendance, AttendanceDailySummary, TeacherAttendance
+from .stats import ATTENDANCE_STATUSES, stats_from_counts
+
+COUNT_FIELDS = [f'{status}_count' for status in ATTENDANCE_STATUSES]
+
+
+def summary_key(instance):
+    """
+    (kind, class_name, date, status) of the summary row an attendance record counts towards.
+    """
+    date = type(instance)._meta.get_field('date').to_python(instance.date)
+    if isinstance(instance, TeacherAttendance):
+        return (AttendanceDailySummary.TEACHER, '', date, instance.status)
+    return (AttendanceDailySummary.STUDENT, instance.student.class_name, date, instance.status)
+
+
+def previous_summary_key(instance):
+    """
+    The summary key of a record as currently stored, or None for a new record.
+    """
+    if not instance.pk:
+        return None
+    model = type(instance)
+    if model is TeacherAttendance:
+        row = model.objects.filter(pk=instance.pk).values('date', 'status').first()
+        return row and (AttendanceDailySummary.TEACHER, '', row['date'], row['status'])
+    row = model.objects.filter(pk=instance.pk).values('date', 'status', 'student__class_name').first()
+    return row and (AttendanceDailySummary.STUDENT, row['student__class_name'], row['date'], row['status'])
+
+
+def apply_counts(kind, class_name, date, deltas):
+    """
+    Add {'<field>': delta} to the counters of one summary row, creating the
+    row if needed, with a single UPDATE in the common case.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+
+    rows = AttendanceDailySummary.objects.filter(kind=kind, class_name=class_name, date=date)
+    if rows.update(**changes) or all(delta < 0 for delta in deltas.values()):
+        return
+    try:
+        with transaction.atomic():
+            AttendanceDailySummary.objects.create(kind=kind, class_name=class_name, date=date, **deltas)
+    except IntegrityError:
+        # Another request created the row first
+        rows.update(**changes)
+
+
+def apply_delta(key, delta):
+    """
+    Add `delta` to the total and status count of the summary row for `key`.
+    """
+    kind, class_name, date, status = key
+    deltas = {'total_count': delta}
+    if status in ATTENDANCE_STATUSES:
+        deltas[f'{status}_count'] = delta
+    apply_counts(kind, class_name, date, deltas)
+
+
+def _grouped_counts(queryset, *group_by):
+    return queryset.values(*group_by).annotate(
+        total_count=Count('pk'),
+        **{f'{status}_count': Count('pk', filter=Q(status=status)) for status in ATTENDANCE_STATUSES}
+    ).order_by()
+
+
+def rebuild_daily_summaries(start_date=None, end_date=None, dates=None):
+    """
+    Recompute summary rows from the raw attendance tables with one grouped
+    query per table. Limit the rebuild with a date range or a list of dates.
+    Returns the number of summary rows written.
+    """
+    date_filter = Q()
+    if start_date:
+        date_filter &= Q(date__gte=start_date)
+    if end_date:
+        date_filter &= Q(date__lte=end_date)
+    if dates is not None:
+        date_filter &= Q(date__in=list(dates))
+
+    with transaction.atomic():
+        AttendanceDailySummary.objects.filter(date_filter).delete()
+        summaries = [
+            AttendanceDailySummary(
+                kind=AttendanceDailySummary.STUDENT,
+                class_name=row.pop('student__class_name'),
+                **row
+            )
+            for row in _grouped_counts(Attendance.objects.filter(date_filter), 'student__class_name', 'date')
+        ]
+        summaries += [
+            AttendanceDailySummary(kind=AttendanceDailySummary.TEACHER, **row)
+            for row in _grouped_counts(TeacherAttendance.objects.filter(date_filter), 'date')
+        ]
+        AttendanceDailySummary.objects.bulk_create(summaries, batch_size=1000)
+    return len(summaries)
+
+
+def _summaries(kind, start_date, end_date, class_name=None):
+    rows = AttendanceDailySummary.objects.filter(kind=kind, date__gte=start_date, date__lte=end_date)
+    if class_name is not None:
+        rows = rows.filter(class_name=class_name)
+    return rows
+
+
+def daily_totals(kind, start_date, end_date, class_name=None):
+    """
+    {date: {'<status>_count': n, ..., 'total_count': n}} for each date that has attendance.
+    """
+    rows = _summaries(kind, start_date, end_date, class_name).values('date').annotate(
+        **{field: Sum(field) for field in COUNT_FIELDS + ['total_count']}
+    ).order_by()
+    return {row.pop('date'): row for row in rows}
+
+
+def summary_stats(kind, start_date, end_date, class_name=None):
+    """
+    Same figures as attendance.stats.attendance_stats(), summed from the rollup.
+    """
+    totals = _summaries(kind, start_date, end_date, class_name).aggregate(
+        **{field: Sum(field) for field in COUNT_FIELDS}
+    )
+    return stats_from_counts({field: value or 0 for field, value in totals.items()})
+
+
+def daily_present_absent(start_date, end_date):
+    """
+    Present/absent series for students and teachers, one entry per calendar
+    day from start_date to end_date, from two grouped queries on the rollup.
+    """
+    dates = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    series = {'dates': dates}
+    for kind in (AttendanceDailySummary.STUDENT, AttendanceDailySummary.TEACHER):
+        totals = daily_totals(kind, start_date, end_date)
+        for status in ('present', 'absent'):
+            series[f'{kind}_{status}'] = [
+                totals[day][f'{status}_count'] if day in totals else 0 for day in dates
+            ]
+    return series
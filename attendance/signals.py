@@ -0,0 +1,38 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Attendance, TeacherAttendance
+from .rollup import apply_delta, previous_summary_key, summary_key
+
+
+@receiver(pre_save, sender=Attendance)
+@receiver(pre_save, sender=TeacherAttendance)
+def remember_previous_summary(sender, instance, **kwargs):
+    instance._previous_summary_key = previous_summary_key(instance)
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_save, sender=TeacherAttendance)
+def update_summary_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_summary_key', None)
+    current = summary_key(instance)
+    if previous == current:
+        return
+    if previous is not None:
+        apply_delta(previous, -1)
+    apply_delta(current, 1)
+
+
+@receiver(pre_delete, sender=Attendance)
+@receiver(pre_delete, sender=TeacherAttendance)
+def remember_deleted_summary(sender, instance, **kwargs):
+    # Resolved before the delete, while a cascading student delete can still reach the class
+    instance._deleted_summary_key = summary_key(instance)
+
+
+@receiver(post_delete, sender=Attendance)
+@receiver(post_delete, sender=TeacherAttendance)
+def update_summary_on_delete(sender, instance, **kwargs):
+    apply_delta(instance._deleted_summary_key, -1)
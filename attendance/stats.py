@@ -0,0 +1,56 @@
+"""
+Attendance statistics shared by the reports, calendars and dashboards.
+
+All figures for a filtered Attendance or TeacherAttendance queryset come
+from one conditional aggregate query, and the attendance percentage always
+follows the same policy (settings.ATTENDANCE_PERCENTAGE_POLICY).
+"""
+from django.conf import settings
+from django.db.models import Count, Q
+
+ATTENDANCE_STATUSES = ('present', 'absent', 'late', 'half_day')
+
+# How much each status counts towards the attendance percentage
+DEFAULT_PERCENTAGE_POLICY = {
+    'present': 1,
+    'late': 1,
+    'half_day': 0.5,
+    'absent': 0,
+}
+
+
+def get_percentage_policy():
+    return getattr(settings, 'ATTENDANCE_PERCENTAGE_POLICY', DEFAULT_PERCENTAGE_POLICY)
+
+
+def stats_from_counts(counts, policy=None):
+    """
+    Build the statistics dict from '<status>_count' values.
+
+    Returns a dict with '<status>_count' and '<status>_percent' for every
+    status, 'total_days' and 'attendance_percentage'.
+    """
+    policy = get_percentage_policy() if policy is None else policy
+
+    result = {f'{status}_count': counts.get(f'{status}_count') or 0 for status in ATTENDANCE_STATUSES}
+    total = sum(result.values())
+    result['total_days'] = total
+    for status in ATTENDANCE_STATUSES:
+        result[f'{status}_percent'] = round(result[f'{status}_count'] / total * 100, 1) if total else 0.0
+
+    attended = sum(result[f'{status}_count'] * weight for status, weight in policy.items()
+                   if status in ATTENDANCE_STATUSES)
+    result['attendance_percentage'] = round(attended / total * 100, 2) if total else 0
+    return result
+
+
+def attendance_stats(queryset, policy=None):
+    """
+    Count records by status with one conditional aggregate query and work
+    out the attendance percentage (see stats_from_counts).
+    """
+    counts = queryset.order_by().aggregate(**{
+        f'{status}_count': Count('pk', filter=Q(status=status))
+        for status in ATTENDANCE_STATUSES
+    })
+    return stats_from_counts(counts, policy)
@@ -1,3 +1,363 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import urlencode
+from datetime import date, timedelta
+import csv
+import io
 
-# Create your tests here.
+from school_teachers.models import Teacher
+from students.models import Student
+from .bulk import bulk_upsert_attendance
+from .models import Attendance, AttendanceDailySummary, TeacherAttendance
+from .rollup import daily_present_absent, rebuild_daily_summaries
+from .stats import attendance_stats
+
+
+class AttendanceStatsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='adminuser',
+            password='adminpass',
+            is_staff=True
+        )
+        self.student = Student.objects.create(
+            first_name='Test',
+            last_name='Student',
+            roll_number='ST001',
+            date_of_birth=date(2010, 1, 1),
+            gender='M',
+            class_name='1',
+            address='Test Address',
+            phone_number='1234567890',
+            parent_name='Parent Name',
+            parent_phone='1234567890'
+        )
+        start = date(2024, 4, 1)
+        for offset, status in enumerate(['present', 'present', 'late', 'half_day', 'absent']):
+            Attendance.objects.create(
+                student=self.student,
+                date=start + timedelta(days=offset),
+                status=status,
+                recorded_by=self.user
+            )
+
+    def test_counts_in_one_query(self):
+        """Test that all counts and the percentage come from a single query"""
+        with self.assertNumQueries(1):
+            stats = attendance_stats(Attendance.objects.filter(student=self.student))
+
+        self.assertEqual(stats['present_count'], 2)
+        self.assertEqual(stats['late_count'], 1)
+        self.assertEqual(stats['half_day_count'], 1)
+        self.assertEqual(stats['absent_count'], 1)
+        self.assertEqual(stats['total_days'], 5)
+        self.assertEqual(stats['present_percent'], 40.0)
+        # present + late + half of half_day
+        self.assertEqual(stats['attendance_percentage'], 70.0)
+
+    @override_settings(ATTENDANCE_PERCENTAGE_POLICY={'present': 1})
+    def test_percentage_policy_is_configurable(self):
+        """Test that the percentage follows ATTENDANCE_PERCENTAGE_POLICY"""
+        stats = attendance_stats(Attendance.objects.all())
+        self.assertEqual(stats['attendance_percentage'], 40.0)
+
+    def test_empty_queryset(self):
+        """Test that an empty queryset gives zeroes"""
+        stats = attendance_stats(Attendance.objects.none())
+        self.assertEqual(stats['total_days'], 0)
+        self.assertEqual(stats['attendance_percentage'], 0)
+
+    def test_report_uses_shared_stats(self):
+        """Test that the student report shows the shared figures"""
+        self.client.login(username='adminuser', password='adminpass')
+        response = self.client.get(reverse('attendance:attendance_report'), {
+            'report_type': 'student',
+            'student_id': self.student.id,
+            'start_date': '2024-04-01',
+            'end_date': '2024-04-30',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_days'], 5)
+        self.assertEqual(response.context['attendance_percentage'], 70.0)
+
+
+class AttendanceDailySummaryTest(TestCase):
+    def setUp(self):
+        self.student = Student.objects.create(
+            first_name='Roll',
+            last_name='Up',
+            roll_number='RU001',
+            date_of_birth=date(2010, 1, 1),
+            gender='F',
+            class_name='4',
+            address='Test Address',
+            phone_number='1234567890',
+            parent_name='Parent Name',
+            parent_phone='1234567890'
+        )
+        self.day = date(2024, 5, 6)
+
+    def summary(self):
+        return AttendanceDailySummary.objects.get(
+            kind=AttendanceDailySummary.STUDENT, class_name='4', date=self.day
+        )
+
+    def test_summary_follows_create_edit_delete(self):
+        """Test that saves and deletes keep the class summary in step"""
+        record = Attendance.objects.create(student=self.student, date=self.day, status='present')
+        self.assertEqual((self.summary().present_count, self.summary().total_count), (1, 1))
+
+        record.status = 'absent'
+        record.save()
+        summary = self.summary()
+        self.assertEqual((summary.present_count, summary.absent_count, summary.total_count), (0, 1, 1))
+
+        record.delete()
+        self.assertEqual(self.summary().total_count, 0)
+
+    def test_rebuild_matches_incremental_counts(self):
+        """Test that a rebuild reproduces the incrementally maintained rows"""
+        Attendance.objects.create(student=self.student, date=self.day, status='late')
+        incremental = list(AttendanceDailySummary.objects.values())
+
+        self.assertEqual(rebuild_daily_summaries(), 1)
+        rebuilt = list(AttendanceDailySummary.objects.values())
+        for row in incremental + rebuilt:
+            row.pop('id')
+        self.assertEqual(incremental, rebuilt)
+
+    def test_range_series_reads_rollup(self):
+        """Test that a range chart costs two queries however many records exist"""
+        Attendance.objects.create(student=self.student, date=self.day, status='present')
+        with self.assertNumQueries(2):
+            series = daily_present_absent(self.day - timedelta(days=364), self.day)
+
+        self.assertEqual(len(series['dates']), 365)
+        self.assertEqual(series['student_present'][-1], 1)
+        self.assertEqual(sum(series['teacher_present']), 0)
+
+
+class BulkAttendanceUpsertTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='adminuser',
+            password='adminpass',
+            is_staff=True
+        )
+        self.students = Student.objects.bulk_create([
+            Student(
+                first_name=f'Student{i}',
+                last_name='Bulk',
+                roll_number=f'BK{i:03d}',
+                date_of_birth=date(2010, 1, 1),
+                gender='M',
+                class_name='5',
+                address='Test Address',
+                phone_number='1234567890',
+                parent_name='Parent Name',
+                parent_phone='1234567890'
+            )
+            for i in range(60)
+        ])
+        self.day = date(2024, 6, 3)
+
+    def data_queries(self, captured):
+        return [q['sql'] for q in captured.captured_queries if 'SAVEPOINT' not in q['sql']]
+
+    def test_class_submission_is_set_based(self):
+        """Test that a 60-student class is written with a handful of queries"""
+        statuses = {student.id: 'present' for student in self.students}
+        bulk_upsert_attendance(Attendance, statuses, self.day, recorded_by=self.user)
+
+        statuses[self.students[0].id] = 'absent'
+        with CaptureQueriesContext(connection) as captured:
+            result = bulk_upsert_attendance(Attendance, statuses, self.day, recorded_by=self.user)
+
+        # Lock the students, validate IDs, upsert, adjust the class summary
+        self.assertEqual(len(self.data_queries(captured)), 4)
+        self.assertEqual((result['created'], result['updated']), (0, 60))
+        self.assertEqual(Attendance.objects.filter(date=self.day).count(), 60)
+        summary = AttendanceDailySummary.objects.get(class_name='5', date=self.day)
+        self.assertEqual((summary.present_count, summary.absent_count, summary.total_count), (59, 1, 60))
+
+    def test_invalid_ids_and_statuses_are_skipped(self):
+        """Test that unknown students and bad statuses are reported, not written"""
+        result = bulk_upsert_attendance(Attendance, {
+            self.students[0].id: 'present',
+            self.students[1].id: 'sleeping',
+            999999: 'present',
+        }, '2024-06-03', recorded_by=self.user)
+
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(sorted(map(str, result['invalid_ids'])), sorted(['999999', str(self.students[1].id)]))
+
+    def test_take_attendance_view_reports_counts(self):
+        """Test that the take-attendance form writes through the bulk upsert"""
+        Attendance.objects.create(student=self.students[0], date=self.day, status='absent')
+        self.client.login(username='adminuser', password='adminpass')
+        data = {
+            'submit_attendance': '1',
+            'class_name': '5',
+            'date': '2024-06-03',
+            'student_ids': [student.id for student in self.students[:3]],
+        }
+        data.update({f'status_{student.id}': 'present' for student in self.students[:3]})
+        response = self.client.post(reverse('attendance:create'), data, follow=True)
+
+        self.assertContains(response, '2 created, 1 updated')
+        self.assertEqual(Attendance.objects.filter(date=self.day, status='present').count(), 3)
+
+
+class AttendanceExportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='adminuser',
+            password='adminpass',
+            first_name='Admin',
+            last_name='User',
+            is_staff=True
+        )
+        self.student = Student.objects.create(
+            first_name='Export',
+            last_name='Student',
+            roll_number='EX001',
+            date_of_birth=date(2010, 1, 1),
+            gender='M',
+            class_name='3',
+            address='Test Address',
+            phone_number='1234567890',
+            parent_name='Parent Name',
+            parent_phone='1234567890'
+        )
+        self.teacher = Teacher.objects.create(
+            first_name='Export',
+            last_name='Teacher',
+            employee_id='EMP100',
+            gender='F',
+            date_of_birth=date(1985, 1, 1),
+            email='export.teacher@example.com',
+            phone_number='1234567890',
+            address='Test Address',
+            qualification='M.Ed',
+            specialization='Maths',
+            joining_date=date(2015, 6, 1)
+        )
+        start = date(2024, 7, 1)
+        for offset in range(3):
+            Attendance.objects.create(
+                student=self.student,
+                date=start + timedelta(days=offset),
+                status='present' if offset else 'half_day',
+                remarks='' if offset else 'Left early',
+                recorded_by=self.user if offset else None
+            )
+        TeacherAttendance.objects.create(teacher=self.teacher, date=start, status='late', recorded_by=self.user)
+        self.client.login(username='adminuser', password='adminpass')
+
+    def rows(self, response):
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeff'))
+        return list(csv.reader(io.StringIO(content[1:])))
+
+    def test_student_export_streams_rows(self):
+        """Test that the student export streams labelled rows, newest first"""
+        response = self.client.get(reverse('attendance:download_all'), {'class_name': '3'})
+
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="attendance_records_', response['Content-Disposition'])
+        rows = self.rows(response)
+        self.assertEqual(rows[0], ['Student Attendance Records'])
+        self.assertIn(['Class: Class 3'], rows)
+        header = rows.index(['Date', 'Student Name', 'Roll Number', 'Class', 'Attendance Status', 'Remarks', 'Recorded By'])
+        data = rows[header + 1:]
+        self.assertEqual(len(data), 3)
+        self.assertEqual(data[0], ['03/07/2024', 'Export Student', 'EX001', 'Class 3', 'Present', '', 'Admin User'])
+        self.assertEqual(data[-1], ['01/07/2024', 'Export Student', 'EX001', 'Class 3', 'Half Day', 'Left early', 'System'])
+
+    def test_teacher_export(self):
+        """Test that teacher attendance streams through the same path"""
+        response = self.client.get(reverse('attendance:teacher_download_all'), {'status': 'late'})
+
+        self.assertTrue(response.streaming)
+        rows = self.rows(response)
+        self.assertEqual(rows[0], ['Teacher Attendance Records'])
+        self.assertEqual(rows[-1], ['01/07/2024', 'Export Teacher', 'EMP100', 'Late', '', 'Admin User'])
+
+
+class AttendanceListPaginationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='adminuser',
+            password='adminpass',
+            is_staff=True
+        )
+        self.students = Student.objects.bulk_create([
+            Student(
+                first_name=f'Student{i}',
+                last_name='Page',
+                roll_number=f'PG{i:03d}',
+                date_of_birth=date(2010, 1, 1),
+                gender='M',
+                class_name='6' if i % 2 else '7',
+                address='Test Address',
+                phone_number='1234567890',
+                parent_name='Parent Name',
+                parent_phone='1234567890'
+            )
+            for i in range(30)
+        ])
+        # 30 students x 4 days = 120 records, 60 of them in class 6
+        Attendance.objects.bulk_create([
+            Attendance(student=student, date=date(2024, 8, 1) + timedelta(days=day), status='present')
+            for student in self.students
+            for day in range(4)
+        ])
+        self.client.login(username='adminuser', password='adminpass')
+
+    def walk(self, params):
+        """Follow the 'Older' links from the first page and return every page's records"""
+        pages = []
+        query = urlencode(params)
+        while True:
+            response = self.client.get(reverse('attendance:list') + '?' + query)
+            page = response.context['page']
+            pages.append(list(page))
+            if not page.has_next:
+                return pages
+            query = page.next_query
+
+    def test_pages_cover_filtered_records_once(self):
+        """Test that seeking through the pages visits each filtered record once, newest first"""
+        pages = self.walk({'class_name': '6'})
+
+        self.assertEqual([len(records) for records in pages], [50, 10])
+        records = [record for records in pages for record in records]
+        self.assertEqual(len({record.pk for record in records}), 60)
+        self.assertTrue(all(record.student.class_name == '6' for record in records))
+        keys = [(record.date, record.pk) for record in records]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_previous_link_returns_first_page(self):
+        """Test that the 'Newer' link from page two leads back to page one"""
+        first = self.client.get(reverse('attendance:list')).context['page']
+        second = self.client.get(reverse('attendance:list') + '?' + first.next_query).context['page']
+        back = self.client.get(reverse('attendance:list') + '?' + second.previous_query).context['page']
+
+        self.assertEqual([record.pk for record in back], [record.pk for record in first])
+        self.assertFalse(back.has_previous)
+        self.assertEqual(back.total_count, 120)
+
+    def test_later_pages_cost_the_same_as_the_first(self):
+        """Test that a deep page runs the same queries as page one, with the count cached"""
+        first = self.client.get(reverse('attendance:list'))
+        with CaptureQueriesContext(connection) as first_page:
+            self.client.get(reverse('attendance:list'))
+        with CaptureQueriesContext(connection) as next_page:
+            self.client.get(reverse('attendance:list') + '?' + first.context['page'].next_query)
+
+        self.assertEqual(len(next_page), len(first_page))
+        self.assertFalse(any('COUNT(' in query['sql'] for query in next_page.captured_queries))
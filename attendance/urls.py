@@ -21,6 +21,7 @@ urlpatterns = [
     path('teacher/bulk-create/', views.teacher_attendance_bulk_create, name='teacher_attendance_bulk_create'),
     path('teacher/edit/<int:pk>/', views.teacher_attendance_edit, name='teacher_attendance_edit'),
     path('teacher/delete/<int:pk>/', views.teacher_attendance_delete, name='teacher_attendance_delete'),
+    path('teacher/download/all/', views.download_teacher_attendance_records, name='teacher_download_all'),
     path('teacher/<int:pk>/', views.teacher_attendance_detail, name='teacher_attendance_detail'),
 
     # Reports
@@ -1,11 +1,17 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 from datetime import datetime, timedelta
 from students.models import Student
-from .models import Attendance, AttendanceReport, TeacherAttendance
+from .models import Attendance, AttendanceDailySummary, AttendanceReport, TeacherAttendance
 from .forms import AttendanceForm
+from .bulk import bulk_upsert_attendance
+from .export import csv_download_response, student_attendance_rows, teacher_attendance_rows
+from .pagination import keyset_paginate
+from .rollup import summary_stats
+from .stats import attendance_stats
 from core.decorators import new_user_restricted, admin_required
 from school_teachers.models import Teacher
 from django.contrib.auth.models import User
@@ -15,8 +21,6 @@ import locale
 from datetime import date
 from django.http import JsonResponse
 from django.db.models import Count
-import csv
-from django.http import HttpResponse
 
 # Student Attendance Views
 @login_required
@@ -46,40 +50,29 @@ def attendance_create(request):
         student_ids = request.POST.getlist('student_ids')
         
         if student_ids and date_value:
-            success_count = 0
-            for student_id in student_ids:
-                status = request.POST.get(f'status_{student_id}')
-                if status:
-                    student = get_object_or_404(Student, id=student_id)
-                    
-                    # Check if attendance already exists
-                    existing_attendance = Attendance.objects.filter(
-                        student=student,
-                        date=date_value
-                    ).first()
-                    
-                    if existing_attendance:
-                        # Update existing record
-                        existing_attendance.status = status
-                        existing_attendance.remarks = remarks
-                        existing_attendance.recorded_by = request.user
-                        existing_attendance.save()
-                    else:
-                        # Create new record
-                        Attendance.objects.create(
-                            student=student,
-                            date=date_value,
-                            status=status,
-                            remarks=remarks,
-                            recorded_by=request.user
-                        )
-                    success_count += 1
-            
-            if success_count > 0:
-                messages.success(request, f"Attendance recorded successfully for {success_count} students.")
-                return redirect('attendance:list')
+            statuses = {
+                student_id: request.POST.get(f'status_{student_id}')
+                for student_id in student_ids
+                if request.POST.get(f'status_{student_id}')
+            }
+            try:
+                # Validates the students and writes every record in one upsert
+                result = bulk_upsert_attendance(Attendance, statuses, date_value, remarks, request.user)
+            except ValidationError:
+                messages.error(request, "Please enter a valid date.")
             else:
-                messages.error(request, "No attendance records were created. Please select status for students.")
+                if result['invalid_ids']:
+                    messages.warning(request, f"Skipped {len(result['invalid_ids'])} unknown student(s) or invalid status(es).")
+                success_count = result['created'] + result['updated']
+                if success_count > 0:
+                    messages.success(
+                        request,
+                        f"Attendance recorded successfully for {success_count} students "
+                        f"({result['created']} created, {result['updated']} updated)."
+                    )
+                    return redirect('attendance:list')
+                else:
+                    messages.error(request, "No attendance records were created. Please select status for students.")
     
     # Pass variables needed by the template
     context = {
@@ -130,11 +123,12 @@ def attendance_list(request):
     if date_to:
         attendance_records = attendance_records.filter(date__lte=date_to)
     
-    # Order by date (newest first)
-    attendance_records = attendance_records.order_by('-date')
+    # One page at a time, newest first
+    page = keyset_paginate(request, attendance_records)
     
     return render(request, 'attendance/attendance_list.html', {
-        'attendance_records': attendance_records,
+        'attendance_records': page,
+        'page': page,
         'class_choices': class_choices,
         'is_student': is_student
     })
@@ -144,53 +138,10 @@ def download_attendance_records(request):
     """
     View to download attendance records as a CSV file
     Supports the same filters as the attendance list view
+    The file is streamed in chunks so large exports use constant memory
     """
-    # Initialize response for CSV download with BOM for Excel compatibility
-    response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    response['Content-Disposition'] = f'attachment; filename="attendance_records_{timestamp}.csv"'
-    
-    # Create CSV writer
-    writer = csv.writer(response)
-    
-    # Write title and generation info
-    current_time = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
-    writer.writerow(['Student Attendance Records'])
-    writer.writerow([f'Generated on: {current_time}'])
-    
-    # Add filter information
-    class_name = request.GET.get('class_name')
-    status = request.GET.get('status')
-    date_from = request.GET.get('date_from')
-    date_to = request.GET.get('date_to')
-    
-    writer.writerow(['Filter criteria:'])
-    if class_name:
-        class_display = dict(Student.CLASS_CHOICES).get(class_name, class_name)
-        writer.writerow([f'Class: {class_display}'])
-    if status:
-        status_display = dict(Attendance.STATUS_CHOICES).get(status, status.title())
-        writer.writerow([f'Status: {status_display}'])
-    if date_from:
-        writer.writerow([f'From Date: {date_from}'])
-    if date_to:
-        writer.writerow([f'To Date: {date_to}'])
-    
-    writer.writerow([]) # Empty row as separator
-    
-    # Write headers with clear column names
-    writer.writerow([
-        'Date', 
-        'Student Name', 
-        'Roll Number', 
-        'Class', 
-        'Attendance Status', 
-        'Remarks', 
-        'Recorded By'
-    ])
-    
     # Initialize queryset
-    attendance_records = Attendance.objects.all().select_related('student', 'recorded_by')
+    attendance_records = Attendance.objects.all()
     
     # Check if the user is a student
     is_student = hasattr(request, 'user_type') and request.user_type == 'student'
@@ -206,46 +157,74 @@ def download_attendance_records(request):
     date_from = request.GET.get('date_from')
     date_to = request.GET.get('date_to')
     
+    # Filter information for the header block
+    filters = []
     if class_name:
         attendance_records = attendance_records.filter(student__class_name=class_name)
+        filters.append(('Class', dict(Student.CLASS_CHOICES).get(class_name, class_name)))
     
     if status:
         attendance_records = attendance_records.filter(status=status)
+        filters.append(('Status', dict(Attendance.STATUS_CHOICES).get(status, status.title())))
     
     if date_from:
         attendance_records = attendance_records.filter(date__gte=date_from)
+        filters.append(('From Date', date_from))
     
     if date_to:
         attendance_records = attendance_records.filter(date__lte=date_to)
+        filters.append(('To Date', date_to))
     
     # Order by date (newest first)
-    attendance_records = attendance_records.order_by('-date')
+    attendance_records = attendance_records.order_by('-date', '-id')
+    
+    return csv_download_response(
+        'attendance_records',
+        'Student Attendance Records',
+        filters,
+        student_attendance_rows(attendance_records)
+    )
+
+@login_required
+@admin_required
+def download_teacher_attendance_records(request):
+    """
+    View to download teacher attendance records as a CSV file - Admin only
+    Supports the same filters as the teacher attendance list view
+    """
+    teacher_id = request.GET.get('teacher')
+    status = request.GET.get('status')
+    date_from = request.GET.get('date_from')
+    date_to = request.GET.get('date_to')
     
-    # Write data rows
-    for record in attendance_records:
-        # Format the date as DD/MM/YYYY for better readability in CSV
-        formatted_date = record.date.strftime("%d/%m/%Y") if record.date else ""
-        
-        # Handle the recorded_by field properly
-        if record.recorded_by:
-            if record.recorded_by.get_full_name().strip():
-                recorded_by = record.recorded_by.get_full_name()
-            else:
-                recorded_by = record.recorded_by.username
-        else:
-            recorded_by = "System"
-            
-        writer.writerow([
-            formatted_date,
-            f"{record.student.first_name} {record.student.last_name}",
-            record.student.roll_number,
-            record.student.get_class_name_display(),
-            record.get_status_display(),
-            record.remarks or "",
-            recorded_by
-        ])
-    
-    return response
+    attendance_records = TeacherAttendance.objects.all()
+    
+    filters = []
+    if teacher_id:
+        attendance_records = attendance_records.filter(teacher_id=teacher_id)
+        teacher = Teacher.objects.filter(pk=teacher_id).first()
+        filters.append(('Teacher', teacher or teacher_id))
+    
+    if status:
+        attendance_records = attendance_records.filter(status=status)
+        filters.append(('Status', dict(TeacherAttendance.STATUS_CHOICES).get(status, status.title())))
+    
+    if date_from:
+        attendance_records = attendance_records.filter(date__gte=date_from)
+        filters.append(('From Date', date_from))
+    
+    if date_to:
+        attendance_records = attendance_records.filter(date__lte=date_to)
+        filters.append(('To Date', date_to))
+    
+    attendance_records = attendance_records.order_by('-date', '-id')
+    
+    return csv_download_response(
+        'teacher_attendance_records',
+        'Teacher Attendance Records',
+        filters,
+        teacher_attendance_rows(attendance_records)
+    )
 
 @login_required
 def attendance_detail(request, pk):
@@ -349,35 +328,24 @@ def attendance_bulk_create(request):
         if class_name and date_value and status:
             try:
                 # Get all active students in the selected class
-                students = Student.objects.filter(class_name=class_name, is_active=True)
+                student_ids = Student.objects.filter(class_name=class_name, is_active=True).values_list('id', flat=True)
+                statuses = dict.fromkeys(student_ids, status)
                 
-                if students.exists():
-                    success_count = 0
-                    error_count = 0
-                    
-                    # Process attendance for each student
-                    for student in students:
-                        try:
-                            # Check if an attendance record already exists for this student on this date
-                            attendance, created = Attendance.objects.update_or_create(
-                                student=student,
-                                date=date_value,
-                                defaults={
-                                    'status': status,
-                                    'remarks': remarks,
-                                    'recorded_by': request.user
-                                }
-                            )
-                            success_count += 1
-                        except Exception as e:
-                            error_count += 1
-                            messages.error(request, f"Error recording attendance for {student.first_name}: {str(e)}")
+                if statuses:
+                    # Write the whole class in one upsert
+                    result = bulk_upsert_attendance(Attendance, statuses, date_value, remarks, request.user)
+                    success_count = result['created'] + result['updated']
                     
                     # Show appropriate message based on results
                     if success_count > 0:
-                        messages.success(request, f"Successfully recorded attendance for {success_count} student(s) in {dict(class_choices).get(class_name)} class.")
-                        if error_count > 0:
-                            messages.warning(request, f"Failed to record attendance for {error_count} student(s).")
+                        messages.success(
+                            request,
+                            f"Successfully recorded attendance for {success_count} student(s) in "
+                            f"{dict(class_choices).get(class_name)} class ({result['created']} created, "
+                            f"{result['updated']} updated)."
+                        )
+                    else:
+                        messages.error(request, "Please select a valid attendance status.")
                     return redirect('attendance:list')
                 else:
                     messages.warning(request, f"No active students found in the selected class.")
@@ -460,7 +428,7 @@ def teacher_attendance_list(request):
     date_to = request.GET.get('date_to')
     
     # Start with all attendance records
-    attendance_records = TeacherAttendance.objects.all()
+    attendance_records = TeacherAttendance.objects.select_related('teacher', 'recorded_by')
     
     # Apply filters if provided
     if teacher_id:
@@ -475,11 +443,15 @@ def teacher_attendance_list(request):
     if date_to:
         attendance_records = attendance_records.filter(date__lte=date_to)
     
+    # One page at a time, newest first
+    page = keyset_paginate(request, attendance_records)
+    
     # Get all teachers for the filter dropdown
     teachers = Teacher.objects.all()
     
     context = {
-        'attendance_records': attendance_records,
+        'attendance_records': page,
+        'page': page,
         'teachers': teachers,
         'statuses': TeacherAttendance.STATUS_CHOICES,
         'selected_teacher': teacher_id,
@@ -564,36 +536,20 @@ def teacher_attendance_bulk_create(request):
                 'today': timezone.now().date(),
             })
         
-        # Process each teacher
+        # Validate the teachers and write every record in one upsert
         success_count = 0
         update_count = 0
         
-        for teacher_id in teacher_ids:
-            try:
-                teacher = get_object_or_404(Teacher, id=teacher_id)
-                
-                # Check if attendance already exists for this teacher on this date
-                existing_attendance = TeacherAttendance.objects.filter(teacher=teacher, date=date).first()
-                
-                if existing_attendance:
-                    # Update existing record
-                    existing_attendance.status = status
-                    existing_attendance.remarks = remarks
-                    existing_attendance.recorded_by = request.user
-                    existing_attendance.save()
-                    update_count += 1
-                else:
-                    # Create new attendance record
-                    TeacherAttendance.objects.create(
-                        teacher=teacher,
-                        date=date,
-                        status=status,
-                        remarks=remarks,
-                        recorded_by=request.user
-                    )
-                    success_count += 1
-            except Exception as e:
-                messages.error(request, f"Error recording attendance for teacher ID {teacher_id}: {str(e)}")
+        try:
+            result = bulk_upsert_attendance(
+                TeacherAttendance, dict.fromkeys(teacher_ids, status), date, remarks, request.user
+            )
+            success_count = result['created']
+            update_count = result['updated']
+            if result['invalid_ids']:
+                messages.error(request, f"Could not record attendance for teacher ID(s): {', '.join(map(str, result['invalid_ids']))}")
+        except ValidationError:
+            messages.error(request, "Please enter a valid date.")
         
         if success_count > 0 or update_count > 0:
             message_parts = []
@@ -658,22 +614,10 @@ def attendance_report(request):
             teacher_query = Q(teacher=teacher) & date_range_query
             attendance_records = TeacherAttendance.objects.filter(teacher_query).order_by('-date')
             
-            # Calculate statistics for teacher attendance
-            present_count = attendance_records.filter(status='present').count()
-            absent_count = attendance_records.filter(status='absent').count()
-            late_count = attendance_records.filter(status='late').count()
-            half_day_count = attendance_records.filter(status='half_day').count()
-            total_records = attendance_records.count()
-            
             context.update({
                 'teacher_name': f"{teacher.first_name} {teacher.last_name}",
                 'teacher_id': teacher_id,
                 'attendance_records': attendance_records,
-                'present_count': present_count,
-                'absent_count': absent_count,
-                'late_count': late_count,
-                'half_day_count': half_day_count,
-                'total_days': total_records,
                 'is_teacher_report': True
             })
         else:
@@ -706,29 +650,13 @@ def attendance_report(request):
             attendance_records = Attendance.objects.filter(attendance_query).order_by('-date')
             context['attendance_records'] = attendance_records
             context['is_teacher_report'] = False
-            
-            # Calculate statistics
-            present_count = attendance_records.filter(status='present').count()
-            absent_count = attendance_records.filter(status='absent').count()
-            late_count = attendance_records.filter(status='late').count()
-            half_day_count = attendance_records.filter(status='half_day').count()
-            total_records = attendance_records.count()
-            
-            context.update({
-                'present_count': present_count,
-                'absent_count': absent_count,
-                'late_count': late_count,
-                'half_day_count': half_day_count,
-                'total_days': total_records,
-            })
         
-        # Calculate attendance percentage (same calculation for both teacher and student)
-        if total_records > 0:
-            # Consider present and late as attendance
-            attendance_percentage = round(((present_count + late_count) / total_records) * 100, 2)
-            context['attendance_percentage'] = attendance_percentage
+        # Counts by status and attendance percentage (same calculation for both teacher and student)
+        if report_type == 'class':
+            # Class totals are summed from the daily rollup instead of scanning every record
+            context.update(summary_stats(AttendanceDailySummary.STUDENT, start_date, end_date, class_name))
         else:
-            context['attendance_percentage'] = 0
+            context.update(attendance_stats(attendance_records))
             
     return render(request, 'attendance/attendance_report.html', context)
 
@@ -770,17 +698,14 @@ def teacher_attendance_report(request):
             ).order_by('date')
             
             # Calculate statistics
-            total_records = attendance_records.count()
-            if total_records > 0:
-                present_count = attendance_records.filter(status='present').count()
-                absent_count = attendance_records.filter(status='absent').count()
-                late_count = attendance_records.filter(status='late').count()
-                half_day_count = attendance_records.filter(status='half_day').count()
-                
-                # Calculate attendance percentage (present + late + half_day) / total
-                attendance_percentage = round(((present_count + late_count + (half_day_count * 0.5)) / total_records) * 100, 2)
+            stats = attendance_stats(attendance_records)
+            present_count = stats['present_count']
+            absent_count = stats['absent_count']
+            late_count = stats['late_count']
+            half_day_count = stats['half_day_count']
+            attendance_percentage = stats['attendance_percentage']
             
-            if not attendance_records:
+            if not stats['total_days']:
                 messages.info(request, f"No attendance records found for {selected_teacher.get_full_name()} in the selected date range.")
             
         except User.DoesNotExist:
@@ -848,12 +773,8 @@ def attendance_calendar(request):
         next_month = month + 1
         next_year = year
     
-    # Initialize attendance data and statistics
-    present_count = 0
-    absent_count = 0
-    late_count = 0
-    half_day_count = 0
-    total_days = 0
+    # Initialize attendance statistics
+    stats = attendance_stats(Attendance.objects.none())
     
     # Get calendar data for the selected month/year
     cal = calendar.monthcalendar(year, month)
@@ -878,25 +799,12 @@ def attendance_calendar(request):
         )
         
         # Count statistics
-        present_count = attendance_records.filter(status='present').count()
-        absent_count = attendance_records.filter(status='absent').count()
-        late_count = attendance_records.filter(status='late').count()
-        half_day_count = attendance_records.filter(status='half_day').count()
-        total_days = present_count + absent_count + late_count + half_day_count
+        stats = attendance_stats(attendance_records)
         
         # Create a dictionary for easier lookup of attendance by date
         for record in attendance_records:
             attendance_lookup[record.date.day] = record
     
-    # Calculate percentages
-    if total_days > 0:
-        present_percent = round((present_count / total_days) * 100, 1)
-        absent_percent = round((absent_count / total_days) * 100, 1)
-        late_percent = round((late_count / total_days) * 100, 1)
-        half_day_percent = round((half_day_count / total_days) * 100, 1)
-    else:
-        present_percent = absent_percent = late_percent = half_day_percent = 0.0
-    
     # Build calendar data structure
     calendar_data = []
     today = date.today()
@@ -925,15 +833,8 @@ def attendance_calendar(request):
         'years': years,
         'students': students,
         'selected_student': selected_student,
-        'present_count': present_count,
-        'absent_count': absent_count,
-        'late_count': late_count,
-        'half_day_count': half_day_count,
-        'total_days': total_days,
-        'present_percent': present_percent,
-        'absent_percent': absent_percent,
-        'late_percent': late_percent,
-        'half_day_percent': half_day_percent,
+        'stats': stats,
+        **stats,
     }
     
     return render(request, 'attendance/attendance_calendar.html', context)
@@ -983,12 +884,8 @@ def teacher_attendance_calendar(request):
         next_month = month + 1
         next_year = year
     
-    # Initialize attendance data and statistics
-    present_count = 0
-    absent_count = 0
-    late_count = 0
-    half_day_count = 0
-    total_days = 0
+    # Initialize attendance statistics
+    stats = attendance_stats(TeacherAttendance.objects.none())
     
     # Get calendar data for the selected month/year
     cal = calendar.monthcalendar(year, month)
@@ -1013,25 +910,12 @@ def teacher_attendance_calendar(request):
         )
         
         # Count statistics
-        present_count = attendance_records.filter(status='present').count()
-        absent_count = attendance_records.filter(status='absent').count()
-        late_count = attendance_records.filter(status='late').count()
-        half_day_count = attendance_records.filter(status='half_day').count()
-        total_days = present_count + absent_count + late_count + half_day_count
+        stats = attendance_stats(attendance_records)
         
         # Create a dictionary for easier lookup of attendance by date
         for record in attendance_records:
             attendance_lookup[record.date.day] = record
     
-    # Calculate percentages
-    if total_days > 0:
-        present_percent = round((present_count / total_days) * 100, 1)
-        absent_percent = round((absent_count / total_days) * 100, 1)
-        late_percent = round((late_count / total_days) * 100, 1)
-        half_day_percent = round((half_day_count / total_days) * 100, 1)
-    else:
-        present_percent = absent_percent = late_percent = half_day_percent = 0.0
-    
     # Build calendar data structure
     calendar_data = []
     today = date.today()
@@ -1060,15 +944,8 @@ def teacher_attendance_calendar(request):
         'years': years,
         'teachers': teachers,
         'selected_teacher': selected_teacher,
-        'present_count': present_count,
-        'absent_count': absent_count,
-        'late_count': late_count,
-        'half_day_count': half_day_count,
-        'total_days': total_days,
-        'present_percent': present_percent,
-        'absent_percent': absent_percent,
-        'late_percent': late_percent,
-        'half_day_percent': half_day_percent,
+        'stats': stats,
+        **stats,
     }
     
     return render(request, 'attendance/teacher_attendance_calendar.html', context)
@@ -1129,10 +1006,8 @@ def get_attendance_detail(request):
             })
         
         # Calculate summary statistics
-        student_present_count = student_attendance.filter(status='present').count()
-        student_absent_count = student_attendance.filter(status='absent').count()
-        teacher_present_count = teacher_attendance.filter(status='present').count()
-        teacher_absent_count = teacher_attendance.filter(status='absent').count()
+        student_stats = attendance_stats(student_attendance)
+        teacher_stats = attendance_stats(teacher_attendance)
         
         # Prepare response data
         response_data = {
@@ -1141,10 +1016,10 @@ def get_attendance_detail(request):
             'students': student_data,
             'teachers': teacher_data,
             'summary': {
-                'student_present_count': student_present_count,
-                'student_absent_count': student_absent_count,
-                'teacher_present_count': teacher_present_count,
-                'teacher_absent_count': teacher_absent_count
+                'student_present_count': student_stats['present_count'],
+                'student_absent_count': student_stats['absent_count'],
+                'teacher_present_count': teacher_stats['present_count'],
+                'teacher_absent_count': teacher_stats['absent_count']
             }
         }
         
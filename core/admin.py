@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
-from .models import Profile
+from .models import OutboxEmail, PDFJob, Profile
 
 # Define an inline admin descriptor for Profile model
 class ProfileInline(admin.StackedInline):
@@ -21,3 +21,17 @@ class CustomUserAdmin(UserAdmin):
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'picture')  # Display the user and picture fields in the admin list view
     search_fields = ('user__username', 'user__email')  # Allow searching by username and email
+
+@admin.register(PDFJob)
+class PDFJobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'status', 'requested_by', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    readonly_fields = ('data_key', 'started_at', 'finished_at', 'error')
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'kind', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('kind', 'status')
+    search_fields = ('subject',)
+    exclude = ('attachment_content',)
+    readonly_fields = ('attempts', 'claimed_at', 'sent_at', 'last_error')
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        """
+        Connect the signal handlers that keep cached user roles, dashboard figures and cache namespaces up to date
+        """
+        from . import signals  # noqa: F401
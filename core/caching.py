@@ -0,0 +1,74 @@
+"""
+Namespaced cache keys with invalidation by version bump.
+
+Keys are built as '<namespace>:v<version>:<parts>'. invalidate_namespace()
+bumps a namespace's version, which makes every key in it unreachable at
+once without touching other namespaces the way cache.clear() does; the
+orphaned entries simply expire. Versions live in the cache itself, so all
+workers sharing the backend (CACHES in settings) see a bump immediately.
+"""
+import time
+
+from django.core.cache import cache
+
+DOCUMENTS = 'documents'
+ATTENDANCE = 'attendance'
+TIMETABLE = 'timetable'
+DASHBOARD = 'dashboard'
+NAMESPACES = (DOCUMENTS, ATTENDANCE, TIMETABLE, DASHBOARD)
+
+DEFAULT_TIMEOUT = 5 * 60  # 5 minutes
+
+
+def _version_key(namespace):
+    if namespace not in NAMESPACES:
+        raise ValueError(f"Unknown cache namespace '{namespace}'; add it to core.caching.NAMESPACES")
+    return f'namespace_version:{namespace}'
+
+
+def namespace_version(namespace):
+    """
+    Current version of a namespace. A version lost to eviction restarts from
+    the clock, so it never comes back as a number whose keys are still cached.
+    """
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns() // 1000, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def cache_key(namespace, *parts):
+    return ':'.join(str(part) for part in (namespace, f'v{namespace_version(namespace)}') + parts)
+
+
+def cached(namespace, parts, compute, timeout=DEFAULT_TIMEOUT):
+    """
+    Value of `compute()` cached under (namespace, *parts).
+    """
+    key = cache_key(namespace, *parts)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+def delete(namespace, *parts):
+    """
+    Drop one key of a namespace.
+    """
+    cache.delete(cache_key(namespace, *parts))
+
+
+def invalidate_namespace(*namespaces):
+    """
+    Make every key in the given namespaces stale by bumping their versions.
+    """
+    for namespace in namespaces:
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            # No version stored yet: a fresh one is newer than any old key
+            namespace_version(namespace)
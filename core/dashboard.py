@@ -0,0 +1,126 @@
+"""
+Cached aggregates for the admin dashboard (core.views.home).
+
+Each group of figures lives under its own key in the 'dashboard' cache
+namespace (core.caching) with a short TTL, and the signal handlers in
+core.signals drop exactly the keys a model change affects, so a warm
+dashboard load needs no aggregate queries at all.
+"""
+import json
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from .caching import DASHBOARD, cache_key, cached, delete
+
+DASHBOARD_CACHE_TIMEOUT = 5 * 60  # 5 minutes
+ATTENDANCE_CHART_DAYS = 7
+
+
+def get_student_stats():
+    """
+    Active student count and the per-class distribution.
+    """
+    from students.models import Student
+
+    def compute():
+        class_distribution = list(
+            Student.objects.filter(is_active=True).values('class_name').annotate(
+                count=Count('id')
+            ).order_by('class_name')
+        )
+        return {
+            'student_count': sum(row['count'] for row in class_distribution),
+            'class_distribution': class_distribution,
+        }
+    return cached(DASHBOARD, ('students',), compute, DASHBOARD_CACHE_TIMEOUT)
+
+
+def get_staff_stats():
+    """
+    Active teacher and subject counts.
+    """
+    from school_teachers.models import Teacher
+    from subjects.models import Subject
+
+    def compute():
+        return {
+            'teacher_count': Teacher.objects.filter(is_active=True).count(),
+            'subject_count': Subject.objects.filter(is_active=True).count(),
+        }
+    return cached(DASHBOARD, ('staff',), compute, DASHBOARD_CACHE_TIMEOUT)
+
+
+def get_total_revenue():
+    """
+    Total of completed fee transactions, from the fee ledger's monthly totals.
+    """
+    from fees.ledger import total_revenue
+
+    return cached(DASHBOARD, ('revenue',), total_revenue, DASHBOARD_CACHE_TIMEOUT)
+
+
+def get_events(today=None):
+    """
+    Upcoming and ongoing events as of today.
+    """
+    from events.models import Event
+
+    today = today or timezone.now().date()
+
+    def compute():
+        return {
+            'upcoming_events': list(Event.objects.filter(start_date__gte=today).order_by('start_date')[:5]),
+            'ongoing_events': list(Event.objects.filter(
+                start_date__lte=today,
+                end_date__gte=today
+            ).order_by('start_date')[:5]),
+        }
+    return cached(DASHBOARD, ('events', today.isoformat()), compute, DASHBOARD_CACHE_TIMEOUT)
+
+
+def get_attendance_chart(today=None):
+    """
+    Student and teacher present/absent counts for the last seven days,
+    with the series JSON-encoded for the chart script.
+    """
+    from attendance.rollup import daily_present_absent
+
+    today = today or timezone.now().date()
+    start_date = today - timedelta(days=ATTENDANCE_CHART_DAYS - 1)
+
+    def compute():
+        series = daily_present_absent(start_date, today)
+        return {
+            # Format as Apr 01, Apr 02, etc.
+            'labels': json.dumps([day.strftime('%b %d') for day in series['dates']]),
+            'student_present': json.dumps(series['student_present']),
+            'student_absent': json.dumps(series['student_absent']),
+            'teacher_present': json.dumps(series['teacher_present']),
+            'teacher_absent': json.dumps(series['teacher_absent']),
+            'start_date': start_date.strftime('%Y-%m-%d'),
+            'end_date': today.strftime('%Y-%m-%d'),
+        }
+    return cached(DASHBOARD, ('attendance_chart', today.isoformat()), compute, DASHBOARD_CACHE_TIMEOUT)
+
+
+def invalidate_dashboard(*names):
+    """
+    Drop the named dashboard aggregates ('students', 'staff', 'revenue').
+    """
+    cache.delete_many([cache_key(DASHBOARD, name) for name in names])
+
+
+def invalidate_attendance_chart(record_date):
+    """
+    Drop today's attendance chart if an attendance change falls inside it.
+    """
+    today = timezone.now().date()
+    if record_date is None or today - timedelta(days=ATTENDANCE_CHART_DAYS - 1) <= record_date <= today:
+        delete(DASHBOARD, 'attendance_chart', today.isoformat())
+
+
+def invalidate_events():
+    delete(DASHBOARD, 'events', timezone.now().date().isoformat())
@@ -0,0 +1,142 @@
+"""
+Serving stored files after the view's own permission checks.
+
+serve_file() answers conditional requests (If-None-Match/If-Modified-Since)
+with 304 from the ETag and Last-Modified the caller derives from its model,
+without touching the file. Otherwise, depending on FILE_SERVING_MODE:
+
+- 'django' (default): the file is streamed by the worker, honouring a
+  single byte range ("Range: bytes=a-b") with a 206 response;
+- 'nginx': an empty response with X-Accel-Redirect to
+  FILE_SERVING_INTERNAL_PREFIX + the file name, so nginx sends the bytes
+  (and handles Range) from an internal location such as
+
+      location /protected-media/ { internal; alias /app/media/; }
+
+- 'sendfile': an empty response with X-Sendfile set to the file's path,
+  for Apache mod_xsendfile or lighttpd.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+DJANGO = 'django'
+NGINX = 'nginx'
+SENDFILE = 'sendfile'
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_serving_mode():
+    return getattr(settings, 'FILE_SERVING_MODE', DJANGO)
+
+
+def make_etag(pk, modified):
+    return quote_etag(f'{pk}-{int(modified.timestamp() * 1_000_000)}')
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single "bytes=" range, None to serve the whole
+    file (no or unsupported header), or False if the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.replace(' ', '')) if header else None
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # "bytes=-N": the last N bytes
+        length = int(last)
+        if not length or not size:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def range_applies(request, etag, last_modified):
+    """
+    If-Range: a range only applies to the representation the client already has.
+    """
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(last_modified.timestamp())
+
+
+def iter_range(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def serve_file(request, field_file, filename, etag, last_modified):
+    """
+    Response for downloading `field_file` as `filename`, or a 304 when the
+    client's copy (identified by etag/last_modified) is still current.
+    Raises OSError if the file is missing in 'django' mode.
+    """
+    last_modified_http = http_date(last_modified.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+    if response is None:
+        response = _file_response(request, field_file, etag, last_modified)
+        response['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+        response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified_http
+    # Private documents: browsers may keep a copy but must revalidate it every time
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _file_response(request, field_file, etag, last_modified):
+    content_type = mimetypes.guess_type(field_file.name)[0] or 'application/octet-stream'
+    mode = get_serving_mode()
+    if mode == NGINX:
+        response = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, 'FILE_SERVING_INTERNAL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(field_file.name)
+        return response
+    if mode == SENDFILE:
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = field_file.path
+        return response
+
+    file = open(field_file.path, 'rb')
+    size = os.fstat(file.fileno()).st_size
+    byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    if byte_range is not None and not range_applies(request, etag, last_modified):
+        byte_range = None
+
+    if byte_range is False:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    start, end = byte_range or (0, size - 1)
+    response = StreamingHttpResponse(iter_range(file, start, end - start + 1), content_type=content_type)
+    response['Content-Length'] = str(end - start + 1)
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
@@ -0,0 +1,114 @@
+"""
+Registry of the querysets behind the busiest pages, for index audits.
+
+Each entry is a function returning a representative, unevaluated queryset
+for one hot path. `manage.py explain_hot_queries` runs EXPLAIN on every
+entry and flags full table scans, so index coverage can be re-checked
+whenever a view's filters change. Register new hot paths with @hot_query.
+"""
+import re
+from datetime import timedelta
+
+from django.utils import timezone
+
+HOT_QUERIES = {}
+
+# EXPLAIN output patterns that mean a table is read in full
+FULL_SCAN_PATTERNS = {
+    # "SCAN <table>" without "USING [COVERING] INDEX"
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)(?! USING)(?:\s|$)'),
+    'postgresql': re.compile(r'\bSeq Scan on (\w+)'),
+}
+
+
+def hot_query(name):
+    """
+    Register the decorated queryset factory under `name`.
+    """
+    def register(factory):
+        HOT_QUERIES[name] = factory
+        return factory
+    return register
+
+
+def full_scans(plan, vendor):
+    """
+    Names of the tables an EXPLAIN plan reads with a full scan.
+    """
+    pattern = FULL_SCAN_PATTERNS.get(vendor)
+    return sorted(set(pattern.findall(plan))) if pattern else []
+
+
+@hot_query('attendance.daily_status')
+def attendance_daily_status():
+    # Dashboard and daily reports: who was absent today
+    from attendance.models import Attendance
+    return Attendance.objects.filter(date=timezone.now().date(), status='absent').order_by()
+
+
+@hot_query('attendance.class_range')
+def attendance_class_range():
+    # Class attendance report over a date range
+    from attendance.models import Attendance
+    today = timezone.now().date()
+    return Attendance.objects.filter(
+        student__class_name='5', date__gte=today - timedelta(days=30), date__lte=today
+    ).order_by()
+
+
+@hot_query('attendance.list_page')
+def attendance_list_page():
+    # Keyset-paginated attendance list, one page
+    from attendance.models import Attendance
+    return Attendance.objects.filter(status='absent').order_by('-date', '-id')[:51]
+
+
+@hot_query('attendance.teacher_list_page')
+def teacher_attendance_list_page():
+    from attendance.models import TeacherAttendance
+    return TeacherAttendance.objects.select_related('teacher', 'recorded_by').order_by('-date', '-id')[:51]
+
+
+@hot_query('attendance.summary_range')
+def attendance_summary_range():
+    # Dashboard chart and class reports read the daily rollup
+    from attendance.models import AttendanceDailySummary
+    today = timezone.now().date()
+    return AttendanceDailySummary.objects.filter(
+        kind=AttendanceDailySummary.STUDENT, date__gte=today - timedelta(days=6), date__lte=today
+    ).order_by()
+
+
+@hot_query('students.active_in_class')
+def students_active_in_class():
+    # Take-attendance form and class lists
+    from students.models import Student
+    return Student.objects.filter(class_name='5', is_active=True)
+
+
+@hot_query('fees.transaction_lookup')
+def fee_transaction_lookup():
+    # payment_callback and webhook_handler look payments up by gateway ID
+    from fees.models import FeeTransaction
+    return FeeTransaction.objects.filter(transaction_id='order_hot_query').order_by()
+
+
+@hot_query('fees.student_completed')
+def fee_student_completed():
+    # Student fee history and paid totals
+    from fees.models import FeeTransaction
+    return FeeTransaction.objects.filter(student_id=1, status='completed').order_by()
+
+
+@hot_query('library.overdue_issues')
+def library_overdue_issues():
+    from library.models import BookIssue
+    return BookIssue.objects.filter(status='issued', due_date__lt=timezone.now().date()).order_by()
+
+
+@hot_query('events.ongoing')
+def events_ongoing():
+    # Dashboard "ongoing events"
+    from events.models import Event
+    today = timezone.now().date()
+    return Event.objects.filter(start_date__lte=today, end_date__gte=today).order_by('start_date')[:5]
@@ -0,0 +1,71 @@
+"""
+Logging handlers and formatters shared by the project's loggers (see settings.LOGGING)
+"""
+import json
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import SimpleQueue
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats a record as a single line of JSON.
+
+    Fields passed through `extra=` are included as top-level keys, so callers
+    can log structured data without building strings themselves.
+    """
+    def format(self, record):
+        data = {
+            'timestamp': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'location': f"{record.module}:{record.lineno}",
+            'function': record.funcName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(data, default=str)
+
+
+class QueuedRotatingFileHandler(QueueHandler):
+    """
+    Non-blocking rotating file handler.
+
+    The calling thread only formats the record and puts it on an in-memory
+    queue; a background QueueListener thread does the file I/O and rotation.
+    """
+    def __init__(self, filename, maxBytes=10 * 1024 * 1024, backupCount=5, encoding='utf-8'):
+        super().__init__(SimpleQueue())
+        self.file_handler = RotatingFileHandler(
+            filename,
+            maxBytes=maxBytes,
+            backupCount=backupCount,
+            encoding=encoding,
+            delay=True,
+        )
+        self.listener = QueueListener(self.queue, self.file_handler)
+        self.listener.start()
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        # The stack is already part of the formatted JSON line
+        record.stack_info = None
+        return record
+
+    def close(self):
+        # Drain the queue before the file handler is closed
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            self.file_handler.close()
+        super().close()
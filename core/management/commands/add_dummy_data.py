@@ -14,6 +14,7 @@ from django.contrib.auth.models import User
 from students.models import Student
 from school_teachers.models import Teacher
 from attendance.models import Attendance, TeacherAttendance
+from attendance.rollup import rebuild_daily_summaries
 from django.db import transaction
 
 def generate_random_name():
@@ -268,6 +269,9 @@ def main():
         create_random_attendance(students, start_date, end_date, admin_user)
         create_random_teacher_attendance(teachers, start_date, end_date, admin_user)
         
+        # bulk_create skips the signals that maintain the daily summaries
+        rebuild_daily_summaries(start_date, end_date)
+        
         print("Dummy data creation completed successfully!")
         
     except Exception as e:
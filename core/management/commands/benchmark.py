@@ -0,0 +1,228 @@
+"""
+Management command to benchmark the main views against a scaled, throwaway dataset
+"""
+import json
+import math
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.core.cache import cache
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from core.seeding import SyntheticDataGenerator
+from core.test_runner import TEST_CACHES
+
+# The throwaway database's users, roles and aggregates are cached here instead
+# of the configured (shared) cache, where they would outlive the run and be
+# served for the real rows with the same ids
+BENCHMARK_CACHES = {'default': {**TEST_CACHES['default'], 'LOCATION': 'benchmark'}}
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a scaled dataset into a throwaway test database, drive the main views '
+        'through the test client and report p50/p95 latency and query counts as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=float,
+            default=1.0,
+            help='Dataset size passed to the synthetic data generator (default: 1)'
+        )
+        parser.add_argument('--students', type=int, help='Number of students to seed, overriding the scaled count')
+        parser.add_argument('--teachers', type=int, help='Number of teachers to seed, overriding the scaled count')
+        parser.add_argument('--days', type=int, default=30, help='Days of attendance history to seed (default: 30)')
+        parser.add_argument('--iterations', type=int, default=10, help='Timed requests per view (default: 10)')
+        parser.add_argument('--warmup', type=int, default=1, help='Untimed requests per view before timing (default: 1)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the generated dataset (default: 42)')
+        parser.add_argument('--output', default='benchmark.json', help='File to write the JSON report to')
+        parser.add_argument('--compare', metavar='BASELINE', help='Baseline JSON report to compare against')
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.25,
+            help='Allowed p95 latency regression as a fraction of the baseline (default: 0.25)'
+        )
+        parser.add_argument('--views', nargs='*', help='Only run the named benchmarks')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as baseline_file:
+                    baseline = json.load(baseline_file)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline {options['compare']}: {e}")
+
+        with override_settings(CACHES=BENCHMARK_CACHES):
+            try:
+                results, generator = self.seed_and_benchmark(options)
+            finally:
+                cache.clear()
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'dataset': {
+                'scale': options['scale'],
+                'students': generator.student_count,
+                'teachers': generator.teacher_count,
+                'days': options['days'],
+                'seed': options['seed'],
+            },
+            'iterations': options['iterations'],
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+        if baseline is not None:
+            self.compare(report, baseline, options['tolerance'])
+
+    # Benchmarks
+
+    def seed_and_benchmark(self, options):
+        """
+        Seed a throwaway test database, run the benchmarks against it and drop it.
+        Returns the results and the generator that seeded the data.
+        """
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            generator = SyntheticDataGenerator(
+                scale=options['scale'],
+                seed=options['seed'],
+                days=options['days'],
+                students=options['students'],
+                teachers=options['teachers'],
+            )
+            self.stdout.write(self.style.NOTICE(
+                f"Seeding scale {options['scale']} ({generator.student_count} students, "
+                f"{generator.teacher_count} teachers) with {options['days']} days of attendance..."
+            ))
+            started = time.perf_counter()
+            generator.generate()
+            accounts = generator.accounts
+            self.stdout.write(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+            results = self.run_benchmarks(accounts, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        return results, generator
+
+    def benchmark_cases(self):
+        today = timezone.now().date()
+        report_params = (
+            f"?report_type=class&class_name=1&start_date={today - timedelta(days=30)}&end_date={today}"
+        )
+        return [
+            ('home_admin', 'admin', reverse('core:home')),
+            ('home_teacher', 'teacher', reverse('core:home')),
+            ('home_student', 'student', reverse('core:home')),
+            ('attendance_list', 'admin', reverse('attendance:list')),
+            ('attendance_report', 'admin', reverse('attendance:attendance_report') + report_params),
+            ('download_attendance_records', 'admin', reverse('attendance:download_all')),
+            ('document_matrix', 'admin', reverse('documents:document_matrix')),
+            ('class_timetable', 'admin', reverse('timetable:class_timetable_detail', args=['1'])),
+            ('book_list', 'admin', reverse('library:book_list')),
+            ('api_attendance_data', 'admin', reverse('core:attendance_data_api')),
+            ('api_students', 'admin', '/api/students/'),
+            ('api_teachers', 'admin', '/api/teachers/'),
+            ('api_subjects', 'admin', '/api/subjects/subjects/'),
+            ('api_book_search', 'admin', '/api/library/search/?query=Book'),
+        ]
+
+    def run_benchmarks(self, accounts, options):
+        clients = {}
+        for role, user in accounts.items():
+            client = Client(raise_request_exception=False)
+            client.force_login(user)
+            clients[role] = client
+
+        results = {}
+        for name, role, url in self.benchmark_cases():
+            if options['views'] and name not in options['views']:
+                continue
+
+            client = clients[role]
+            for _ in range(options['warmup']):
+                self.fetch(client, url)
+
+            timings = []
+            query_counts = []
+            status_code = None
+            for _ in range(options['iterations']):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    status_code = self.fetch(client, url)
+                    timings.append((time.perf_counter() - started) * 1000)
+                query_counts.append(len(captured.captured_queries))
+
+            results[name] = {
+                'url': url,
+                'role': role,
+                'status': status_code,
+                'p50_ms': round(self.percentile(timings, 50), 2),
+                'p95_ms': round(self.percentile(timings, 95), 2),
+                'mean_ms': round(statistics.mean(timings), 2),
+                'queries': max(query_counts),
+            }
+            style = self.style.SUCCESS if status_code and status_code < 400 else self.style.ERROR
+            self.stdout.write(style(
+                f"{name:<30} {status_code}  p50 {results[name]['p50_ms']:>9.2f} ms  "
+                f"p95 {results[name]['p95_ms']:>9.2f} ms  queries {results[name]['queries']}"
+            ))
+        return results
+
+    @staticmethod
+    def fetch(client, url):
+        response = client.get(url)
+        # Drain streamed bodies so the full response cost is measured
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response.status_code
+
+    @staticmethod
+    def percentile(values, percent):
+        ordered = sorted(values)
+        rank = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+        return ordered[rank]
+
+    # Comparison
+
+    def compare(self, report, baseline, tolerance):
+        if baseline.get('dataset') != report['dataset']:
+            self.stdout.write(self.style.WARNING(
+                f"Baseline dataset {baseline.get('dataset')} differs from this run {report['dataset']}"
+            ))
+
+        regressions = []
+        for name, current in report['results'].items():
+            previous = baseline.get('results', {}).get(name)
+            if previous is None:
+                continue
+            allowed_p95 = previous['p95_ms'] * (1 + tolerance)
+            if current['p95_ms'] > allowed_p95:
+                regressions.append(
+                    f"{name}: p95 {current['p95_ms']:.2f} ms > {allowed_p95:.2f} ms "
+                    f"(baseline {previous['p95_ms']:.2f} ms)"
+                )
+            if current['queries'] > previous['queries']:
+                regressions.append(f"{name}: {current['queries']} queries > baseline {previous['queries']}")
+
+        if regressions:
+            raise CommandError("Performance regressions detected:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No regressions beyond {tolerance:.0%} of the baseline"))
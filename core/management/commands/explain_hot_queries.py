@@ -0,0 +1,66 @@
+"""
+Management command to EXPLAIN the registered hot querysets and flag full table scans
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.hot_queries import FULL_SCAN_PATTERNS, HOT_QUERIES, full_scans
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN on the hot querysets registered in core.hot_queries and flag '
+        'the ones that read a table with a full scan (SQLite and PostgreSQL)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', nargs='*', help='Only explain the named queries')
+        parser.add_argument(
+            '--prefer-index',
+            action='store_true',
+            help=(
+                'PostgreSQL only: plan with enable_seqscan off, so small development tables '
+                'report whether an index could be used rather than the cheapest plan'
+            )
+        )
+        parser.add_argument(
+            '--fail-on-scan',
+            action='store_true',
+            help='Exit with an error if any query does a full scan (for CI)'
+        )
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in FULL_SCAN_PATTERNS:
+            raise CommandError(f'EXPLAIN analysis is not supported on {vendor}; use SQLite or PostgreSQL')
+
+        names = options['queries'] or list(HOT_QUERIES)
+        unknown = sorted(set(names) - set(HOT_QUERIES))
+        if unknown:
+            raise CommandError(f"Unknown queries: {', '.join(unknown)}. Choose from: {', '.join(HOT_QUERIES)}")
+
+        flagged = []
+        for name in names:
+            plan = self.explain(HOT_QUERIES[name](), vendor, options['prefer_index'])
+            scanned = full_scans(plan, vendor)
+            if scanned:
+                flagged.append(name)
+                self.stdout.write(self.style.WARNING(f"FULL SCAN  {name}: {', '.join(scanned)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'ok         {name}'))
+            if options['verbosity'] > 1 or scanned:
+                for line in plan.splitlines():
+                    self.stdout.write(f'    {line}')
+
+        summary = f'{len(flagged)} of {len(names)} hot queries do a full scan'
+        if flagged and options['fail_on_scan']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.WARNING(summary) if flagged else self.style.SUCCESS(summary))
+
+    def explain(self, queryset, vendor, prefer_index):
+        if vendor == 'postgresql' and prefer_index:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+                return queryset.explain()
+        return queryset.explain()
@@ -0,0 +1,64 @@
+"""
+Management command to generate a large synthetic dataset for load testing
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.seeding import (
+    DEFAULT_BATCH_SIZE, STUDENTS_PER_SCALE, SYNTHETIC_PASSWORD, TEACHERS_PER_SCALE, SyntheticDataGenerator,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate students, teachers, timetables, marks, attendance, fees, documents, books and '
+        'book issues with bulk inserts. Volume is controlled by --scale; --seed makes it repeatable.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=float,
+            default=1.0,
+            help=f'Dataset size; 1 is about {STUDENTS_PER_SCALE} students and {TEACHERS_PER_SCALE} teachers (default: 1)'
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+        parser.add_argument('--days', type=int, default=180, help='Days of attendance history (default: 180)')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Rows per INSERT batch (default: {DEFAULT_BATCH_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        if options['scale'] <= 0 or options['days'] <= 0 or options['batch_size'] <= 0:
+            raise CommandError('--scale, --days and --batch-size must be positive')
+
+        generator = SyntheticDataGenerator(
+            scale=options['scale'],
+            seed=options['seed'],
+            days=options['days'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        )
+        if generator.already_generated():
+            raise CommandError('Synthetic data already exists in this database; generate into a fresh database')
+
+        self.stdout.write(self.style.NOTICE(
+            f"Generating {generator.student_count} students, {generator.teacher_count} teachers "
+            f"and {options['days']} days of attendance (seed {options['seed']})..."
+        ))
+        started = time.perf_counter()
+        counts = generator.generate()
+        elapsed = time.perf_counter() - started
+
+        total = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Inserted {total} rows in {elapsed:.1f}s ({total / max(elapsed, 0.001):.0f} rows/s)"
+        ))
+        self.stdout.write(
+            f"Log in as {generator.accounts['admin'].username} / {SYNTHETIC_PASSWORD} "
+            f"(teacher {generator.accounts['teacher'].username}, student {generator.accounts['student'].username})"
+        )
@@ -0,0 +1,63 @@
+"""
+Management command that renders queued PDF jobs (see core.pdf_jobs)
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.models import PDFJob
+from core.pdf_jobs import STALE_AFTER, claim_next_job, process_job, release_stale_claims
+
+DEFAULT_STALE_MINUTES = int(STALE_AFTER.total_seconds() // 60)
+
+
+class Command(BaseCommand):
+    help = 'Render queued roster and timetable PDFs into media/reports/, polling for new jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the current queue and exit')
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between polls of an empty queue (default: 2)'
+        )
+        parser.add_argument('--max-jobs', type=int, help='Exit after processing this many jobs')
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=DEFAULT_STALE_MINUTES,
+            help=f'Requeue jobs running for more than this many minutes (default: {DEFAULT_STALE_MINUTES})'
+        )
+
+    def release_stale(self, older_than):
+        released = release_stale_claims(older_than)
+        if released:
+            self.stdout.write(self.style.WARNING(f'Requeued {released} jobs left running'))
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(minutes=options['stale_after'])
+        self.release_stale(stale_after)
+        processed = 0
+        while options['max_jobs'] is None or processed < options['max_jobs']:
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                # Jobs abandoned by other workers while this one was idle
+                self.release_stale(stale_after)
+                continue
+
+            started = time.perf_counter()
+            if process_job(job):
+                self.stdout.write(self.style.SUCCESS(
+                    f"Rendered {job.get_kind_display()} #{job.pk} in {time.perf_counter() - started:.2f}s"
+                ))
+            else:
+                self.stdout.write(self.style.WARNING(f"{job.get_kind_display()} #{job.pk} failed: {job.error}"))
+            processed += 1
+
+        pending = PDFJob.objects.filter(status=PDFJob.PENDING).count()
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} PDF jobs ({pending} still pending)'))
@@ -0,0 +1,58 @@
+"""
+Management command that delivers the email outbox (see core.outbox)
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.models import OutboxEmail
+from core.outbox import deliver_batch, release_stale_claims
+
+
+class Command(BaseCommand):
+    help = (
+        'Deliver queued emails in batches over one connection per batch, '
+        'retrying failures with backoff and dead-lettering messages that keep failing'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Deliver everything that is due now and exit')
+        parser.add_argument('--batch-size', type=int, default=50, help='Messages per connection (default: 50)')
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1.0,
+            help='Seconds to wait between polls of an empty queue (default: 1)'
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=10,
+            help='Requeue messages claimed by a worker more than this many minutes ago (default: 10)'
+        )
+
+    def handle(self, *args, **options):
+        released = release_stale_claims(timedelta(minutes=options['stale_after']))
+        if released:
+            self.stdout.write(self.style.WARNING(f'Requeued {released} messages left in sending'))
+
+        totals = {'sent': 0, 'retried': 0, 'dead': 0}
+        while True:
+            counts = deliver_batch(options['batch_size'])
+            for key, value in counts.items():
+                totals[key] += value
+            if any(counts.values()):
+                self.stdout.write(
+                    f"Sent {counts['sent']}, retrying {counts['retried']}, dead-lettered {counts['dead']}"
+                )
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+
+        queued = OutboxEmail.objects.filter(status=OutboxEmail.QUEUED).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Delivered {totals['sent']} emails ({totals['retried']} to retry, "
+            f"{totals['dead']} dead-lettered, {queued} queued)"
+        ))
@@ -0,0 +1,14 @@
+"""
+Management command to delete expired OTP challenges (see core.otp)
+"""
+from django.core.management.base import BaseCommand
+
+from core.otp import sweep_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired signup and password reset OTPs, including abandoned signups'
+
+    def handle(self, *args, **options):
+        deleted = sweep_expired()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired OTPs'))
@@ -1,22 +1,190 @@
+import logging
 import time
 import uuid
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template as DjangoTemplate
 from django.utils.deprecation import MiddlewareMixin
 
+logger = logging.getLogger('api')
+
+# Requests slower than SLOW_REQUEST_THRESHOLD_MS are written here; the handler
+# configured in settings.LOGGING rotates the file so it stays bounded.
+slow_request_logger = logging.getLogger('api.slow_requests')
+
+# Metrics for the request currently being handled on this thread/task
+_current_metrics = ContextVar('api_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Per-request counters for SQL queries and template rendering.
+    """
+    def __init__(self):
+        self.query_count = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.view_start = None
+        self.view_time = None
+        self._seen_queries = set()
+        self.duplicate_count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed as a database execute wrapper for the duration of the request
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.perf_counter() - start
+            self.query_count += 1
+            key = (sql, repr(params))
+            if key in self._seen_queries:
+                self.duplicate_count += 1
+            else:
+                self._seen_queries.add(key)
+
+
+def _instrument_template_rendering():
+    """
+    Wrap the Django template backend's render() so top-level template renders
+    (render(), render_to_string(), TemplateResponse) are timed per request.
+    Included templates render through django.template.base.Template directly,
+    so they are not counted twice.
+    """
+    if getattr(DjangoTemplate.render, '_api_logger_timed', False):
+        return
+
+    original_render = DjangoTemplate.render
+
+    def timed_render(self, context=None, request=None):
+        metrics = _current_metrics.get()
+        if metrics is None:
+            return original_render(self, context, request)
+        start = time.perf_counter()
+        try:
+            return original_render(self, context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+
+    timed_render._api_logger_timed = True
+    DjangoTemplate.render = timed_render
+
+
 class APILoggerMiddleware(MiddlewareMixin):
     """
-    Simple middleware that only tracks request timing for performance metrics.
-    No logging functionality is implemented.
+    Tracks request timing for performance metrics.
+
+    Every response gets an X-Request-Duration header and a Server-Timing header
+    with the SQL query count and time, template render time and view time, and
+    a summary line is written to the api log.
+    Requests slower than SLOW_REQUEST_THRESHOLD_MS are appended to the slow
+    request log with their route name, query count and duplicate query count.
     """
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        _instrument_template_rendering()
+
     def process_request(self, request):
         # Set a unique ID for the request and record start time
         request.api_id = str(uuid.uuid4())
         request.start_time = time.time()
 
+        metrics = RequestMetrics()
+        request.api_metrics = metrics
+        request._api_metrics_token = _current_metrics.set(metrics)
+        for connection in connections.all():
+            connection.execute_wrappers.append(metrics)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, 'api_metrics'):
+            request.api_metrics.view_start = time.perf_counter()
+
     def process_response(self, request, response):
         # Calculate request duration if start_time exists
-        if hasattr(request, 'start_time'):
-            duration = time.time() - request.start_time
-            # Store duration in response headers for debugging if needed
-            response['X-Request-Duration'] = f"{duration:.3f}s"
-        
+        if not hasattr(request, 'start_time'):
+            return response
+
+        duration = time.time() - request.start_time
+        # Store duration in response headers for debugging if needed
+        response['X-Request-Duration'] = f"{duration:.3f}s"
+
+        metrics = getattr(request, 'api_metrics', None)
+        if metrics is None:
+            return response
+
+        self._stop_collecting(request, metrics)
+        if metrics.view_start is not None:
+            metrics.view_time = time.perf_counter() - metrics.view_start
+
+        response['Server-Timing'] = self.server_timing(metrics, duration)
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "%s %s %s", request.method, request.path, response.status_code,
+                extra={
+                    'request_id': request.api_id,
+                    'method': request.method,
+                    'path': request.path,
+                    'status': response.status_code,
+                    'duration_ms': round(duration * 1000, 1),
+                    'query_count': metrics.query_count,
+                },
+            )
+
+        threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 500)
+        if threshold is not None and duration * 1000 >= threshold:
+            self.log_slow_request(request, response, metrics, duration)
+
         return response
+
+    def _stop_collecting(self, request, metrics):
+        for connection in connections.all():
+            if metrics in connection.execute_wrappers:
+                connection.execute_wrappers.remove(metrics)
+        token = getattr(request, '_api_metrics_token', None)
+        if token is not None:
+            _current_metrics.reset(token)
+            request._api_metrics_token = None
+
+    @staticmethod
+    def server_timing(metrics, duration):
+        entries = [
+            f'db;dur={metrics.query_time * 1000:.1f};desc="{metrics.query_count} queries"',
+            f'tpl;dur={metrics.template_time * 1000:.1f}',
+        ]
+        if metrics.view_time is not None:
+            entries.append(f'view;dur={metrics.view_time * 1000:.1f}')
+        entries.append(f'total;dur={duration * 1000:.1f}')
+        return ', '.join(entries)
+
+    @staticmethod
+    def slow_request_record(request, response, metrics, duration):
+        """
+        Structured fields of a slow request, passed to the slow request log as
+        `extra=` so the JSON formatter writes them as top-level keys.
+        """
+        resolver_match = getattr(request, 'resolver_match', None)
+        return {
+            'request_id': request.api_id,
+            'method': request.method,
+            'path': request.path,
+            'route': resolver_match.view_name if resolver_match else None,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 1),
+            'view_ms': round(metrics.view_time * 1000, 1) if metrics.view_time is not None else None,
+            'template_ms': round(metrics.template_time * 1000, 1),
+            'query_count': metrics.query_count,
+            'query_ms': round(metrics.query_time * 1000, 1),
+            'duplicate_queries': metrics.duplicate_count,
+        }
+
+    @classmethod
+    def log_slow_request(cls, request, response, metrics, duration):
+        record = cls.slow_request_record(request, response, metrics, duration)
+        slow_request_logger.warning(
+            "Slow request %s %s: %s ms, %s queries", request.method, request.path,
+            record['duration_ms'], record['query_count'],
+            extra=record,
+        )
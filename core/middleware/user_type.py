@@ -1,69 +1,109 @@
+from django.core.cache import cache
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
 from school_teachers.models import Teacher
 from students.models import Student
-from django.contrib.auth.models import User
 import logging
 
 # Create a logger for tracking user type detection
 logger = logging.getLogger('user_type')
 
+# Resolved roles are cached per user so that steady-state requests skip the
+# Teacher/Student lookups entirely. Entries are dropped by the signal handlers
+# in core.signals whenever a Student, Teacher or User row changes.
+USER_TYPE_CACHE_PREFIX = 'user_type'
+USER_TYPE_CACHE_TIMEOUT = 60 * 60  # 1 hour
+
+
+def user_type_cache_key(user_id):
+    return f"{USER_TYPE_CACHE_PREFIX}:{user_id}"
+
+
+def resolve_user_type(user):
+    """
+    Work out from the database whether a user is a teacher, a student or an admin.
+
+    Returns a dict with the keys 'user_type', 'student_id' and 'teacher_id'.
+    """
+    role = {'user_type': 'admin', 'student_id': None, 'teacher_id': None}
+
+    # Check if user is a teacher
+    teacher_id = Teacher.objects.filter(user=user).values_list('id', flat=True).first()
+    if teacher_id is not None:
+        role.update(user_type='teacher', teacher_id=teacher_id)
+        return role
+
+    # Not a teacher, check if it's a student by user relationship
+    student_id = Student.objects.filter(user=user).values_list('id', flat=True).first()
+    if student_id is not None:
+        role.update(user_type='student', student_id=student_id)
+        return role
+
+    # Students might not have a direct user relationship yet, so try to match by email
+    student = Student.objects.filter(email=user.email).first() if user.email else None
+    if student is not None:
+        # Update the user relationship if it's missing
+        if not student.user_id:
+            student.user = user
+            student.save()
+            logger.info("Linked student %s to user %s by email", student.id, user.id)
+        role.update(user_type='student', student_id=student.id)
+
+    return role
+
+
+def get_user_type(user):
+    """
+    Return the cached role for a user, resolving it from the database on a miss.
+    """
+    key = user_type_cache_key(user.pk)
+    role = cache.get(key)
+    if role is None:
+        role = resolve_user_type(user)
+        cache.set(key, role, USER_TYPE_CACHE_TIMEOUT)
+    return role
+
+
+def invalidate_user_type(*user_ids):
+    """
+    Drop the cached role for the given users so the next request re-resolves it.
+    """
+    keys = [user_type_cache_key(user_id) for user_id in user_ids if user_id]
+    if keys:
+        cache.delete_many(keys)
+
+
+def get_request_role(request):
+    """
+    Resolve the role for the user on this request, memoized for the request.
+    """
+    if not hasattr(request, '_cached_user_role'):
+        if request.user.is_authenticated:
+            request._cached_user_role = get_user_type(request.user)
+            logger.debug("User %s identified as %s", request.user.username,
+                         request._cached_user_role['user_type'])
+        else:
+            request._cached_user_role = {'user_type': None, 'student_id': None, 'teacher_id': None}
+    return request._cached_user_role
+
+
+def get_profile(model, pk):
+    return model.objects.filter(pk=pk).first() if pk else None
+
+
 class UserTypeMiddleware(MiddlewareMixin):
     """
     Middleware to check if a user is a teacher or student and add that information to the request.
+
+    The attributes are lazy, so views that never look at the role (webhooks,
+    JSON endpoints, logout) do not pay for resolving it.
     """
     def process_request(self, request):
-        # Always add an empty user_type field to prevent errors with anonymous users
-        request.user_type = None
-        request.student = None
-        request.teacher = None
-        
-        if request.user.is_authenticated:
-            # Debug user login
-            print(f"[UserTypeMiddleware] Processing user {request.user.username}")
-            
-            # Refresh user to ensure permissions are up to date
-            request.user.refresh_from_db()
-            
-            # Add user type information to request
-            try:
-                # Check if user is a teacher
-                teacher = Teacher.objects.get(user=request.user)
-                request.user_type = 'teacher'
-                request.teacher = teacher
-                print(f"[UserTypeMiddleware] User {request.user.username} identified as teacher: {teacher.first_name} {teacher.last_name}")
-            except Teacher.DoesNotExist:
-                # Not a teacher, check if it's a student
-                try:
-                    # First try to get student by user relationship
-                    student = Student.objects.get(user=request.user)
-                    request.user_type = 'student'
-                    request.student = student
-                    print(f"[UserTypeMiddleware] User {request.user.username} identified as student: {student.first_name} {student.last_name}")
-                    
-                    # Debug: Check for permissions
-                    permissions = list(request.user.get_all_permissions())
-                    direct_permissions = [f"{p.content_type.app_label}.{p.codename}" for p in request.user.user_permissions.all()]
-                    print(f"[UserTypeMiddleware] Student permissions (direct only): {direct_permissions}")
-                except Student.DoesNotExist:
-                    # If not found by user, try by email
-                    try:
-                        # Since students might not have direct user relationship yet,
-                        # try to match by email
-                        student = Student.objects.get(email=request.user.email)
-                        request.user_type = 'student'
-                        request.student = student
-                        print(f"[UserTypeMiddleware] User {request.user.username} matched by email to student: {student.first_name} {student.last_name}")
-                        
-                        # Update the user relationship if it's missing
-                        if not student.user:
-                            student.user = request.user
-                            student.save()
-                            print(f"[UserTypeMiddleware] Updated student {student.id} with user {request.user.id}")
-                    except Student.DoesNotExist:
-                        # Neither teacher nor student
-                        request.user_type = 'admin'
-                        print(f"[UserTypeMiddleware] User {request.user.username} identified as admin")
-        else:
-            print("[UserTypeMiddleware] No authenticated user")
-        
-        return None 
\ No newline at end of file
+        request.user_type = SimpleLazyObject(lambda: get_request_role(request)['user_type'])
+        request.student = SimpleLazyObject(
+            lambda: get_profile(Student, get_request_role(request)['student_id'])
+        )
+        request.teacher = SimpleLazyObject(
+            lambda: get_profile(Teacher, get_request_role(request)['teacher_id'])
+        )
+        return None
@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
@@ -27,6 +28,134 @@ def create_or_update_user_profile(sender, instance, created, **kwargs):
         if hasattr(instance, 'profile'):
             instance.profile.save()
 
+
+class PDFJob(models.Model):
+    """
+    A PDF rendered off the request path by the run_pdf_jobs worker.
+
+    data_key hashes the report kind, its parameters and the state of the
+    underlying rows (row count and latest updated_at), so a finished job is
+    reused until the data changes and the file under media/ is named by it.
+    """
+    STUDENTS_ALL = 'students_all'
+    TEACHERS_ALL = 'teachers_all'
+    CLASS_TIMETABLE = 'class_timetable'
+    TEACHER_TIMETABLE = 'teacher_timetable'
+    KIND_CHOICES = (
+        (STUDENTS_ALL, 'All Students Report'),
+        (TEACHERS_ALL, 'All Teachers Report'),
+        (CLASS_TIMETABLE, 'Class Timetable'),
+        (TEACHER_TIMETABLE, 'Teacher Timetable'),
+    )
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+    data_key = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    file = models.FileField(upload_to='reports/', blank=True)
+    filename = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='pdf_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='pdfjob_status_created_idx'),
+            models.Index(fields=['kind', 'data_key'], name='pdfjob_kind_key_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} - {self.status}"
+
+
+class OutboxEmail(models.Model):
+    """
+    An email queued by a request and delivered by the send_queued_email worker.
+
+    Failed sends are retried with exponential backoff until
+    EMAIL_OUTBOX_MAX_ATTEMPTS, after which the message is dead-lettered.
+    """
+    QUEUED = 'queued'
+    SENDING = 'sending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (DEAD, 'Dead'),
+    )
+
+    kind = models.CharField(max_length=30, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    attachment_name = models.CharField(max_length=255, blank=True)
+    attachment_content = models.BinaryField(null=True, blank=True)
+    attachment_mimetype = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_due_idx')]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} - {self.status}"
+
+
+class OTPChallenge(models.Model):
+    """
+    A one-time password waiting to be entered, shared by every worker
+    process (see core.otp). Only a keyed hash of the code is stored; rows
+    past expires_at are ignored and removed by `manage.py sweep_otps`.
+    """
+    SIGNUP = 'signup'
+    PASSWORD_RESET = 'password_reset'
+    PURPOSE_CHOICES = (
+        (SIGNUP, 'Signup'),
+        (PASSWORD_RESET, 'Password reset'),
+    )
+
+    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
+    email = models.EmailField()
+    code_hash = models.CharField(max_length=64)
+    # Pending signup details (username and hashed password)
+    payload = models.JSONField(default=dict, blank=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    verified_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['purpose', 'email']
+        indexes = [models.Index(fields=['expires_at'], name='otp_expires_idx')]
+
+    def __str__(self):
+        return f"{self.get_purpose_display()} OTP for {self.email}"
+
 # filepath: d:\Django2.0\nana rajkot\school_management\core\management\commands\remove_duplicate_profiles.py
 from django.core.management.base import BaseCommand
 from core.models import Profile
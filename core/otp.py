@@ -0,0 +1,107 @@
+"""
+One-time passwords for signup and password reset, stored in the database
+so every worker process sees the same codes.
+
+issue_otp() replaces any earlier code for the same purpose and email, and
+check_otp() counts attempts with a conditional UPDATE, so a code can only
+be guessed OTP_MAX_ATTEMPTS times however the requests are spread over
+workers. Expired rows are never returned and are deleted by sweep_expired()
+(`manage.py sweep_otps`).
+"""
+import hashlib
+import hmac
+import secrets
+import string
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OTPChallenge
+
+OK = 'ok'
+INVALID = 'invalid'
+EXPIRED = 'expired'
+LOCKED = 'locked'
+
+
+def get_ttl():
+    return timedelta(seconds=getattr(settings, 'OTP_TTL_SECONDS', 600))
+
+
+def get_max_attempts():
+    return getattr(settings, 'OTP_MAX_ATTEMPTS', 5)
+
+
+def generate_otp():
+    return ''.join(secrets.choice(string.digits) for _ in range(6))
+
+
+def hash_code(purpose, email, code):
+    message = f'{purpose}:{email}:{code}'.encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def issue_otp(purpose, email, payload=None, user=None):
+    """
+    Create a fresh code for (purpose, email), replacing any earlier one,
+    and return the plain code to send.
+    """
+    code = generate_otp()
+    OTPChallenge.objects.update_or_create(
+        purpose=purpose,
+        email=email,
+        defaults={
+            'code_hash': hash_code(purpose, email, code),
+            'payload': payload or {},
+            'user': user,
+            'attempts': 0,
+            'verified_at': None,
+            'expires_at': timezone.now() + get_ttl(),
+        },
+    )
+    return code
+
+
+def get_challenge(purpose, email, verified=False):
+    """
+    The unexpired challenge for (purpose, email), or None. With verified=True
+    only a challenge whose code has already been entered correctly.
+    """
+    challenges = OTPChallenge.objects.filter(purpose=purpose, email=email, expires_at__gt=timezone.now())
+    if verified:
+        challenges = challenges.filter(verified_at__isnull=False)
+    return challenges.first()
+
+
+def check_otp(purpose, email, code):
+    """
+    Check a submitted code. Returns (status, challenge) where status is OK,
+    INVALID, EXPIRED or LOCKED (too many wrong codes; the challenge is dropped).
+    """
+    challenge = get_challenge(purpose, email)
+    if challenge is None:
+        return EXPIRED, None
+
+    counted = OTPChallenge.objects.filter(pk=challenge.pk, attempts__lt=get_max_attempts()).update(
+        attempts=F('attempts') + 1
+    )
+    if not counted:
+        challenge.delete()
+        return LOCKED, None
+
+    if not hmac.compare_digest(challenge.code_hash, hash_code(purpose, email, code or '')):
+        return INVALID, challenge
+
+    challenge.verified_at = timezone.now()
+    challenge.save(update_fields=['verified_at'])
+    return OK, challenge
+
+
+def sweep_expired(now=None):
+    """
+    Delete expired challenges, including abandoned signups. Returns the number deleted.
+    """
+    deleted, _ = OTPChallenge.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
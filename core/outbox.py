@@ -0,0 +1,156 @@
+"""
+Email outbox: requests enqueue, the send_queued_email worker delivers.
+
+enqueue_email() stores the message in the OutboxEmail table and returns
+immediately, so no request waits on SMTP. deliver_batch() claims the due
+messages, sends them over one connection from the configured EMAIL_BACKEND
+(console/file/locmem work as stand-ins) and schedules retries with
+exponential backoff; messages that keep failing are dead-lettered.
+
+Other apps learn about the outcome through the email_sent and
+email_dead signals (see fees.signals for receipts).
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection as db_connection, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+email_sent = Signal()  # sender=OutboxEmail, email=<OutboxEmail>
+email_dead = Signal()  # sender=OutboxEmail, email=<OutboxEmail>
+
+
+def get_max_attempts():
+    return getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+
+
+def retry_delay(attempts):
+    """
+    Backoff before the next attempt: base * 2^(attempts - 1), capped.
+    """
+    base = getattr(settings, 'EMAIL_OUTBOX_RETRY_BASE_SECONDS', 30)
+    cap = getattr(settings, 'EMAIL_OUTBOX_RETRY_MAX_SECONDS', 3600)
+    return timedelta(seconds=min(cap, base * 2 ** max(attempts - 1, 0)))
+
+
+def enqueue_email(subject, body, to, html_body='', from_email=None, attachment=None, kind=''):
+    """
+    Queue an email for the delivery worker and return the OutboxEmail.
+
+    `attachment` is an optional (filename, content bytes, mimetype) tuple.
+    """
+    name, content, mimetype = attachment or ('', None, '')
+    return OutboxEmail.objects.create(
+        kind=kind,
+        subject=subject,
+        body=body,
+        html_body=html_body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+        attachment_name=name,
+        attachment_content=content,
+        attachment_mimetype=mimetype,
+    )
+
+
+def to_message(email, connection=None):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.to,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    if email.attachment_name:
+        message.attach(email.attachment_name, bytes(email.attachment_content), email.attachment_mimetype)
+    return message
+
+
+def release_stale_claims(older_than):
+    """
+    Put messages left in 'sending' by a worker that died back on the queue.
+    """
+    return OutboxEmail.objects.filter(
+        status=OutboxEmail.SENDING, claimed_at__lt=timezone.now() - older_than
+    ).update(status=OutboxEmail.QUEUED)
+
+
+def claim_batch(batch_size):
+    """
+    Mark up to `batch_size` due messages as sending and return them.
+    Rows locked by another worker are skipped where the database supports it.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due = OutboxEmail.objects.filter(status=OutboxEmail.QUEUED, next_attempt_at__lte=now).order_by('next_attempt_at')
+        if db_connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list('pk', flat=True)[:batch_size])
+        OutboxEmail.objects.filter(pk__in=ids).update(status=OutboxEmail.SENDING, claimed_at=now)
+    return list(OutboxEmail.objects.filter(pk__in=ids).order_by('next_attempt_at'))
+
+
+def record_failure(email, error):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= get_max_attempts():
+        email.status = OutboxEmail.DEAD
+    else:
+        email.status = OutboxEmail.QUEUED
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+    if email.status == OutboxEmail.DEAD:
+        logger.error('Email %s to %s dead-lettered after %s attempts: %s', email.pk, email.to, email.attempts, error)
+        email_dead.send(sender=OutboxEmail, email=email)
+    else:
+        logger.warning('Email %s to %s failed (attempt %s), retrying: %s', email.pk, email.to, email.attempts, error)
+
+
+def deliver_batch(batch_size=50):
+    """
+    Send one batch of due messages over a single backend connection.
+    Returns a dict with the number of messages 'sent', 'retried' and 'dead'.
+    """
+    counts = {'sent': 0, 'retried': 0, 'dead': 0}
+    emails = claim_batch(batch_size)
+    if not emails:
+        return counts
+
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        for email in emails:
+            try:
+                to_message(email, connection).send()
+            except Exception as e:
+                record_failure(email, e)
+                counts['dead' if email.status == OutboxEmail.DEAD else 'retried'] += 1
+                # The connection may be broken; start a fresh one for the rest of the batch
+                connection.close()
+                connection.open()
+                continue
+            email.status = OutboxEmail.SENT
+            email.attempts += 1
+            email.sent_at = timezone.now()
+            email.last_error = ''
+            email.save(update_fields=['status', 'attempts', 'sent_at', 'last_error'])
+            email_sent.send(sender=OutboxEmail, email=email)
+            counts['sent'] += 1
+    except Exception as e:
+        # Could not connect at all: put the unsent rest back with a retry
+        for email in emails:
+            if email.status == OutboxEmail.SENDING:
+                record_failure(email, e)
+                counts['dead' if email.status == OutboxEmail.DEAD else 'retried'] += 1
+    finally:
+        connection.close()
+    return counts
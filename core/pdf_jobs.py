@@ -0,0 +1,182 @@
+"""
+Background rendering of the roster and timetable PDFs.
+
+The download views call request_pdf(), which fingerprints the data behind
+the report with one aggregate query. A finished job with the same
+fingerprint is served straight from media/; otherwise a PDFJob is queued
+and `manage.py run_pdf_jobs` renders it. Nothing is rendered in the request.
+A job left running by a worker that died is put back on the queue by
+release_stale_claims().
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.db.models import Count, Max
+from django.shortcuts import redirect
+from django.utils import timezone
+
+from .models import PDFJob
+
+logger = logging.getLogger(__name__)
+
+# Bump when a PDF layout changes so cached files are re-rendered
+PDF_RENDER_VERSION = 1
+
+# A render takes seconds; a job running for longer was abandoned by its worker
+STALE_AFTER = timedelta(minutes=10)
+
+
+def _data_state(queryset, *related):
+    """
+    Row count and latest updated_at of `queryset` (and of the named related
+    models), from a single aggregate query.
+    """
+    aggregates = {'count': Count('pk'), 'updated_at': Max('updated_at')}
+    for name in related:
+        aggregates[f'{name}_updated_at'] = Max(f'{name}__updated_at')
+    return queryset.aggregate(**aggregates)
+
+
+def _students_all(params):
+    from students.models import Student
+    from students.pdf import render_all_students_pdf
+    return {
+        'state': lambda: _data_state(Student.objects.all()),
+        'render': render_all_students_pdf,
+        'filename': 'all_students_report',
+    }
+
+
+def _teachers_all(params):
+    from school_teachers.models import Teacher
+    from school_teachers.pdf import render_all_teachers_pdf
+    return {
+        'state': lambda: _data_state(Teacher.objects.all()),
+        'render': render_all_teachers_pdf,
+        'filename': 'all_teachers_report',
+    }
+
+
+def _class_timetable(params):
+    from timetable.models import TimeTable
+    from timetable.pdf import render_class_timetable_pdf
+    class_name = params['class_name']
+    return {
+        'state': lambda: _data_state(TimeTable.objects.filter(class_name=class_name), 'subject', 'teacher'),
+        'render': lambda: render_class_timetable_pdf(class_name),
+        'filename': f'class_{class_name}_timetable',
+    }
+
+
+def _teacher_timetable(params):
+    from school_teachers.models import Teacher
+    from timetable.pdf import render_teacher_timetable_pdf
+    teacher_id = params['teacher_id']
+    return {
+        # The header shows the teacher's own details as well
+        'state': lambda: _data_state(
+            Teacher.objects.filter(pk=teacher_id), 'timetable', 'timetable__subject'
+        ),
+        'render': lambda: render_teacher_timetable_pdf(Teacher.objects.get(pk=teacher_id)),
+        'filename': f"teacher_{params['employee_id']}_timetable",
+    }
+
+
+REPORTS = {
+    PDFJob.STUDENTS_ALL: _students_all,
+    PDFJob.TEACHERS_ALL: _teachers_all,
+    PDFJob.CLASS_TIMETABLE: _class_timetable,
+    PDFJob.TEACHER_TIMETABLE: _teacher_timetable,
+}
+
+
+def data_key(kind, params):
+    """
+    Fingerprint of a report: its kind, parameters and the current state of its rows.
+    """
+    state = REPORTS[kind](params)['state']()
+    payload = json.dumps([PDF_RENDER_VERSION, kind, params, state], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def request_pdf(kind, params=None, user=None):
+    """
+    Return the job for the current version of a report: a finished job whose
+    file still exists, a job already queued or running (and not stale), or a
+    new queued job.
+    """
+    params = params or {}
+    key = data_key(kind, params)
+    job = PDFJob.objects.filter(kind=kind, data_key=key).exclude(status=PDFJob.FAILED).exclude(
+        status=PDFJob.RUNNING, started_at__lt=timezone.now() - STALE_AFTER
+    ).first()
+    if job and (job.status != PDFJob.DONE or job.file.storage.exists(job.file.name)):
+        return job
+    return PDFJob.objects.create(kind=kind, params=params, data_key=key, requested_by=user)
+
+
+def pdf_job_redirect(job):
+    """
+    Send the browser to the file if it is ready, otherwise to the progress page.
+    """
+    if job.status == PDFJob.DONE:
+        return redirect('core:pdf_job_download', pk=job.pk)
+    return redirect('core:pdf_job_status', pk=job.pk)
+
+
+def release_stale_claims(older_than=STALE_AFTER):
+    """
+    Put jobs left in 'running' by a worker that died back on the queue.
+    """
+    return PDFJob.objects.filter(
+        status=PDFJob.RUNNING, started_at__lt=timezone.now() - older_than
+    ).update(status=PDFJob.PENDING, started_at=None)
+
+
+def claim_next_job():
+    """
+    Mark the oldest pending job as running and return it, or None if the
+    queue is empty. The conditional UPDATE lets several workers share a queue.
+    """
+    while True:
+        job = PDFJob.objects.filter(status=PDFJob.PENDING).order_by('created_at').first()
+        if job is None:
+            return None
+        started_at = timezone.now()
+        claimed = PDFJob.objects.filter(pk=job.pk, status=PDFJob.PENDING).update(
+            status=PDFJob.RUNNING, started_at=started_at
+        )
+        if claimed:
+            job.status, job.started_at = PDFJob.RUNNING, started_at
+            return job
+
+
+def process_job(job):
+    """
+    Render a claimed job's PDF into media/reports/<kind>_<data_key>.pdf.
+    Returns True on success; failures are recorded on the job.
+    """
+    report = REPORTS[job.kind](job.params)
+    name = f'{job.kind}_{job.data_key}.pdf'
+    try:
+        storage = job.file.storage
+        path = job.file.field.generate_filename(job, name)
+        if storage.exists(path):
+            # Same data already rendered, e.g. by a job queued in a race
+            job.file.name = path
+        else:
+            job.file.save(name, ContentFile(report['render']()), save=False)
+    except Exception as e:
+        logger.exception('PDF job %s (%s) failed', job.pk, job.kind)
+        job.status = PDFJob.FAILED
+        job.error = str(e)
+    else:
+        job.status = PDFJob.DONE
+        job.filename = f"{report['filename']}_{timezone.now().strftime('%Y%m%d')}.pdf"
+    job.finished_at = timezone.now()
+    job.save()
+    return job.status == PDFJob.DONE
+
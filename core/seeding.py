@@ -0,0 +1,401 @@
+"""
+Synthetic data generator for load testing and benchmarks.
+
+Every table is filled with batched bulk_create calls inside a single
+transaction, so model save() hooks (and the per-row User creation in
+Student.save/Teacher.save) are bypassed. Users are created in bulk with one
+pre-hashed password instead of hashing per row. Attendance rows are streamed
+in batches rather than built up in memory, so millions of rows can be written
+in minutes.
+
+Volumes are driven by `scale`: a scale of 1 is roughly one small school
+(STUDENTS_PER_SCALE students, TEACHERS_PER_SCALE teachers); attendance volume
+is students x school days. The same `seed` always produces the same rows.
+"""
+import random
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from attendance.models import Attendance, AttendanceDailySummary, TeacherAttendance
+from attendance.rollup import rebuild_daily_summaries
+from documents.models import DocumentType, StudentDocument
+from events.models import Event
+from fees.ledger import rebuild_ledger
+from fees.models import FeeCollectionTotal, FeeTransaction, StudentFeeBalance
+from library.models import Book, BookCategory, BookIssue
+from school_teachers.models import Teacher
+from students.models import Student
+from subjects.models import Subject, StudentMark
+from timetable.models import TimeTable
+
+STUDENTS_PER_SCALE = 500
+TEACHERS_PER_SCALE = 40
+BOOKS_PER_SCALE = 200
+DEFAULT_BATCH_SIZE = 5000
+
+# Prefix for usernames, roll numbers and codes so generated rows never clash
+# with real data and can be recognised later
+SYNTHETIC_PREFIX = 'syn'
+SYNTHETIC_PASSWORD = 'synthetic-pass'
+
+FIRST_NAMES = [
+    'Aarav', 'Vivaan', 'Aditya', 'Arjun', 'Sai', 'Krishna', 'Ishaan', 'Rohan', 'Kabir', 'Dhruv',
+    'Ananya', 'Diya', 'Priya', 'Meera', 'Saanvi', 'Aadhya', 'Kavya', 'Isha', 'Riya', 'Nisha',
+]
+LAST_NAMES = [
+    'Patel', 'Shah', 'Mehta', 'Desai', 'Joshi', 'Sharma', 'Verma', 'Gupta', 'Singh', 'Kumar',
+    'Trivedi', 'Pandya', 'Bhatt', 'Parmar', 'Chauhan', 'Rathod', 'Solanki', 'Modi', 'Dave', 'Vyas',
+]
+SUBJECT_NAMES = [
+    'Mathematics', 'Science', 'English', 'Gujarati', 'Hindi', 'Social Science',
+    'Sanskrit', 'Computer', 'Drawing', 'Physical Education', 'Environmental Studies', 'Music',
+]
+DOCUMENT_TYPES = [
+    ('Birth Certificate', True), ('Aadhaar Card', True), ('Passport Photo', True),
+    ('Transfer Certificate', False), ('Previous Marksheet', False),
+]
+ATTENDANCE_STATUSES = ['present', 'absent', 'late', 'half_day']
+STUDENT_STATUS_WEIGHTS = [85, 10, 3, 2]
+TEACHER_STATUS_WEIGHTS = [92, 5, 2, 1]
+
+
+class SyntheticDataGenerator:
+    """
+    Generate a deterministic, scaled dataset with bulk inserts.
+
+    Usage:
+        generator = SyntheticDataGenerator(scale=10, seed=42, days=180)
+        counts = generator.generate()
+    """
+    def __init__(self, scale=1.0, seed=42, days=30, students=None, teachers=None,
+                 batch_size=DEFAULT_BATCH_SIZE, end_date=None, log=None):
+        self.scale = scale
+        self.seed = seed
+        self.days = days
+        self.student_count = students if students is not None else max(1, round(STUDENTS_PER_SCALE * scale))
+        self.teacher_count = teachers if teachers is not None else max(1, round(TEACHERS_PER_SCALE * scale))
+        self.book_count = max(10, round(BOOKS_PER_SCALE * scale))
+        self.batch_size = batch_size
+        self.end_date = end_date or timezone.now().date()
+        self.log = log or (lambda message: None)
+        self.rng = random.Random(seed)
+        self.counts = {}
+        self.accounts = {}
+
+    def prefixed(self, value):
+        return f"{SYNTHETIC_PREFIX}_{value}"
+
+    def already_generated(self):
+        return User.objects.filter(username__startswith=f"{SYNTHETIC_PREFIX}_").exists()
+
+    def generate(self):
+        """
+        Generate the whole dataset in one transaction and return row counts per table.
+        """
+        with transaction.atomic():
+            self.create_admin()
+            teachers = self.create_teachers()
+            students = self.create_students()
+            subjects = self.create_subjects(teachers)
+            self.create_timetable(subjects, teachers)
+            self.create_marks(students, subjects)
+            self.create_attendance(students, teachers)
+            self.create_fees(students)
+            self.create_documents(students)
+            self.create_library(students, teachers)
+            self.create_events()
+        return self.counts
+
+    # Helpers
+
+    def bulk_insert(self, model, objects):
+        """
+        Insert objects from any iterable in batches without materialising it all.
+        """
+        iterator = iter(objects)
+        total = 0
+        while True:
+            batch = list(islice(iterator, self.batch_size))
+            if not batch:
+                break
+            model.objects.bulk_create(batch, batch_size=self.batch_size)
+            total += len(batch)
+        self.counts[model._meta.label] = self.counts.get(model._meta.label, 0) + total
+        self.log(f"{model._meta.label}: {total} rows")
+        return total
+
+    def create_users(self, kind, count):
+        """
+        Bulk create `count` users sharing one pre-hashed password.
+        """
+        password = make_password(SYNTHETIC_PASSWORD)
+        users = User.objects.bulk_create([
+            User(
+                username=self.prefixed(f"{kind}{i:06d}"),
+                email=f"{self.prefixed(kind)}{i}@example.com",
+                password=password,
+            )
+            for i in range(count)
+        ], batch_size=self.batch_size)
+        self.counts['auth.User'] = self.counts.get('auth.User', 0) + len(users)
+        return users
+
+    def random_name(self):
+        return self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+
+    def school_days(self):
+        """
+        The last `days` calendar days up to end_date, excluding Sundays.
+        """
+        days = (self.end_date - timedelta(days=offset) for offset in range(self.days))
+        return sorted(day for day in days if day.weekday() != 6)
+
+    # Tables
+
+    def create_admin(self):
+        self.accounts['admin'] = User.objects.create_superuser(
+            self.prefixed('admin'), f"{self.prefixed('admin')}@example.com", SYNTHETIC_PASSWORD
+        )
+
+    def create_teachers(self):
+        users = self.create_users('teacher', self.teacher_count)
+        teachers = []
+        for i, user in enumerate(users):
+            first_name, last_name = self.random_name()
+            teachers.append(Teacher(
+                user=user,
+                first_name=first_name,
+                last_name=last_name,
+                employee_id=self.prefixed(f"T{i:06d}").upper(),
+                gender=self.rng.choice('MF'),
+                date_of_birth=date(1970, 1, 1) + timedelta(days=self.rng.randrange(9000)),
+                email=user.email,
+                phone_number=f"9{self.rng.randrange(10 ** 9):09d}",
+                address='Synthetic Street, Rajkot',
+                qualification=self.rng.choice(['B.Ed', 'M.Ed', 'M.Sc', 'M.A']),
+                specialization=self.rng.choice(SUBJECT_NAMES),
+                joining_date=date(2005, 6, 1) + timedelta(days=self.rng.randrange(6000)),
+            ))
+        teachers = Teacher.objects.bulk_create(teachers, batch_size=self.batch_size)
+        self.counts[Teacher._meta.label] = len(teachers)
+        self.accounts['teacher'] = users[0]
+        return teachers
+
+    def create_students(self):
+        users = self.create_users('student', self.student_count)
+        classes = [value for value, _ in Student.CLASS_CHOICES]
+        students = []
+        for i, user in enumerate(users):
+            first_name, last_name = self.random_name()
+            students.append(Student(
+                user=user,
+                first_name=first_name,
+                last_name=last_name,
+                roll_number=self.prefixed(f"S{i:07d}").upper(),
+                class_name=classes[i % len(classes)],
+                gender=self.rng.choice('MF'),
+                date_of_birth=date(2008, 1, 1) + timedelta(days=self.rng.randrange(3650)),
+                address='Synthetic Street, Rajkot',
+                phone_number=f"9{self.rng.randrange(10 ** 9):09d}",
+                email=user.email,
+                parent_name=f"{self.rng.choice(FIRST_NAMES)} {last_name}",
+                parent_phone=f"9{self.rng.randrange(10 ** 9):09d}",
+                fee_status='unpaid',
+            ))
+        students = Student.objects.bulk_create(students, batch_size=self.batch_size)
+        self.counts[Student._meta.label] = len(students)
+        self.accounts['student'] = users[0]
+        return students
+
+    def create_subjects(self, teachers):
+        subjects = Subject.objects.bulk_create([
+            Subject(
+                name=name,
+                code=self.prefixed(f"SUB{i:03d}").upper(),
+                teacher=teachers[i % len(teachers)],
+                credits=self.rng.randint(2, 5),
+            )
+            for i, name in enumerate(SUBJECT_NAMES)
+        ])
+        self.counts[Subject._meta.label] = len(subjects)
+        return subjects
+
+    def create_timetable(self, subjects, teachers):
+        entries = []
+        for index, (class_name, _) in enumerate(TimeTable.CLASS_CHOICES):
+            for day, _ in TimeTable.DAY_CHOICES:
+                if day == 'sunday':
+                    continue
+                for period, _ in TimeTable.PERIOD_CHOICES:
+                    start_hour = 7 + int(period)
+                    entries.append(TimeTable(
+                        class_name=class_name,
+                        day=day,
+                        period=period,
+                        subject=subjects[(index + int(period)) % len(subjects)],
+                        teacher=teachers[(index * 3 + int(period)) % len(teachers)],
+                        start_time=time(start_hour, 0),
+                        end_time=time(start_hour, 45),
+                        room_number=f"R{class_name}",
+                    ))
+        # A class/day/period slot may already be taken by real data
+        TimeTable.objects.bulk_create(entries, batch_size=self.batch_size, ignore_conflicts=True)
+        self.counts[TimeTable._meta.label] = len(entries)
+
+    def create_marks(self, students, subjects):
+        exam_dates = [self.end_date - timedelta(days=offset) for offset in (90, 30)]
+
+        def marks():
+            for student in students:
+                for subject in subjects[:6]:
+                    for exam_date in exam_dates:
+                        mark = StudentMark(
+                            student=student,
+                            subject=subject,
+                            teacher_id=subject.teacher_id,
+                            marks_obtained=Decimal(self.rng.randint(20, 100)),
+                            total_marks=Decimal(100),
+                            date=exam_date,
+                        )
+                        mark.calculate_result()
+                        yield mark
+
+        self.bulk_insert(StudentMark, marks())
+
+    def create_attendance(self, students, teachers):
+        days = self.school_days()
+        admin = self.accounts['admin']
+        choices = self.rng.choices
+
+        def student_rows():
+            for day in days:
+                statuses = choices(ATTENDANCE_STATUSES, weights=STUDENT_STATUS_WEIGHTS, k=len(students))
+                for student, status in zip(students, statuses):
+                    yield Attendance(student_id=student.pk, date=day, status=status, recorded_by=admin)
+
+        def teacher_rows():
+            for day in days:
+                statuses = choices(ATTENDANCE_STATUSES, weights=TEACHER_STATUS_WEIGHTS, k=len(teachers))
+                for teacher, status in zip(teachers, statuses):
+                    yield TeacherAttendance(teacher_id=teacher.pk, date=day, status=status, recorded_by=admin)
+
+        self.bulk_insert(Attendance, student_rows())
+        self.bulk_insert(TeacherAttendance, teacher_rows())
+        # bulk_create skips the signals that maintain the daily summaries
+        self.counts[AttendanceDailySummary._meta.label] = rebuild_daily_summaries(days[0], days[-1]) if days else 0
+
+    def create_fees(self, students):
+        paid_ids = []
+        paid_at = timezone.make_aware(datetime.combine(self.end_date, time(12)))
+
+        def transactions():
+            for student in students:
+                status = self.rng.choices(
+                    ['completed', 'pending', 'failed', 'refunded'], weights=[70, 15, 10, 5]
+                )[0]
+                if status == 'completed':
+                    paid_ids.append(student.pk)
+                settled_at = paid_at if status in ('completed', 'refunded') else None
+                yield FeeTransaction(
+                    student_id=student.pk,
+                    amount=Decimal(self.rng.choice([1500, 2500, 5000])),
+                    status=status,
+                    transaction_id=self.prefixed(f"order_{student.pk}"),
+                    receipt_number=self.prefixed(f"RCPT{student.pk:08d}").upper() if status == 'completed' else None,
+                    description='Synthetic fee payment',
+                    completed_at=settled_at,
+                    refunded_at=settled_at if status == 'refunded' else None,
+                )
+
+        self.bulk_insert(FeeTransaction, transactions())
+        for start in range(0, len(paid_ids), self.batch_size):
+            Student.objects.filter(pk__in=paid_ids[start:start + self.batch_size]).update(
+                fee_status='paid', last_payment_date=self.end_date
+            )
+        # bulk_create skips the signals that maintain the fee ledger
+        balances, totals = rebuild_ledger()
+        self.counts[StudentFeeBalance._meta.label] = balances
+        self.counts[FeeCollectionTotal._meta.label] = totals
+
+    def create_documents(self, students):
+        DocumentType.objects.bulk_create(
+            [DocumentType(name=name, required=required) for name, required in DOCUMENT_TYPES],
+            ignore_conflicts=True,
+        )
+        document_types = list(DocumentType.objects.filter(name__in=[name for name, _ in DOCUMENT_TYPES]))
+        admin = self.accounts['admin']
+
+        def documents():
+            for student in students:
+                for document_type in document_types:
+                    if self.rng.random() < 0.6:
+                        yield StudentDocument(
+                            student_id=student.pk,
+                            document_type=document_type,
+                            file=f"documents/{student.pk}_{document_type.pk}.pdf",
+                            uploaded_by=admin,
+                        )
+
+        self.bulk_insert(StudentDocument, documents())
+
+    def create_library(self, students, teachers):
+        BookCategory.objects.bulk_create(
+            [BookCategory(name=name) for name, _ in BookCategory.CATEGORY_CHOICES],
+            ignore_conflicts=True,
+        )
+        categories = list(BookCategory.objects.all())
+
+        books = Book.objects.bulk_create([
+            Book(
+                title=f"{self.rng.choice(['The', 'A', 'Our'])} {self.rng.choice(SUBJECT_NAMES)} Book {i}",
+                author=' '.join(self.random_name()),
+                isbn=f"{SYNTHETIC_PREFIX.upper()}{i:010d}",
+                category=categories[i % len(categories)],
+                publisher='Synthetic Press',
+                publication_year=1990 + i % 35,
+                total_copies=3,
+                available_copies=3,
+                shelf_location=f"S{i % 40}",
+            )
+            for i in range(self.book_count)
+        ], batch_size=self.batch_size)
+        self.counts[Book._meta.label] = len(books)
+
+        admin = self.accounts['admin']
+
+        def issues():
+            for i in range(self.book_count * 2):
+                issue_date = self.end_date - timedelta(days=self.rng.randrange(60))
+                due_date = issue_date + timedelta(days=14)
+                status = self.rng.choice(['issued', 'returned', 'overdue'])
+                borrower = {'student': self.rng.choice(students)} if i % 5 else {'teacher': self.rng.choice(teachers)}
+                yield BookIssue(
+                    book=books[i % len(books)],
+                    issue_date=issue_date,
+                    due_date=due_date,
+                    return_date=due_date if status == 'returned' else None,
+                    status=status,
+                    issued_by=admin,
+                    **borrower,
+                )
+
+        self.bulk_insert(BookIssue, issues())
+
+    def create_events(self):
+        event_types = [value for value, _ in Event.EVENT_TYPES]
+        self.bulk_insert(Event, (
+            Event(
+                title=f"Synthetic Event {i}",
+                description='Generated event',
+                event_type=event_types[i % len(event_types)],
+                start_date=self.end_date + timedelta(days=i * 3 - 30),
+                end_date=self.end_date + timedelta(days=i * 3 - 29),
+            )
+            for i in range(max(10, round(20 * self.scale)))
+        ))
@@ -0,0 +1,105 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from attendance.models import Attendance, TeacherAttendance
+from documents.models import DocumentType, StudentDocument
+from events.models import Event
+from fees.models import FeeTransaction
+from school_teachers.models import Teacher
+from students.models import Student
+from subjects.models import Subject
+from timetable.models import TimeTable
+
+from .caching import ATTENDANCE, DOCUMENTS, TIMETABLE, invalidate_namespace
+from .dashboard import invalidate_attendance_chart, invalidate_dashboard, invalidate_events
+from .middleware.user_type import invalidate_user_type
+
+
+@receiver(pre_save, sender=Student)
+@receiver(pre_save, sender=Teacher)
+def remember_previous_user(sender, instance, **kwargs):
+    """
+    Remember which user a profile was linked to before the save, so unlinking
+    a profile also clears the cached role of the user it was taken from.
+    """
+    instance._previous_user_id = None
+    if instance.pk:
+        instance._previous_user_id = sender.objects.filter(pk=instance.pk).values_list(
+            'user_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Teacher)
+def invalidate_profile_user_type(sender, instance, **kwargs):
+    invalidate_user_type(instance.user_id, getattr(instance, '_previous_user_id', None))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_account_user_type(sender, instance, **kwargs):
+    invalidate_user_type(instance.pk)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def invalidate_student_stats(sender, instance, **kwargs):
+    invalidate_dashboard('students')
+
+
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+def invalidate_staff_stats(sender, instance, **kwargs):
+    invalidate_dashboard('staff')
+
+
+@receiver(post_save, sender=FeeTransaction)
+@receiver(post_delete, sender=FeeTransaction)
+def invalidate_revenue(sender, instance, **kwargs):
+    invalidate_dashboard('revenue')
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+@receiver(post_save, sender=TeacherAttendance)
+@receiver(post_delete, sender=TeacherAttendance)
+def invalidate_attendance_chart_for_record(sender, instance, **kwargs):
+    # Views may assign the date as a string straight from the form
+    invalidate_attendance_chart(sender._meta.get_field('date').to_python(instance.date))
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+@receiver(post_save, sender=TeacherAttendance)
+@receiver(post_delete, sender=TeacherAttendance)
+def invalidate_attendance_namespace(sender, instance, **kwargs):
+    invalidate_namespace(ATTENDANCE)
+
+
+@receiver(post_save, sender=TimeTable)
+@receiver(post_delete, sender=TimeTable)
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+def invalidate_timetable_namespace(sender, instance, **kwargs):
+    # Cached timetables show subject and teacher names
+    invalidate_namespace(TIMETABLE)
+
+
+@receiver(post_save, sender=DocumentType)
+@receiver(post_delete, sender=DocumentType)
+@receiver(post_save, sender=StudentDocument)
+@receiver(post_delete, sender=StudentDocument)
+def invalidate_documents_namespace(sender, instance, **kwargs):
+    invalidate_namespace(DOCUMENTS)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_lists(sender, instance, **kwargs):
+    invalidate_events()
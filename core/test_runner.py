@@ -0,0 +1,28 @@
+"""
+Test runner that gives every test run its own in-memory cache.
+
+The configured cache (file, database or Redis) outlives a test run, and
+entries left by an earlier run could be served for the new test
+database's rows. LocMemCacheTestRunner swaps in a local-memory cache with
+override_settings for the duration of the run.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests',
+    }
+}
+
+
+class LocMemCacheTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_override = override_settings(CACHES=TEST_CACHES)
+        self._cache_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_override.disable()
+        super().teardown_test_environment(**kwargs)
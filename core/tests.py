@@ -1,3 +1,689 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from datetime import date, timedelta
+from unittest.mock import patch
+import json
+import logging
+import os
+import shutil
+import tempfile
+from io import StringIO
 
-# Create your tests here.
+from students.models import Student
+from school_teachers.models import Teacher
+from attendance.models import Attendance
+from subjects.models import StudentMark
+from .caching import ATTENDANCE, DASHBOARD, DOCUMENTS, cache_key, cached, invalidate_namespace
+from .management.commands.benchmark import Command as BenchmarkCommand
+from .models import OTPChallenge, OutboxEmail, PDFJob
+from .outbox import deliver_batch, enqueue_email
+from .hot_queries import HOT_QUERIES, full_scans
+from .logging_handlers import JSONFormatter, QueuedRotatingFileHandler
+from .middleware.user_type import get_user_type, user_type_cache_key
+from .seeding import SyntheticDataGenerator
+
+
+class UserTypeCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.teacher_user = User.objects.create_user(
+            username='teacheruser',
+            password='teacherpass',
+            email='teacher@example.com'
+        )
+        self.teacher = Teacher.objects.create(
+            user=self.teacher_user,
+            first_name='Test',
+            last_name='Teacher',
+            employee_id='EMP001',
+            gender='F',
+            date_of_birth=date(1985, 1, 1),
+            email='teacher@example.com',
+            phone_number='1234567890',
+            address='Test Address',
+            qualification='M.Sc',
+            specialization='Maths',
+            joining_date=date(2020, 6, 1)
+        )
+
+        self.student_user = User.objects.create_user(
+            username='studentuser',
+            password='studentpass',
+            email='student@example.com'
+        )
+        self.student = Student.objects.create(
+            user=self.student_user,
+            first_name='Test',
+            last_name='Student',
+            roll_number='TS001',
+            email='student@example.com',
+            date_of_birth=date(2010, 1, 1),
+            gender='M',
+            class_name='1',
+            address='Test Address',
+            phone_number='1234567890',
+            parent_name='Parent Name',
+            parent_phone='1234567890'
+        )
+
+        self.admin_user = User.objects.create_user(
+            username='adminuser',
+            password='adminpass',
+            is_staff=True
+        )
+
+    def test_roles_are_resolved(self):
+        """Test that teachers, students and other users get the right role"""
+        self.assertEqual(get_user_type(self.teacher_user)['teacher_id'], self.teacher.id)
+        self.assertEqual(get_user_type(self.student_user)['student_id'], self.student.id)
+        self.assertEqual(get_user_type(self.admin_user)['user_type'], 'admin')
+
+    def test_cached_role_costs_no_queries(self):
+        """Test that a cached role is served without touching the database"""
+        get_user_type(self.student_user)
+        with self.assertNumQueries(0):
+            role = get_user_type(self.student_user)
+        self.assertEqual(role['user_type'], 'student')
+
+    def test_unlinking_profile_invalidates_previous_user(self):
+        """Test that unlinking a teacher profile clears the old user's cached role"""
+        get_user_type(self.teacher_user)
+        self.teacher.user = self.admin_user
+        self.teacher.save()
+
+        self.assertIsNone(cache.get(user_type_cache_key(self.teacher_user.id)))
+        self.assertEqual(get_user_type(self.teacher_user)['user_type'], 'admin')
+        self.assertEqual(get_user_type(self.admin_user)['user_type'], 'teacher')
+
+    def test_deleting_profile_invalidates_role(self):
+        """Test that deleting a student profile clears the cached role"""
+        get_user_type(self.student_user)
+        self.student.delete()
+        self.assertIsNone(cache.get(user_type_cache_key(self.student_user.id)))
+
+    def test_middleware_attaches_role_to_request(self):
+        """Test that pages see the resolved role on the request"""
+        self.client.login(username='teacheruser', password='teacherpass')
+        response = self.client.get('/home/')
+        self.assertEqual(response.wsgi_request.user_type, 'teacher')
+        self.assertEqual(response.wsgi_request.teacher, self.teacher)
+
+
+class LazyUserTypeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.user = User.objects.create_user(
+            username='staffstudent',
+            password='staffpass',
+            email='staffstudent@example.com',
+            is_staff=True
+        )
+        self.student = Student.objects.create(
+            user=self.user,
+            first_name='Lazy',
+            last_name='Student',
+            roll_number='LS001',
+            email='staffstudent@example.com',
+            date_of_birth=date(2010, 1, 1),
+            gender='F',
+            class_name='2',
+            address='Test Address',
+            phone_number='1234567890',
+            parent_name='Parent Name',
+            parent_phone='1234567890'
+        )
+        self.client.login(username='staffstudent', password='staffpass')
+        cache.clear()
+
+    def role_queries(self, captured):
+        role_tables = (Student._meta.db_table, Teacher._meta.db_table)
+        return [q['sql'] for q in captured.captured_queries
+                if any(f'FROM "{table}"' in q['sql'] for table in role_tables)]
+
+    def test_role_free_endpoint_skips_role_queries(self):
+        """Test that an endpoint which never reads the role does not resolve it"""
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('core:attendance_data_api'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.role_queries(captured), [])
+        self.assertIsNone(cache.get(user_type_cache_key(self.user.id)))
+
+    def test_role_is_resolved_once_per_request(self):
+        """Test that the lazy attributes are resolved on first access and memoized"""
+        response = self.client.get(reverse('core:attendance_data_api'))
+        request = response.wsgi_request
+
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(request.user_type, 'student')
+            self.assertEqual(request.student.id, self.student.id)
+            self.assertEqual(request.student.roll_number, 'LS001')
+            self.assertFalse(request.teacher)
+        # Teacher and student lookups to resolve the role, then one load of the student
+        self.assertEqual(len(self.role_queries(captured)), 3)
+
+
+class APILoggerMiddlewareTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='adminuser',
+            password='adminpass',
+            is_staff=True
+        )
+        self.client.login(username='adminuser', password='adminpass')
+
+    def test_server_timing_header(self):
+        """Test that responses carry a Server-Timing breakdown"""
+        response = self.client.get(reverse('core:attendance_data_api'))
+        timing = response['Server-Timing']
+
+        self.assertIn('db;dur=', timing)
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('view;dur=', timing)
+        self.assertIn('total;dur=', timing)
+        self.assertGreater(response.wsgi_request.api_metrics.query_count, 0)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_slow_request_is_logged(self):
+        """Test that requests over the threshold are written to the slow request log"""
+        with self.assertLogs('api.slow_requests', level='WARNING') as logs:
+            self.client.get(reverse('core:attendance_data_api'))
+
+        record = logs.records[0]
+        self.assertEqual(record.route, 'core:attendance_data_api')
+        self.assertEqual(record.status, 200)
+        self.assertTrue(record.request_id)
+        self.assertGreaterEqual(record.duration_ms, 0)
+        self.assertGreater(record.query_count, 0)
+        self.assertGreaterEqual(record.duplicate_queries, 0)
+        self.assertIn(f'{record.query_count} queries', record.getMessage())
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=60000)
+    def test_fast_request_is_not_logged(self):
+        """Test that requests under the threshold are not logged"""
+        with self.assertNoLogs('api.slow_requests', level='WARNING'):
+            self.client.get(reverse('core:attendance_data_api'))
+
+
+class StructuredLoggingTest(TestCase):
+    def test_queued_handler_writes_single_line_json(self):
+        """Test that queued records are written as one JSON object per line"""
+        with tempfile.TemporaryDirectory() as log_dir:
+            handler = QueuedRotatingFileHandler(os.path.join(log_dir, 'test.log'))
+            handler.setFormatter(JSONFormatter())
+            test_logger = logging.getLogger('core.tests.structured')
+            test_logger.addHandler(handler)
+            test_logger.propagate = False
+            try:
+                test_logger.warning("Payment error: %s", 'gateway', extra={'payment_error': {'amount': 10}})
+                try:
+                    raise ValueError("boom")
+                except ValueError:
+                    test_logger.exception("Failed")
+            finally:
+                test_logger.removeHandler(handler)
+                handler.close()
+
+            with open(os.path.join(log_dir, 'test.log'), encoding='utf-8') as log_file:
+                lines = log_file.read().splitlines()
+
+        self.assertEqual(len(lines), 2)
+        first, second = (json.loads(line) for line in lines)
+        self.assertEqual(first['message'], 'Payment error: gateway')
+        self.assertEqual(first['payment_error'], {'amount': 10})
+        self.assertEqual(first['level'], 'WARNING')
+        self.assertIn('ValueError: boom', second['exception'])
+
+
+class BenchmarkCompareTest(TestCase):
+    def report(self, p95_ms, queries):
+        return {
+            'dataset': {'scale': 0.1, 'days': 5, 'seed': 42},
+            'results': {'home_admin': {'p50_ms': p95_ms, 'p95_ms': p95_ms, 'queries': queries}},
+        }
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        values = list(range(1, 101))
+        self.assertEqual(BenchmarkCommand.percentile(values, 50), 50)
+        self.assertEqual(BenchmarkCommand.percentile(values, 95), 95)
+        self.assertEqual(BenchmarkCommand.percentile([7.0], 95), 7.0)
+
+    def test_compare_within_tolerance(self):
+        """Test that small latency changes pass the comparison"""
+        BenchmarkCommand().compare(self.report(110, 5), self.report(100, 5), tolerance=0.25)
+
+    def test_compare_fails_on_latency_regression(self):
+        """Test that a p95 regression beyond the tolerance fails"""
+        with self.assertRaisesMessage(CommandError, 'home_admin: p95'):
+            BenchmarkCommand().compare(self.report(200, 5), self.report(100, 5), tolerance=0.25)
+
+    def test_compare_fails_on_extra_queries(self):
+        """Test that any increase in query count fails"""
+        with self.assertRaisesMessage(CommandError, '6 queries > baseline 5'):
+            BenchmarkCommand().compare(self.report(100, 6), self.report(100, 5), tolerance=0.25)
+
+
+class BenchmarkCacheIsolationTest(TestCase):
+    def test_run_leaves_nothing_in_the_configured_cache(self):
+        """Test that roles cached for the throwaway database do not outlive a benchmark run"""
+        admin = User.objects.create_superuser('bench_admin', 'bench@example.com', 'password')
+
+        def generate(generator):
+            generator.accounts = {'admin': admin}
+
+        with tempfile.TemporaryDirectory() as output_dir, \
+                patch('core.management.commands.benchmark.setup_test_environment'), \
+                patch('core.management.commands.benchmark.teardown_test_environment'), \
+                patch.object(connection.creation, 'create_test_db', return_value=None), \
+                patch.object(connection.creation, 'destroy_test_db'), \
+                patch.object(SyntheticDataGenerator, 'generate', generate):
+            output = os.path.join(output_dir, 'report.json')
+            call_command('benchmark', '--views', 'home_admin', '--iterations', '1', '--output', output,
+                         stdout=StringIO())
+            with open(output, encoding='utf-8') as report_file:
+                self.assertEqual(json.load(report_file)['results']['home_admin']['status'], 200)
+
+        self.assertIsNone(cache.get(user_type_cache_key(admin.pk)))
+        self.assertFalse([key for key in caches['default']._cache if ':user_type:' in key])
+
+
+class SyntheticDataGeneratorTest(TestCase):
+    def test_generates_scaled_dataset(self):
+        """Test that the generator fills every table with the expected volumes"""
+        generator = SyntheticDataGenerator(scale=0.02, seed=7, days=14, batch_size=50)
+        counts = generator.generate()
+
+        school_days = len(generator.school_days())
+        self.assertEqual(school_days, 12)
+        self.assertEqual(counts['students.Student'], 10)
+        self.assertEqual(Attendance.objects.count(), 10 * school_days)
+        # One user per student and teacher plus the admin, none created by Student.save
+        self.assertEqual(User.objects.count(), counts['students.Student'] + counts['school_teachers.Teacher'] + 1)
+        self.assertTrue(generator.already_generated())
+
+        mark = StudentMark.objects.first()
+        self.assertNotEqual(mark.percentage, 0)
+        self.assertTrue(mark.grade)
+
+    def test_seed_is_deterministic(self):
+        """Test that the same seed produces the same attendance statuses"""
+        def statuses():
+            with transaction.atomic():
+                generator = SyntheticDataGenerator(scale=0.02, seed=3, days=7)
+                generator.generate()
+                result = list(Attendance.objects.order_by('date', 'student__roll_number')
+                              .values_list('status', flat=True))
+                transaction.set_rollback(True)
+            return result
+
+        self.assertEqual(statuses(), statuses())
+
+
+class DashboardCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_user(
+            username='adminuser',
+            password='adminpass',
+            is_staff=True
+        )
+        self.student = Student.objects.create(
+            first_name='Dash',
+            last_name='Student',
+            roll_number='DS001',
+            date_of_birth=date(2010, 1, 1),
+            gender='M',
+            class_name='3',
+            address='Test Address',
+            phone_number='1234567890',
+            parent_name='Parent Name',
+            parent_phone='1234567890'
+        )
+        self.client.login(username='adminuser', password='adminpass')
+
+    def aggregate_queries(self, captured):
+        # Session, auth and the template's profile lookup are per request, not dashboard aggregates
+        per_request_tables = ('"django_session"', '"auth_user"', '"core_profile"')
+        return [q['sql'] for q in captured.captured_queries
+                if q['sql'].startswith('SELECT') and not any(t in q['sql'] for t in per_request_tables)]
+
+    def test_warm_dashboard_skips_aggregate_queries(self):
+        """Test that a warm admin dashboard load runs no aggregate queries"""
+        self.client.get(reverse('core:home'))
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('core:home'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['student_count'], 1)
+        self.assertEqual(self.aggregate_queries(captured), [])
+
+    def test_saves_invalidate_affected_aggregates(self):
+        """Test that student and attendance saves refresh the cached figures"""
+        self.client.get(reverse('core:home'))
+
+        self.student.is_active = False
+        self.student.save()
+        Attendance.objects.create(student=self.student, date=date.today(), status='present')
+        response = self.client.get(reverse('core:home'))
+        self.assertEqual(response.context['student_count'], 0)
+        chart = response.context['attendance_chart_data']
+        self.assertEqual(json.loads(chart['student_present'])[-1], 1)
+
+
+class CacheNamespaceTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_user(username='adminuser', password='adminpass', is_staff=True)
+
+    def test_bump_invalidates_only_its_namespace(self):
+        """Test that bumping a namespace version leaves other namespaces cached"""
+        cached(DOCUMENTS, ('types',), lambda: 'old documents')
+        cached(ATTENDANCE, ('count',), lambda: 'old attendance')
+        documents_key = cache_key(DOCUMENTS, 'types')
+
+        invalidate_namespace(DOCUMENTS)
+
+        self.assertNotEqual(cache_key(DOCUMENTS, 'types'), documents_key)
+        self.assertEqual(cached(DOCUMENTS, ('types',), lambda: 'new documents'), 'new documents')
+        self.assertEqual(cached(ATTENDANCE, ('count',), lambda: 'new attendance'), 'old attendance')
+
+    def test_runs_use_a_fresh_memory_cache(self):
+        """Test that the test runner replaces the configured cache with a local-memory one"""
+        from django.core.cache import caches
+        from django.core.cache.backends.locmem import LocMemCache
+
+        self.assertIsInstance(caches['default'], LocMemCache)
+
+    def test_lost_version_does_not_revive_old_keys(self):
+        """Test that a namespace whose version was evicted starts above the old one"""
+        cached(DOCUMENTS, ('types',), lambda: 'old')
+        cache.delete('namespace_version:documents')
+        self.assertEqual(cached(DOCUMENTS, ('types',), lambda: 'new'), 'new')
+
+    def test_document_matrix_keeps_other_entries(self):
+        """Test that the document matrix no longer flushes the whole cache"""
+        key = cache_key(DASHBOARD, 'students')
+        cache.set(key, {'student_count': 7})
+        self.client.login(username='adminuser', password='adminpass')
+
+        response = self.client.get(reverse('documents:document_matrix'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(cache.get(key), {'student_count': 7})
+
+    def test_document_type_save_invalidates_documents(self):
+        """Test that a document type change refreshes the cached type list"""
+        from documents.models import DocumentType
+
+        self.client.login(username='adminuser', password='adminpass')
+        self.client.get(reverse('documents:document_matrix'))
+        DocumentType.objects.create(name='Birth Certificate')
+
+        response = self.client.get(reverse('documents:document_matrix'))
+        self.assertEqual([t.name for t in response.context['document_types']], ['Birth Certificate'])
+
+
+class ExplainHotQueriesTest(TestCase):
+    def test_full_scan_detection(self):
+        """Test that plain table scans are flagged and index scans are not"""
+        sqlite_plan = (
+            '2 0 0 SCAN fees_feetransaction\n'
+            '5 0 0 SCAN attendance_attendance USING INDEX attendance_date_id_idx\n'
+            '7 0 0 SEARCH students_student USING INTEGER PRIMARY KEY (rowid=?)'
+        )
+        self.assertEqual(full_scans(sqlite_plan, 'sqlite'), ['fees_feetransaction'])
+
+        postgres_plan = (
+            'Limit  (cost=0.29..8.30 rows=1 width=8)\n'
+            '  ->  Seq Scan on events_event  (cost=0.00..1.01 rows=1 width=8)\n'
+            '  ->  Index Scan using feetxn_student_status_idx on fees_feetransaction'
+        )
+        self.assertEqual(full_scans(postgres_plan, 'postgresql'), ['events_event'])
+
+    def test_registered_queries_use_indexes(self):
+        """Test that every hot query is covered by an index on SQLite"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plans are asserted for SQLite only')
+        out = StringIO()
+        call_command('explain_hot_queries', '--fail-on-scan', stdout=out)
+        self.assertIn(f'0 of {len(HOT_QUERIES)} hot queries do a full scan', out.getvalue())
+
+    def test_unknown_query_name(self):
+        with self.assertRaises(CommandError):
+            call_command('explain_hot_queries', '--queries', 'no.such.query', stdout=StringIO())
+
+
+class PDFJobTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = User.objects.create_user(username='adminuser', password='adminpass', is_staff=True)
+        self.student = Student.objects.create(
+            first_name='Roster',
+            last_name='Student',
+            roll_number='RS001',
+            date_of_birth=date(2010, 1, 1),
+            gender='M',
+            class_name='2',
+            address='Test Address',
+            phone_number='1234567890',
+            parent_name='Parent Name',
+            parent_phone='1234567890'
+        )
+        self.client.login(username='adminuser', password='adminpass')
+
+    def run_worker(self):
+        call_command('run_pdf_jobs', '--once', stdout=StringIO())
+
+    def test_roster_is_rendered_once_then_served(self):
+        """Test that the roster renders in the worker and repeat downloads reuse the file"""
+        response = self.client.get(reverse('students:generate_all_students_pdf'))
+        job = PDFJob.objects.get()
+        self.assertRedirects(response, reverse('core:pdf_job_status', args=[job.pk]))
+        self.assertEqual(job.status, PDFJob.PENDING)
+
+        status = self.client.get(reverse('core:pdf_job_status', args=[job.pk]), {'format': 'json'}).json()
+        self.assertEqual((status['status'], status['download_url']), (PDFJob.PENDING, None))
+
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual(job.status, PDFJob.DONE)
+        self.assertTrue(os.path.exists(job.file.path))
+
+        response = self.client.get(reverse('students:generate_all_students_pdf'))
+        self.assertRedirects(
+            response, reverse('core:pdf_job_download', args=[job.pk]), fetch_redirect_response=False
+        )
+        self.assertEqual(PDFJob.objects.count(), 1)
+
+        download = self.client.get(reverse('core:pdf_job_download', args=[job.pk]))
+        self.assertEqual(download['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(download.streaming_content).startswith(b'%PDF'))
+
+    def test_data_change_queues_new_render(self):
+        """Test that editing a student gives the roster a new fingerprint"""
+        self.client.get(reverse('students:generate_all_students_pdf'))
+        self.run_worker()
+
+        self.student.phone_number = '0987654321'
+        self.student.save()
+        self.client.get(reverse('students:generate_all_students_pdf'))
+
+        self.assertEqual(PDFJob.objects.filter(status=PDFJob.PENDING).count(), 1)
+        self.assertEqual(PDFJob.objects.values('data_key').distinct().count(), 2)
+
+    def test_class_timetable_job(self):
+        """Test that a class timetable is queued per class and rendered by the worker"""
+        response = self.client.get(reverse('timetable:generate_class_timetable_pdf_detail', args=['2']))
+        job = PDFJob.objects.get(kind=PDFJob.CLASS_TIMETABLE)
+        self.assertEqual(job.params, {'class_name': '2'})
+        self.assertRedirects(response, reverse('core:pdf_job_status', args=[job.pk]))
+
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual(job.status, PDFJob.DONE)
+        self.assertTrue(job.filename.startswith('class_2_timetable_'))
+
+    def test_abandoned_job_is_requeued(self):
+        """Test that a job left running by a dead worker is not served and gets rendered again"""
+        self.client.get(reverse('students:generate_all_students_pdf'))
+        PDFJob.objects.update(status=PDFJob.RUNNING, started_at=timezone.now() - timedelta(hours=1))
+
+        response = self.client.get(reverse('students:generate_all_students_pdf'))
+        fresh = PDFJob.objects.get(status=PDFJob.PENDING)
+        self.assertRedirects(response, reverse('core:pdf_job_status', args=[fresh.pk]))
+
+        self.run_worker()
+        self.assertEqual(set(PDFJob.objects.values_list('status', flat=True)), {PDFJob.DONE})
+
+
+class CountingEmailBackend(LocmemEmailBackend):
+    """Locmem backend that counts how often a connection is opened"""
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return True
+
+
+@override_settings(EMAIL_BACKEND='core.tests.CountingEmailBackend')
+class EmailOutboxTest(TestCase):
+    def setUp(self):
+        CountingEmailBackend.opened = 0
+        self.user = User.objects.create_user(
+            username='outboxuser',
+            password='outboxpass',
+            email='outbox@example.com'
+        )
+
+    def test_password_reset_only_enqueues(self):
+        """Test that the OTP request queues the email instead of sending it"""
+        response = self.client.post(reverse('core:password_reset_request'), {'email': 'outbox@example.com'})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutboxEmail.objects.get()
+        self.assertEqual((email.kind, email.to, email.status), ('otp', ['outbox@example.com'], OutboxEmail.QUEUED))
+
+        call_command('send_queued_email', '--once', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(OutboxEmail.objects.get().status, OutboxEmail.SENT)
+
+    def test_batch_reuses_one_connection(self):
+        """Test that a batch of messages goes out over a single connection"""
+        for i in range(5):
+            enqueue_email(f'Subject {i}', 'Body', [f'user{i}@example.com'])
+
+        self.assertEqual(deliver_batch()['sent'], 5)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(CountingEmailBackend.opened, 1)
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2, EMAIL_OUTBOX_RETRY_BASE_SECONDS=60)
+    def test_retry_with_backoff_then_dead_letter(self):
+        """Test that failures are retried after a delay and then dead-lettered"""
+        enqueue_email('Subject', 'Body', ['retry@example.com'])
+
+        with patch('django.core.mail.EmailMessage.send', side_effect=OSError('SMTP down')):
+            self.assertEqual(deliver_batch(), {'sent': 0, 'retried': 1, 'dead': 0})
+            email = OutboxEmail.objects.get()
+            self.assertEqual((email.status, email.attempts), (OutboxEmail.QUEUED, 1))
+            self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+            # Not due yet
+            self.assertEqual(deliver_batch(), {'sent': 0, 'retried': 0, 'dead': 0})
+
+            OutboxEmail.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(deliver_batch(), {'sent': 0, 'retried': 0, 'dead': 1})
+
+        email = OutboxEmail.objects.get()
+        self.assertEqual((email.status, email.attempts, email.last_error), (OutboxEmail.DEAD, 2, 'SMTP down'))
+        self.assertEqual(len(mail.outbox), 0)
+
+
+@patch('core.otp.generate_otp', return_value='123456')
+class OTPStoreTest(TestCase):
+    def signup(self):
+        return self.client.post(reverse('core:signup'), {
+            'username': 'newuser',
+            'email': 'new@example.com',
+            'password1': 'S3cure-pass!',
+            'password2': 'S3cure-pass!',
+        })
+
+    def test_signup_verified_from_another_process(self, mock_otp):
+        """Test that a signup OTP is stored in the database, hashed, not in process memory"""
+        self.assertRedirects(self.signup(), reverse('core:verify_signup_otp'))
+        challenge = OTPChallenge.objects.get(purpose=OTPChallenge.SIGNUP, email='new@example.com')
+        self.assertNotIn('123456', challenge.code_hash)
+        self.assertNotIn('S3cure-pass!', json.dumps(challenge.payload))
+
+        # A fresh client stands in for a request served by a different worker
+        response = self.client_class().post(
+            reverse('core:verify_signup_otp'), {'email': 'new@example.com', 'otp': '123456'}
+        )
+
+        self.assertRedirects(response, reverse('core:login'))
+        self.assertTrue(User.objects.get(username='newuser').check_password('S3cure-pass!'))
+        self.assertFalse(OTPChallenge.objects.exists())
+
+    @override_settings(OTP_MAX_ATTEMPTS=3)
+    def test_wrong_codes_lock_the_challenge(self, mock_otp):
+        """Test that the attempt counter stops guessing after OTP_MAX_ATTEMPTS"""
+        self.signup()
+        for _ in range(3):
+            self.client.post(reverse('core:verify_signup_otp'), {'email': 'new@example.com', 'otp': '000000'})
+        self.assertEqual(OTPChallenge.objects.get().attempts, 3)
+
+        response = self.client.post(reverse('core:verify_signup_otp'), {'email': 'new@example.com', 'otp': '123456'})
+
+        self.assertRedirects(response, reverse('core:signup'))
+        self.assertFalse(OTPChallenge.objects.exists())
+        self.assertFalse(User.objects.filter(username='newuser').exists())
+
+    def test_expired_codes_are_rejected_and_swept(self, mock_otp):
+        """Test that expired OTPs are ignored and removed by sweep_otps"""
+        self.signup()
+        OTPChallenge.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = self.client.post(reverse('core:verify_signup_otp'), {'email': 'new@example.com', 'otp': '123456'})
+        self.assertRedirects(response, reverse('core:signup'))
+
+        out = StringIO()
+        call_command('sweep_otps', stdout=out)
+        self.assertIn('Deleted 1 expired OTPs', out.getvalue())
+        self.assertFalse(OTPChallenge.objects.exists())
+
+    def test_password_reset_flow(self, mock_otp):
+        """Test that the password reset OTP must be verified before a new password is accepted"""
+        user = User.objects.create_user(username='resetme', password='old-pass', email='reset@example.com')
+        self.client.post(reverse('core:password_reset_request'), {'email': 'reset@example.com'})
+
+        response = self.client.get(reverse('core:set_new_password'))
+        self.assertRedirects(response, reverse('core:password_reset_request'))
+
+        verify_url = reverse('core:verify_otp', kwargs={'email': 'reset@example.com'})
+        self.assertRedirects(self.client.post(verify_url, {'otp': '123456'}), reverse('core:set_new_password'))
+        response = self.client.post(
+            reverse('core:set_new_password'), {'new_password1': 'new-pass-1', 'new_password2': 'new-pass-1'}
+        )
+
+        self.assertRedirects(response, reverse('core:login'))
+        user.refresh_from_db()
+        self.assertTrue(user.check_password('new-pass-1'))
+        self.assertFalse(OTPChallenge.objects.exists())
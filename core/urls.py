@@ -23,6 +23,10 @@ urlpatterns = [
     # Debug tools
     path('debug/permissions/', login_required(views.debug_permissions), name='debug_permissions'),
     
+    # Background PDF jobs
+    path('pdf-jobs/<int:pk>/', login_required(views.pdf_job_status), name='pdf_job_status'),
+    path('pdf-jobs/<int:pk>/download/', login_required(views.pdf_job_download), name='pdf_job_download'),
+    
     # API endpoints
     path('api/attendance/', login_required(views.attendance_data_api), name='attendance_data_api'),
 ] 
\ No newline at end of file
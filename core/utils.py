@@ -1,11 +1,14 @@
-from django.core.mail import send_mail
-from django.conf import settings
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
+import logging
+
+from .outbox import enqueue_email
+
+logger = logging.getLogger(__name__)
 
 def send_otp_email(email, otp, purpose='registration'):
     """
-    Send OTP email for registration or password reset
+    Queue the OTP email for registration or password reset
     """
     if purpose == 'registration':
         subject = 'Verify Your Email - School Management System'
@@ -23,18 +26,17 @@ def send_otp_email(email, otp, purpose='registration'):
     html_message = render_to_string(template, context)
     plain_message = strip_tags(html_message)
     
-    send_mail(
+    enqueue_email(
         subject=subject,
-        message=plain_message,
-        html_message=html_message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[email],
-        fail_silently=False,
+        body=plain_message,
+        html_body=html_message,
+        to=[email],
+        kind='otp',
     )
 
 def send_welcome_email(user):
     """
-    Send welcome email to newly registered user
+    Queue the welcome email for a newly registered user
     """
     subject = 'Welcome to School Management System'
     template = 'core/emails/welcome.html'
@@ -47,14 +49,13 @@ def send_welcome_email(user):
     plain_message = strip_tags(html_message)
     
     try:
-        send_mail(
+        enqueue_email(
             subject=subject,
-            message=plain_message,
-            html_message=html_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            fail_silently=True,
+            body=plain_message,
+            html_body=html_message,
+            to=[user.email],
+            kind='welcome',
         )
     except Exception as e:
-        print(f"Email sending failed: {str(e)}")
+        logger.warning("Welcome email to %s could not be queued: %s", user.email, e)
         # Log the error but don't fail the registration process 
\ No newline at end of file
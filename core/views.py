@@ -6,34 +6,38 @@ from students.models import Student
 from school_teachers.models import Teacher
 from subjects.models import Subject
 from events.models import Event
-from django.db.models import Sum, Count, Avg, Q
+from django.db.models import Avg, Q
 from django.utils import timezone
 from django.contrib import messages
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
 from django.core.mail import send_mail
 from django.conf import settings
-import random
-import string
-from datetime import datetime, timedelta
 from .forms import SignUpForm, PasswordResetRequestForm, OTPVerificationForm, SetNewPasswordForm
 from .utils import send_otp_email, send_welcome_email
-from django.http import JsonResponse
-import json
+from attendance.stats import attendance_stats
+from .dashboard import (
+    get_attendance_chart, get_events, get_staff_stats, get_student_stats, get_total_revenue,
+)
+from django.http import FileResponse, JsonResponse
+from django.urls import reverse
+from .models import OTPChallenge, PDFJob
+from .otp import (
+    INVALID as OTP_INVALID, LOCKED as OTP_LOCKED, OK as OTP_OK, check_otp, get_challenge, issue_otp,
+)
+import logging
 
-# Store OTPs temporarily (in production, use Redis or database)
-otp_storage = {}
-
-def generate_otp():
-    return ''.join(random.choices(string.digits, k=6))
+logger = logging.getLogger(__name__)
 
 @login_required(login_url='core:login')
 def home(request):
     from subjects.models import Subject, StudentMark
-    from attendance.models import Attendance, TeacherAttendance
+    from attendance.models import Attendance
     from events.models import Event
     from timetable.models import TimeTable
+    from fees.ledger import get_balance
     from fees.models import FeeTransaction
-    from django.db.models import Sum, Count, Avg, Q
+    from django.db.models import Avg, Q
     import datetime
     
     # Check if the logged-in user is a student
@@ -68,35 +72,20 @@ def home(request):
                     data['average'] = total_percentage / len(data['marks'])
                 student_subjects.append(data)
         
-        # Get student's attendance
-        attendance_data = {
-            'present': 0,
-            'absent': 0,
-            'late': 0,
-            'half_day': 0,
-            'total': 0,
-            'percentage': 0,
-            'recent_records': [],
-        }
-        
-        # Get attendance records
+        # Get student's attendance records
         attendance_records = Attendance.objects.filter(student=student).order_by('-date')
-        recent_attendance = attendance_records[:5]  # Last 5 attendance records
         
         # Calculate attendance stats
-        if attendance_records.exists():
-            total_attendance = attendance_records.count()
-            present_count = attendance_records.filter(status='present').count()
-            
-            attendance_data.update({
-                'present': present_count,
-                'absent': attendance_records.filter(status='absent').count(),
-                'late': attendance_records.filter(status='late').count(),
-                'half_day': attendance_records.filter(status='half_day').count(),
-                'total': total_attendance,
-                'percentage': (present_count / total_attendance * 100) if total_attendance > 0 else 0,
-                'recent_records': recent_attendance,
-            })
+        stats = attendance_stats(attendance_records)
+        attendance_data = {
+            'present': stats['present_count'],
+            'absent': stats['absent_count'],
+            'late': stats['late_count'],
+            'half_day': stats['half_day_count'],
+            'total': stats['total_days'],
+            'percentage': stats['attendance_percentage'],
+            'recent_records': attendance_records[:5] if stats['total_days'] else [],  # Last 5 attendance records
+        }
         
         # Get student's timetable for today
         weekday = today.strftime('%A').lower()
@@ -115,20 +104,14 @@ def home(request):
             end_date__gte=today
         ).order_by('end_date')[:3]
         
-        # Get fee payment info
+        # Get fee payment info; totals come from the fee ledger rather than summing transactions
+        balance = get_balance(student)
         fee_data = {
-            'total_paid': 0,
-            'recent_transactions': [],
+            'total_paid': balance.total_paid,
+            'outstanding': balance.outstanding,
+            'recent_transactions': FeeTransaction.objects.filter(student=student).order_by('-created_at')[:3],
         }
         
-        fee_transactions = FeeTransaction.objects.filter(student=student)
-        if fee_transactions.exists():
-            total_paid = fee_transactions.filter(status='completed').aggregate(total=Sum('amount'))['total'] or 0
-            fee_data.update({
-                'total_paid': total_paid,
-                'recent_transactions': fee_transactions.order_by('-created_at')[:3],
-            })
-        
         # Prepare the context for the student dashboard template
         context = {
             'student': student,
@@ -224,131 +207,25 @@ def home(request):
         
         # Only fetch detailed data if user is authenticated
         if request.user.is_authenticated:
-            from students.models import Student
-            from school_teachers.models import Teacher
-            from subjects.models import Subject
-            from fees.models import FeeTransaction
-            
-            # First get total count for percentage calculations
-            student_count = Student.objects.filter(is_active=True).count()
-            
-            # Get class distribution with annotated counts
-            class_distribution = Student.objects.filter(is_active=True).values('class_name').annotate(
-                count=Count('id')
-            ).order_by('class_name')
-            
-            # Calculate total revenue from completed fee transactions
-            total_revenue = FeeTransaction.objects.filter(status='completed').aggregate(
-                total=Sum('amount')
-            )['total'] or 0
-            
-            # Calculate percentage for each class
-            total_students = student_count if student_count > 0 else 1
-            
+            # Aggregates are cached and invalidated by the signal handlers in core.signals
+            context.update(get_student_stats())
+            context.update(get_staff_stats())
+            context.update(get_events())
+            context['total_revenue'] = get_total_revenue()
+
             # Get attendance data for chart
-            attendance_chart_data = {
-                'labels': [],
-                'student_present': [],
-                'student_absent': [],
-                'teacher_present': [],
-                'teacher_absent': [],
-                'start_date': None,
-                'end_date': None
-            }
-            
             if request.user.is_staff or request.user.is_superuser:
-                # Get last 7 days
-                today = timezone.now().date()
-                start_date = today - timedelta(days=6)
-                
-                # Store the actual date range for reference
-                attendance_chart_data['start_date'] = start_date.strftime('%Y-%m-%d')
-                attendance_chart_data['end_date'] = today.strftime('%Y-%m-%d')
-                
-                # Create date labels (Apr 1, Apr 2, etc.)
-                date_labels = []
-                date_values = []
-                
-                for i in range(7):
-                    date_obj = start_date + timedelta(days=i)
-                    date_values.append(date_obj)
-                    # Format as Apr 1, Apr 2, etc.
-                    date_labels.append(date_obj.strftime('%b %d'))
-                
-                attendance_chart_data['labels'] = date_labels
-                
-                # Initialize counts for each day
-                for _ in range(7):
-                    attendance_chart_data['student_present'].append(0)
-                    attendance_chart_data['student_absent'].append(0)
-                    attendance_chart_data['teacher_present'].append(0)
-                    attendance_chart_data['teacher_absent'].append(0)
-                
-                # Get student attendance data
-                student_attendance = Attendance.objects.filter(
-                    date__gte=start_date,
-                    date__lte=today
-                )
-                
-                # Get teacher attendance data
-                # Get teacher attendance data
-                try:
-                    teacher_attendance = TeacherAttendance.objects.filter(
-                        date__gte=start_date,
-                        date__lte=today
-                    )
-                except Exception:
-                    # Handle the case where the table doesn't exist
-                    teacher_attendance = []
-                
-                # Process student attendance
-                for record in student_attendance:
-                    # Find index of this date in our list
-                    try:
-                        idx = date_values.index(record.date)
-                        if record.status == 'present':
-                            attendance_chart_data['student_present'][idx] += 1
-                        elif record.status == 'absent':
-                            attendance_chart_data['student_absent'][idx] += 1
-                    except ValueError:
-                        # Date not in our range
-                        pass
-                
-                # Process teacher attendance
-                for record in teacher_attendance:
-                    # Find index of this date in our list
-                    try:
-                        idx = date_values.index(record.date)
-                        if record.status == 'present':
-                            attendance_chart_data['teacher_present'][idx] += 1
-                        elif record.status == 'absent':
-                            attendance_chart_data['teacher_absent'][idx] += 1
-                    except ValueError:
-                        # Date not in our range
-                        pass
-                
-                # Convert Python lists to JSON strings to avoid template issues
-                attendance_chart_data['labels'] = json.dumps(attendance_chart_data['labels'])
-                attendance_chart_data['student_present'] = json.dumps(attendance_chart_data['student_present'])
-                attendance_chart_data['student_absent'] = json.dumps(attendance_chart_data['student_absent'])
-                attendance_chart_data['teacher_present'] = json.dumps(attendance_chart_data['teacher_present'])
-                attendance_chart_data['teacher_absent'] = json.dumps(attendance_chart_data['teacher_absent'])
-            
-            context.update({
-                'student_count': student_count,
-                'teacher_count': Teacher.objects.filter(is_active=True).count(),
-                'subject_count': Subject.objects.filter(is_active=True).count(),
-                'total_revenue': total_revenue,
-                'class_distribution': class_distribution,
-                'upcoming_events': Event.objects.filter(
-                    start_date__gte=timezone.now().date()
-                ).order_by('start_date')[:5],
-                'ongoing_events': Event.objects.filter(
-                    start_date__lte=timezone.now().date(),
-                    end_date__gte=timezone.now().date()
-                ).order_by('start_date')[:5],
-                'attendance_chart_data': attendance_chart_data,
-            })
+                context['attendance_chart_data'] = get_attendance_chart()
+            else:
+                context['attendance_chart_data'] = {
+                    'labels': [],
+                    'student_present': [],
+                    'student_absent': [],
+                    'teacher_present': [],
+                    'teacher_absent': [],
+                    'start_date': None,
+                    'end_date': None
+                }
         
         return render(request, 'core/home.html', context)
 
@@ -387,29 +264,18 @@ def signup_view(request):
         form = SignUpForm(request.POST)
         if form.is_valid():
             try:
-                # Don't save user yet, just get the form data
-                user_data = {
+                # Don't save user yet; keep the details (password hashed) with the OTP
+                email = form.cleaned_data['email']
+                otp = issue_otp(OTPChallenge.SIGNUP, email, payload={
                     'username': form.cleaned_data['username'],
-                    'email': form.cleaned_data['email'],
-                    'password1': form.cleaned_data['password1'],
-                    'password2': form.cleaned_data['password2']
-                }
-                
-                # Generate and send OTP
-                otp = generate_otp()
-                
-                # Store user data and OTP
-                otp_storage[user_data['email']] = {
-                    'otp': otp,
-                    'user_data': user_data,
-                    'timestamp': datetime.now()
-                }
+                    'password': make_password(form.cleaned_data['password1']),
+                })
                 
                 # Store email in session
-                request.session['signup_email'] = user_data['email']
+                request.session['signup_email'] = email
                 
                 # Send OTP email
-                send_otp_email(user_data['email'], otp, purpose='registration')
+                send_otp_email(email, otp, purpose='registration')
                 
                 messages.success(request, 'Please check your email for the verification OTP.')
                 return redirect('core:verify_signup_otp')
@@ -434,42 +300,36 @@ def verify_signup_otp(request):
         otp = request.POST.get('otp')
         email = request.POST.get('email')
         
-        if email in otp_storage:
-            otp_data = otp_storage[email]
-            
-            # Check if OTP is expired (10 minutes)
-            if datetime.now() - otp_data['timestamp'] > timedelta(minutes=10):
-                del otp_storage[email]
-                messages.error(request, 'OTP has expired. Please register again.')
-                return redirect('core:signup')
-            
-            if otp == otp_data['otp']:
+        status, challenge = check_otp(OTPChallenge.SIGNUP, email, otp)
+        if status == OTP_OK:
+            try:
+                # Create user only after OTP verification
+                user_data = challenge.payload
+                user = User.objects.create(
+                    username=user_data['username'],
+                    email=email,
+                    password=user_data['password'],
+                    is_active=True
+                )
+                
+                # Try to send welcome email, but don't stop the process if it fails
                 try:
-                    # Create user only after OTP verification
-                    user_data = otp_data['user_data']
-                    user = User.objects.create_user(
-                        username=user_data['username'],
-                        email=user_data['email'],
-                        password=user_data['password1']
-                    )
-                    user.is_active = True
-                    user.save()
-                    
-                    # Try to send welcome email, but don't stop the process if it fails
-                    try:
-                        send_welcome_email(user)
-                    except Exception as e:
-                        # Log the error but continue with registration
-                        print(f"Failed to send welcome email: {str(e)}")
-                    
-                    del otp_storage[email]
-                    messages.success(request, 'Email verified successfully! You can now login.')
-                    return redirect('core:login')
+                    send_welcome_email(user)
                 except Exception as e:
-                    messages.error(request, f'Error creating user: {str(e)}')
-                    return redirect('core:signup')
-            else:
-                messages.error(request, 'Invalid OTP. Please try again.')
+                    # Log the error but continue with registration
+                    logger.warning("Failed to send welcome email: %s", e)
+                
+                challenge.delete()
+                messages.success(request, 'Email verified successfully! You can now login.')
+                return redirect('core:login')
+            except Exception as e:
+                messages.error(request, f'Error creating user: {str(e)}')
+                return redirect('core:signup')
+        elif status == OTP_INVALID:
+            messages.error(request, 'Invalid OTP. Please try again.')
+        elif status == OTP_LOCKED:
+            messages.error(request, 'Too many incorrect attempts. Please register again.')
+            return redirect('core:signup')
         else:
             messages.error(request, 'OTP has expired. Please register again.')
             return redirect('core:signup')
@@ -514,13 +374,7 @@ def password_reset_request(request):
             email = form.cleaned_data['email']
             try:
                 user = User.objects.get(email=email)
-                otp = generate_otp()
-                # Store OTP with timestamp
-                otp_storage[email] = {
-                    'otp': otp,
-                    'user_id': user.id,
-                    'timestamp': datetime.now()
-                }
+                otp = issue_otp(OTPChallenge.PASSWORD_RESET, email, user=user)
                 send_otp_email(email, otp, purpose='password_reset')
                 messages.success(request, 'OTP has been sent to your email.')
                 return redirect('core:verify_otp', email=email)
@@ -535,26 +389,23 @@ def verify_otp(request, email):
     if request.user.is_authenticated:
         return redirect('core:home')
         
-    # Check if OTP exists and is not expired (10 minutes)
-    if email not in otp_storage:
-        messages.error(request, 'OTP has expired. Please request a new one.')
-        return redirect('core:password_reset_request')
-        
-    otp_data = otp_storage[email]
-    if datetime.now() - otp_data['timestamp'] > timedelta(minutes=10):
-        del otp_storage[email]
+    # Check if OTP exists and is not expired
+    if get_challenge(OTPChallenge.PASSWORD_RESET, email) is None:
         messages.error(request, 'OTP has expired. Please request a new one.')
         return redirect('core:password_reset_request')
     
     if request.method == 'POST':
         form = OTPVerificationForm(request.POST)
         if form.is_valid():
-            otp = form.cleaned_data['otp']
-            if otp == otp_data['otp']:
+            status, challenge = check_otp(OTPChallenge.PASSWORD_RESET, email, form.cleaned_data['otp'])
+            if status == OTP_OK:
                 request.session['reset_email'] = email
                 return redirect('core:set_new_password')
-            else:
+            elif status == OTP_INVALID:
                 messages.error(request, 'Invalid OTP')
+            else:
+                messages.error(request, 'Too many incorrect attempts. Please request a new OTP.')
+                return redirect('core:password_reset_request')
     else:
         form = OTPVerificationForm()
     
@@ -568,20 +419,20 @@ def set_new_password(request):
         return redirect('core:password_reset_request')
     
     email = request.session['reset_email']
-    if email not in otp_storage:
+    challenge = get_challenge(OTPChallenge.PASSWORD_RESET, email, verified=True)
+    if challenge is None:
         messages.error(request, 'Session expired. Please request a new OTP.')
         return redirect('core:password_reset_request')
     
     if request.method == 'POST':
         form = SetNewPasswordForm(request.POST)
         if form.is_valid():
-            user_id = otp_storage[email]['user_id']
-            user = User.objects.get(id=user_id)
+            user = challenge.user
             user.set_password(form.cleaned_data['new_password1'])
             user.save()
             
             # Clean up
-            del otp_storage[email]
+            challenge.delete()
             del request.session['reset_email']
             
             messages.success(request, 'Password has been reset successfully. Please login with your new password.')
@@ -783,8 +634,7 @@ def attendance_data_api(request):
     if not (request.user.is_staff or request.user.is_superuser):
         return JsonResponse({'error': 'Permission denied'}, status=403)
     
-    from attendance.models import Attendance, TeacherAttendance
-    from django.db.models import Q
+    from attendance.rollup import daily_present_absent
     from datetime import datetime, timedelta
     
     # Get request parameters
@@ -801,63 +651,18 @@ def attendance_data_api(request):
             end_date = timezone.now().date()
             start_date = end_date - timedelta(days=6)
         
-        # Initialize data structure
+        # Daily counts come from the attendance rollup, so the cost grows with days, not records
+        series = daily_present_absent(start_date, end_date)
         attendance_data = {
-            'labels': [],
-            'student_present': [],
-            'student_absent': [],
-            'teacher_present': [],
-            'teacher_absent': [],
+            'labels': [day.strftime('%b %d') for day in series['dates']],
+            'student_present': series['student_present'],
+            'student_absent': series['student_absent'],
+            'teacher_present': series['teacher_present'],
+            'teacher_absent': series['teacher_absent'],
             'start_date': start_date.strftime('%Y-%m-%d'),
             'end_date': end_date.strftime('%Y-%m-%d'),
         }
         
-        # Create date labels and initialize count arrays
-        date_values = []
-        date_range = (end_date - start_date).days + 1
-        
-        for i in range(date_range):
-            date_obj = start_date + timedelta(days=i)
-            date_values.append(date_obj)
-            attendance_data['labels'].append(date_obj.strftime('%b %d'))
-            attendance_data['student_present'].append(0)
-            attendance_data['student_absent'].append(0)
-            attendance_data['teacher_present'].append(0)
-            attendance_data['teacher_absent'].append(0)
-        
-        # Get attendance data
-        student_attendance = Attendance.objects.filter(
-            date__gte=start_date,
-            date__lte=end_date
-        )
-        
-        teacher_attendance = TeacherAttendance.objects.filter(
-            date__gte=start_date,
-            date__lte=end_date
-        )
-        
-        # Process student attendance
-        for record in student_attendance:
-            try:
-                idx = date_values.index(record.date)
-                if record.status == 'present':
-                    attendance_data['student_present'][idx] += 1
-                elif record.status == 'absent':
-                    attendance_data['student_absent'][idx] += 1
-            except ValueError:
-                pass
-        
-        # Process teacher attendance
-        for record in teacher_attendance:
-            try:
-                idx = date_values.index(record.date)
-                if record.status == 'present':
-                    attendance_data['teacher_present'][idx] += 1
-                elif record.status == 'absent':
-                    attendance_data['teacher_absent'][idx] += 1
-            except ValueError:
-                pass
-        
         return JsonResponse(attendance_data)
     
     except Exception as e:
@@ -877,3 +682,40 @@ def debug_permissions(request):
     }
     
     return render(request, 'debug_permissions.html', context)
+
+@login_required
+def pdf_job_status(request, pk):
+    """
+    Progress page for a background PDF job; with ?format=json it returns the
+    job status for the page's polling script.
+    """
+    job = get_object_or_404(PDFJob, pk=pk)
+    download_url = reverse('core:pdf_job_download', args=[job.pk])
+    
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'status': job.status,
+            'download_url': download_url if job.status == PDFJob.DONE else None,
+            'error': job.error,
+        })
+    
+    return render(request, 'core/pdf_job.html', {
+        'job': job,
+        'download_url': download_url,
+    })
+
+@login_required
+def pdf_job_download(request, pk):
+    """
+    Serve the stored file of a finished PDF job.
+    """
+    job = get_object_or_404(PDFJob, pk=pk)
+    if job.status != PDFJob.DONE:
+        return redirect('core:pdf_job_status', pk=job.pk)
+    
+    try:
+        pdf = job.file.open('rb')
+    except FileNotFoundError:
+        messages.error(request, "The generated file is no longer available. Please request it again.")
+        return redirect('core:pdf_job_status', pk=job.pk)
+    return FileResponse(pdf, as_attachment=True, filename=job.filename, content_type='application/pdf')
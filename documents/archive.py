@@ -0,0 +1,72 @@
+"""
+Streaming ZIP archives of student documents.
+
+stream_zip() builds the archive while it is sent: zipfile writes into a
+small buffer that is emptied after every chunk of file data, and data
+descriptors let each entry be written without seeking back. Memory stays
+at about one chunk whatever the number of documents, and nothing is
+written to disk. PDFs barely compress, so entries are stored as they are.
+
+Entries are named '<roll number>_<document type>.pdf', the naming
+documents.ingest reads, so an archive can be imported again.
+"""
+import logging
+import os
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ZipBuffer:
+    """
+    Write-only, unseekable file object that collects zipfile's output until
+    it is taken with drain().
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        if self.chunks:
+            data = b''.join(self.chunks)
+            self.chunks = []
+            yield data
+
+
+def archive_name(document):
+    doc_type = document.document_type.name.lower().replace(' ', '_')
+    extension = os.path.splitext(document.file.name)[1] or '.pdf'
+    return f'{document.student.roll_number}_{doc_type}{extension}'
+
+
+def stream_zip(documents):
+    """
+    Yield the bytes of a ZIP of `documents` (with student and document_type
+    loaded). Files missing from storage are listed in MISSING.txt.
+    """
+    buffer = ZipBuffer()
+    missing = []
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for document in documents:
+            try:
+                source = document.file.open('rb')
+            except (OSError, ValueError):
+                logger.warning("Document %s has no file at %s", document.pk, document.file.name)
+                missing.append(document.file.name or f'document {document.pk}')
+                continue
+            with source, archive.open(archive_name(document), 'w') as entry:
+                for chunk in source.chunks(CHUNK_SIZE):
+                    entry.write(chunk)
+                    yield from buffer.drain()
+            yield from buffer.drain()
+        if missing:
+            archive.writestr('MISSING.txt', '\n'.join(missing) + '\n')
+    yield from buffer.drain()
@@ -51,4 +51,18 @@ class StudentDocumentForm(forms.ModelForm):
             if ext.lower() != '.pdf':
                 raise forms.ValidationError("Only PDF files are allowed.")
                 
-        return file 
\ No newline at end of file
+        return file 
+
+class BulkUploadForm(forms.Form):
+    """
+    Form for importing a ZIP of documents named '<roll number>_<document type>.pdf'
+    """
+    archive = forms.FileField(
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.zip'}),
+        help_text="A ZIP of PDFs named like R1024_birth_certificate.pdf, each up to 250 KB."
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        label='Only check the files',
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
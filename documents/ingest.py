@@ -0,0 +1,242 @@
+"""
+Bulk import of student documents from a folder or a ZIP of PDFs.
+
+Files are named '<roll number>_<document type>.pdf', the type written as in
+its name with spaces as underscores, e.g. 'R1024_birth_certificate.pdf'.
+ingest() checks every file's name, size and first bytes (the PDF
+signature) in a process pool whose workers open the files themselves,
+looks students, types and existing documents up with one query each,
+writes the accepted files to storage and inserts their StudentDocument
+rows with bulk_create. It returns one report entry per file. ZIP members
+are only decompressed in full while being written.
+
+Used by `manage.py ingest_documents` and documents.views.bulk_upload_view.
+"""
+import logging
+import os
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from django.core.files.base import File
+from django.db import transaction
+
+from core.caching import DOCUMENTS, invalidate_namespace
+from students.models import Student
+
+from .models import MAX_DOCUMENT_SIZE, DocumentType, StudentDocument
+
+logger = logging.getLogger(__name__)
+
+PDF_MAGIC = b'%PDF-'
+
+IMPORTED = 'imported'
+READY = 'ready'  # valid, not written because of a dry run
+INVALID = 'invalid'
+BAD_NAME = 'bad_name'
+UNKNOWN_STUDENT = 'unknown_student'
+UNKNOWN_TYPE = 'unknown_type'
+EXISTS = 'exists'
+DUPLICATE = 'duplicate'
+
+# One file to import: `member` is its path in a folder or its ZipInfo in a ZIP
+IngestFile = namedtuple('IngestFile', 'name member size')
+
+# The ZIP a validation worker reads members from (see _open_archive)
+_archive = None
+
+
+def normalize_type_name(name):
+    return ' '.join(name.replace('_', ' ').replace('-', ' ').lower().split())
+
+
+def parse_filename(name):
+    """
+    (roll_number, normalized document type) from a file name, or None.
+    """
+    stem = os.path.splitext(os.path.basename(name))[0]
+    roll_number, _, type_name = stem.partition('_')
+    if not roll_number or not type_name:
+        return None
+    return roll_number, normalize_type_name(type_name)
+
+
+def read_head(open_file, size):
+    # Oversized files are rejected on their size alone
+    if size > MAX_DOCUMENT_SIZE:
+        return b''
+    with open_file() as f:
+        return f.read(len(PDF_MAGIC))
+
+
+def read_folder(path):
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        for name in sorted(names):
+            if not name.startswith('.'):
+                full_path = os.path.join(root, name)
+                files.append(IngestFile(os.path.relpath(full_path, path), full_path, os.path.getsize(full_path)))
+    return files
+
+
+def read_zip(archive):
+    """
+    The members of an open ZIP, read from its directory without decompressing them.
+    """
+    files = []
+    for info in archive.infolist():
+        base = os.path.basename(info.filename)
+        if info.is_dir() or not base or base.startswith('.') or info.filename.startswith('__MACOSX/'):
+            continue
+        files.append(IngestFile(info.filename, info, info.file_size))
+    return files
+
+
+@contextmanager
+def open_source(source):
+    """
+    (files, open_member) for a folder path or a ZIP given as a path or file
+    object; open_member(file) returns a binary file object for one of them.
+    A ZIP stays open until the block ends.
+    """
+    if isinstance(source, (str, os.PathLike)) and os.path.isdir(source):
+        yield read_folder(source), lambda file: open(file.member, 'rb')
+        return
+    try:
+        archive = zipfile.ZipFile(source)
+    except (zipfile.BadZipFile, FileNotFoundError):
+        raise ValueError(f"{source} is neither a folder nor a ZIP file")
+    with archive:
+        yield read_zip(archive), lambda file: archive.open(file.member)
+
+
+def validate_file(name, size, head):
+    """
+    The reason a file cannot be stored as a student document, or None.
+    The same limits as validate_file_size/validate_file_extension, plus
+    the PDF signature. Runs in the worker processes.
+    """
+    if os.path.splitext(name)[1].lower() != '.pdf':
+        return "Only PDF files are allowed."
+    if size > MAX_DOCUMENT_SIZE:
+        return f"The maximum file size allowed is {MAX_DOCUMENT_SIZE // 1024} KB."
+    if head != PDF_MAGIC:
+        return "The file is not a PDF."
+    return None
+
+
+def check_path(name, path, size):
+    return validate_file(name, size, read_head(lambda: open(path, 'rb'), size))
+
+
+def _open_archive(path):
+    # Pool initializer: each worker opens the ZIP once
+    global _archive
+    _archive = zipfile.ZipFile(path)
+
+
+def check_member(name, size):
+    return validate_file(name, size, read_head(lambda: _archive.open(name), size))
+
+
+def validate_files(source, files, open_member, workers=None):
+    """
+    validate_file() for every file. Unless workers == 1, the files are opened
+    and checked in a process pool: folder files by path, and members of a ZIP
+    given as a path from the copy of the archive each worker opens. Uploaded
+    ZIPs (file objects) and workers == 1 are checked in this process.
+    """
+    names = [file.name for file in files]
+    sizes = [file.size for file in files]
+    if workers != 1 and len(files) >= 2:
+        if not isinstance(files[0].member, zipfile.ZipInfo):
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                paths = [file.member for file in files]
+                return list(pool.map(check_path, names, paths, sizes, chunksize=256))
+        if isinstance(source, (str, os.PathLike)):
+            with ProcessPoolExecutor(max_workers=workers, initializer=_open_archive,
+                                     initargs=(os.fspath(source),)) as pool:
+                return list(pool.map(check_member, names, sizes, chunksize=256))
+    return [
+        validate_file(file.name, file.size, read_head(lambda: open_member(file), file.size))
+        for file in files
+    ]
+
+
+def ingest(source, uploaded_by=None, workers=None, dry_run=False):
+    """
+    Import the documents in `source` (see open_source). Returns a list of
+    {'file', 'status', 'message', 'roll_number', 'document_type', 'document'}
+    entries in file order.
+    """
+    with open_source(source) as (files, open_member):
+        return _ingest(source, files, open_member, uploaded_by, workers, dry_run)
+
+
+def _ingest(source, files, open_member, uploaded_by, workers, dry_run):
+    errors = validate_files(source, files, open_member, workers)
+    parsed = [parse_filename(file.name) for file in files]
+
+    rolls = {key[0] for key in parsed if key}
+    students = {student.roll_number: student for student in Student.objects.filter(roll_number__in=rolls)}
+    types = {normalize_type_name(doc_type.name): doc_type for doc_type in DocumentType.objects.filter(active=True)}
+    existing = set(StudentDocument.objects.filter(student__in=students.values()).values_list(
+        'student_id', 'document_type_id'
+    ))
+
+    report, pending, batch = [], [], set()
+    for file, error, key in zip(files, errors, parsed):
+        entry = {'file': file.name, 'status': None, 'message': '', 'roll_number': None,
+                 'document_type': None, 'document': None}
+        report.append(entry)
+        if key is None:
+            entry.update(status=BAD_NAME, message="Name files '<roll number>_<document type>.pdf'")
+            continue
+        roll_number, type_name = key
+        entry['roll_number'] = roll_number
+        student, doc_type = students.get(roll_number), types.get(type_name)
+        if doc_type:
+            entry['document_type'] = doc_type.name
+        if error:
+            entry.update(status=INVALID, message=error)
+        elif student is None:
+            entry.update(status=UNKNOWN_STUDENT, message=f"No student with roll number {roll_number}")
+        elif doc_type is None:
+            entry.update(status=UNKNOWN_TYPE, message=f"No active document type '{type_name}'")
+        elif (student.pk, doc_type.pk) in batch:
+            entry.update(status=DUPLICATE, message=f"Another file in this batch is {roll_number}'s {doc_type.name}")
+        elif (student.pk, doc_type.pk) in existing:
+            # Replacing a stored document goes through the update view
+            entry.update(status=EXISTS, message=f"{roll_number} already has a {doc_type.name}")
+        else:
+            batch.add((student.pk, doc_type.pk))
+            entry['status'] = READY
+            pending.append((file, entry, StudentDocument(student=student, document_type=doc_type,
+                                                          uploaded_by=uploaded_by)))
+
+    if dry_run or not pending:
+        return report
+
+    documents = []
+    try:
+        for file, entry, document in pending:
+            # One file's data at a time, read straight into storage
+            with open_member(file) as f:
+                document.file.save(os.path.basename(file.name), File(f), save=False)
+            documents.append(document)
+        with transaction.atomic():
+            StudentDocument.objects.bulk_create(documents, batch_size=500)
+    except Exception:
+        # Leave no orphaned files behind
+        for document in documents:
+            document.file.delete(save=False)
+        raise
+
+    for file, entry, document in pending:
+        entry.update(status=IMPORTED, document=document.pk)
+    # bulk_create sends no post_save, so the cached matrix data is invalidated here
+    invalidate_namespace(DOCUMENTS)
+    logger.info("Imported %s of %s documents", len(documents), len(files))
+    return report
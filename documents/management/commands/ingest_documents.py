@@ -0,0 +1,63 @@
+"""
+Management command to import a folder or ZIP of student documents (see documents.ingest)
+"""
+import json
+import os
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.ingest import ingest
+
+
+class Command(BaseCommand):
+    help = (
+        "Import PDFs named '<roll number>_<document type>.pdf' from a folder or ZIP as student "
+        "documents and print a per-file JSON report"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Folder or ZIP file of PDFs')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Processes validating the files (default: one per CPU)'
+        )
+        parser.add_argument('--uploaded-by', help='Username recorded as the uploader')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and match the files without importing')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+
+        uploaded_by = None
+        if options['uploaded_by']:
+            try:
+                uploaded_by = User.objects.get(username=options['uploaded_by'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['uploaded_by']}")
+
+        try:
+            report = ingest(
+                options['source'],
+                uploaded_by=uploaded_by,
+                workers=options['workers'],
+                dry_run=options['dry_run'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        counts = Counter(entry['status'] for entry in report)
+        document = json.dumps({'dry_run': options['dry_run'], 'summary': counts, 'files': report}, indent=2)
+        summary = f"{len(report)} files: " + ', '.join(f'{count} {status}' for status, count in sorted(counts.items()))
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(document + '\n')
+            self.stdout.write(self.style.SUCCESS(f"{summary}; report written to {options['output']}"))
+        else:
+            # Keep stdout machine-readable
+            self.stdout.write(document)
+            self.stderr.write(summary)
@@ -0,0 +1,61 @@
+"""
+The student × document type matrix behind documents.views.document_matrix_view.
+
+build_matrix() loads the documents of one page of students with a single
+query and lays them out as rows of cells, so the template never queries
+per cell. completion_summary() counts, with one grouped aggregate over all
+matching students, how many have each active document type, from which
+the completion percentages and missing required documents follow.
+"""
+from collections import namedtuple
+
+from django.db.models import Count
+
+from .models import StudentDocument
+
+MatrixRow = namedtuple('MatrixRow', 'student cells')
+MatrixCell = namedtuple('MatrixCell', 'document_type document')
+TypeSummary = namedtuple('TypeSummary', 'document_type uploaded missing percent')
+
+
+def build_matrix(students, document_types):
+    """
+    Rows of (student, [(document_type, document or None), ...]) for a page
+    of students, plus the {'<student_id>_<type_id>': document} lookup.
+    """
+    students = list(students)
+    documents = StudentDocument.objects.filter(
+        student_id__in=[student.pk for student in students],
+        document_type_id__in=[doc_type.pk for doc_type in document_types],
+    ).select_related('uploaded_by')
+    lookup = {f'{doc.student_id}_{doc.document_type_id}': doc for doc in documents}
+
+    rows = [
+        MatrixRow(student, [
+            MatrixCell(doc_type, lookup.get(f'{student.pk}_{doc_type.pk}')) for doc_type in document_types
+        ])
+        for student in students
+    ]
+    return rows, lookup
+
+
+def completion_summary(students, document_types, student_count):
+    """
+    Per-type upload counts and completion percentages over the `students`
+    queryset (`student_count` of them), and the number of required
+    documents still missing across those students.
+    """
+    uploaded = dict(
+        StudentDocument.objects.filter(
+            student__in=students.order_by().values('pk'),
+            document_type_id__in=[doc_type.pk for doc_type in document_types],
+        ).values('document_type_id').annotate(count=Count('pk')).order_by().values_list('document_type_id', 'count')
+    ) if student_count else {}
+
+    summaries = []
+    for doc_type in document_types:
+        count = uploaded.get(doc_type.pk, 0)
+        percent = round(100 * count / student_count) if student_count else 0
+        summaries.append(TypeSummary(doc_type, count, student_count - count, percent))
+    missing_required = sum(summary.missing for summary in summaries if summary.document_type.required)
+    return summaries, missing_required
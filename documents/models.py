@@ -4,12 +4,14 @@ from django.core.exceptions import ValidationError
 from students.models import Student
 import os
 
+MAX_DOCUMENT_SIZE = 250 * 1024  # 250 KB in bytes
+
 def validate_file_size(value):
     """
     Validates that the file size is less than or equal to 250 KB
     """
     filesize = value.size
-    if filesize > 250 * 1024:  # 250 KB in bytes
+    if filesize > MAX_DOCUMENT_SIZE:
         raise ValidationError("The maximum file size allowed is 250 KB.")
     return value
 
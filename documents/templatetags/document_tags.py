@@ -1,5 +1,7 @@
 from django import template
-from ..models import StudentDocument
+import logging
+
+logger = logging.getLogger(__name__)
 
 register = template.Library()
 
@@ -13,25 +15,13 @@ def get_item(dictionary, key):
     which is constructed as student_id_document_type_id.
     """
     if dictionary is None:
-        print(f"Error in get_item: dictionary is None, key={key}")
+        logger.warning("get_item called with no dictionary, key=%s", key)
         return None
     
     try:
-        # Check if the key exists
-        found = key in dictionary
-        value = dictionary.get(key, None)
-        
-        # Print debugging info
-        if found and value:
-            print(f"✅ Found document for key {key}: {value.student.first_name} {value.student.last_name} - {value.document_type.name}")
-        elif key and key.strip():
-            # Only print if key isn't empty/whitespace
-            print(f"❌ No document found for key: {key}")
-        
-        return value
-    except Exception as e:
-        # Print any errors that occur
-        print(f"Error in get_item with key {key}: {str(e)}")
+        return dictionary.get(key, None)
+    except Exception:
+        logger.exception("Error in get_item with key %s", key)
         return None
 
 @register.simple_tag
@@ -40,45 +30,19 @@ def debug_keys(dictionary):
     Prints all keys in the dictionary for debugging.
     Usage: {% debug_keys dictionary %}
     """
-    if dictionary:
-        print("All keys in dictionary:")
-        for key in dictionary.keys():
-            print(f"- {key}")
-    else:
-        print("Dictionary is empty or None")
-    return "" 
+    if logger.isEnabledFor(logging.DEBUG):
+        if dictionary:
+            logger.debug("All keys in dictionary: %s", ", ".join(str(key) for key in dictionary.keys()))
+        else:
+            logger.debug("Dictionary is empty or None")
+    return ""
 
-@register.simple_tag
-def get_document(student_id, doc_type_id):
+@register.simple_tag(takes_context=True)
+def get_document(context, student_id, doc_type_id):
     """
-    Get a document by student ID and document type ID
+    Get a document by student ID and document type ID from the page's
+    document_lookup (see documents.matrix.build_matrix), without a query.
     Usage: {% get_document student.id doc_type.id as document %}
     """
-    try:
-        # Print for debugging
-        print(f"Looking for document with student_id={student_id}, doc_type_id={doc_type_id}")
-        
-        # Query all documents for this student & document type
-        docs = StudentDocument.objects.filter(student_id=student_id, document_type_id=doc_type_id)
-        count = docs.count()
-        
-        if count > 1:
-            # If multiple documents found (shouldn't happen), log and return the most recent
-            print(f"WARNING: Found {count} documents for student {student_id} and doc_type {doc_type_id}")
-            for d in docs:
-                print(f"  - ID: {d.id}, Filename: {d.filename}")
-            document = docs.order_by('-created_at').first()
-            print(f"Returning most recent: {document.id}")
-            return document
-        elif count == 1:
-            # Single document found (expected case)
-            document = docs.first()
-            print(f"Found document: {document.id}, Filename: {document.filename}")
-            return document
-        else:
-            # No document found
-            print(f"No document found for student {student_id} and doc_type {doc_type_id}")
-            return None
-    except Exception as e:
-        print(f"Error getting document: {e}")
-        return None 
\ No newline at end of file
+    return get_item(context.get('document_lookup'), f"{student_id}_{doc_type_id}")
+ 
\ No newline at end of file
@@ -1,3 +1,400 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import date
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from students.models import Student
+from .archive import CHUNK_SIZE
+from .ingest import BAD_NAME, DUPLICATE, EXISTS, IMPORTED, INVALID, UNKNOWN_STUDENT, UNKNOWN_TYPE
+from .models import DocumentType, StudentDocument
+
+
+class DocumentMatrixTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_user(username='adminuser', password='adminpass', is_staff=True)
+        self.students = [
+            Student.objects.create(
+                first_name=f'Student{i:02d}',
+                last_name='Test',
+                roll_number=f'DM{i:03d}',
+                date_of_birth=date(2010, 1, 1),
+                gender='M',
+                class_name='5',
+                address='Test Address',
+                phone_number='1234567890',
+                parent_name='Parent Name',
+                parent_phone='1234567890'
+            )
+            for i in range(12)
+        ]
+        self.birth = DocumentType.objects.create(name='Birth Certificate', required=True)
+        self.photo = DocumentType.objects.create(name='Photo')
+        for student in self.students[:3]:
+            StudentDocument.objects.create(student=student, document_type=self.birth, file='documents/birth.pdf')
+        StudentDocument.objects.create(student=self.students[0], document_type=self.photo, file='documents/photo.pdf')
+        self.client.login(username='adminuser', password='adminpass')
+
+    def matrix_queries(self):
+        # Session and auth lookups are per request, not part of the matrix
+        per_request_tables = ('FROM "django_session"', 'FROM "auth_user"', 'FROM "core_profile"')
+        self.client.get(reverse('documents:document_matrix'))
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('documents:document_matrix'))
+        self.assertEqual(response.status_code, 200)
+        queries = [q['sql'] for q in captured.captured_queries
+                   if q['sql'].startswith('SELECT') and not any(t in q['sql'] for t in per_request_tables)]
+        return response, queries
+
+    def test_completion_summary(self):
+        """Test the per-type completion and the missing required count"""
+        response, _ = self.matrix_queries()
+
+        summaries = {s.document_type.name: s for s in response.context['type_summaries']}
+        self.assertEqual(summaries['Birth Certificate'].uploaded, 3)
+        self.assertEqual(summaries['Birth Certificate'].percent, 25)
+        self.assertEqual(summaries['Photo'].missing, 11)
+        self.assertEqual(response.context['missing_required'], 9)
+
+        first_row = response.context['rows'][0]
+        self.assertEqual(first_row.student, self.students[0])
+        self.assertEqual([cell.document is not None for cell in first_row.cells], [True, True])
+
+    def test_query_count_does_not_grow_with_document_types(self):
+        """Test that the matrix page runs the same few queries however many types exist"""
+        _, queries = self.matrix_queries()
+        self.assertLessEqual(len(queries), 4)
+
+        for i in range(20):
+            DocumentType.objects.create(name=f'Extra {i}')
+        _, more_queries = self.matrix_queries()
+        self.assertEqual(len(more_queries), len(queries))
+
+
+class DocumentDownloadTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.content = b'%PDF-1.4 ' + bytes(range(256)) * 4
+        os.makedirs(os.path.join(self.media_root, 'documents'))
+        with open(os.path.join(self.media_root, 'documents', 'birth.pdf'), 'wb') as f:
+            f.write(self.content)
+
+        User.objects.create_user(username='adminuser', password='adminpass', is_staff=True)
+        student = Student.objects.create(
+            first_name='Down',
+            last_name='Load',
+            roll_number='DL001',
+            date_of_birth=date(2010, 1, 1),
+            gender='F',
+            class_name='5',
+            address='Test Address',
+            phone_number='1234567890',
+            parent_name='Parent Name',
+            parent_phone='1234567890'
+        )
+        document_type = DocumentType.objects.create(name='Birth Certificate')
+        self.document = StudentDocument.objects.create(
+            student=student, document_type=document_type, file='documents/birth.pdf'
+        )
+        self.url = reverse('documents:download_document', args=[self.document.id])
+        self.client.login(username='adminuser', password='adminpass')
+
+    def test_download_sets_validators(self):
+        """Test that a download carries ETag and Last-Modified and the file itself"""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertTrue(response['ETag'])
+        self.assertTrue(response['Last-Modified'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('attachment', response['Content-Disposition'])
+
+    def test_repeat_download_is_not_modified(self):
+        """Test that a repeat download with the ETag or date gets a 304 until the document changes"""
+        first = self.client.get(self.url)
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304
+        )
+
+        self.document.notes = 'Replaced'
+        self.document.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_range_requests(self):
+        """Test partial content, suffix ranges, If-Range and unsatisfiable ranges"""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-5:])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    @override_settings(FILE_SERVING_MODE='nginx', FILE_SERVING_INTERNAL_PREFIX='/protected-media/')
+    def test_nginx_offload(self):
+        """Test that nginx mode hands the file to nginx instead of sending it"""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/documents/birth.pdf')
+        self.assertEqual(response.content, b'')
+        self.assertTrue(response['ETag'])
+
+    @override_settings(FILE_SERVING_MODE='sendfile')
+    def test_sendfile_offload(self):
+        """Test that sendfile mode points the web server at the file"""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, 'documents', 'birth.pdf'))
+        self.assertEqual(response.content, b'')
+
+    def test_download_requires_admin(self):
+        """Test that the permission check runs before any file is offloaded"""
+        self.client.logout()
+        with override_settings(FILE_SERVING_MODE='nginx'):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn('X-Accel-Redirect', response)
+
+
+class DocumentIngestTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.admin_user = User.objects.create_user(username='adminuser', password='adminpass', is_staff=True)
+        self.students = [
+            Student.objects.create(
+                first_name=f'Ingest{i}',
+                last_name='Test',
+                roll_number=f'IN{i:03d}',
+                date_of_birth=date(2010, 1, 1),
+                gender='M',
+                class_name='1',
+                address='Test Address',
+                phone_number='1234567890',
+                parent_name='Parent Name',
+                parent_phone='1234567890'
+            )
+            for i in range(3)
+        ]
+        self.birth = DocumentType.objects.create(name='Birth Certificate')
+        self.photo = DocumentType.objects.create(name='Photo')
+        StudentDocument.objects.create(student=self.students[2], document_type=self.photo, file='documents/old.pdf')
+
+        self.pdf = b'%PDF-1.4 test document'
+        self.files = {
+            'IN000_birth_certificate.pdf': self.pdf,
+            'IN001_Birth-Certificate.pdf': self.pdf,
+            'IN001_photo.pdf': self.pdf,
+            'class1/IN000_photo.pdf': b'not really a pdf',
+            'IN002_photo.pdf': self.pdf,
+            'IN002_report_card.pdf': self.pdf,
+            'XX999_photo.pdf': self.pdf,
+            'scan.pdf': self.pdf,
+            'IN000_large.pdf': b'%PDF-' + b'0' * (250 * 1024),
+        }
+
+    def statuses(self, report):
+        return {entry['file']: entry['status'] for entry in report}
+
+    def test_command_imports_folder_in_process_pool(self):
+        """Test importing a folder with the validation spread over processes"""
+        source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source, ignore_errors=True)
+        for name, content in self.files.items():
+            os.makedirs(os.path.dirname(os.path.join(source, name)), exist_ok=True)
+            with open(os.path.join(source, name), 'wb') as f:
+                f.write(content)
+
+        out = StringIO()
+        call_command('ingest_documents', source, '--workers', '2', '--uploaded-by', 'adminuser',
+                     stdout=out, stderr=StringIO())
+        statuses = self.statuses(json.loads(out.getvalue())['files'])
+
+        self.assertEqual(statuses, {
+            'IN000_birth_certificate.pdf': IMPORTED,
+            'IN001_Birth-Certificate.pdf': IMPORTED,
+            'IN001_photo.pdf': IMPORTED,
+            os.path.join('class1', 'IN000_photo.pdf'): INVALID,
+            'IN002_photo.pdf': EXISTS,
+            'IN002_report_card.pdf': UNKNOWN_TYPE,
+            'XX999_photo.pdf': UNKNOWN_STUDENT,
+            'scan.pdf': BAD_NAME,
+            'IN000_large.pdf': INVALID,
+        })
+        document = StudentDocument.objects.get(student=self.students[1], document_type=self.birth)
+        self.assertEqual(document.uploaded_by, self.admin_user)
+        with document.file.open('rb') as f:
+            self.assertEqual(f.read(), self.pdf)
+
+    def test_command_imports_zip_in_process_pool(self):
+        """Test importing a ZIP whose members are checked by the pool workers"""
+        source = os.path.join(tempfile.mkdtemp(), 'docs.zip')
+        self.addCleanup(shutil.rmtree, os.path.dirname(source), ignore_errors=True)
+        with zipfile.ZipFile(source, 'w') as archive:
+            for name, content in self.files.items():
+                archive.writestr(name, content)
+
+        out = StringIO()
+        call_command('ingest_documents', source, '--workers', '2', stdout=out, stderr=StringIO())
+        statuses = self.statuses(json.loads(out.getvalue())['files'])
+
+        self.assertEqual(statuses['IN000_birth_certificate.pdf'], IMPORTED)
+        self.assertEqual(statuses['class1/IN000_photo.pdf'], INVALID)
+        self.assertEqual(statuses['IN000_large.pdf'], INVALID)
+        document = StudentDocument.objects.get(student=self.students[1], document_type=self.birth)
+        with document.file.open('rb') as f:
+            self.assertEqual(f.read(), self.pdf)
+
+    def test_dry_run_writes_nothing(self):
+        """Test that a dry run reports the files without importing them"""
+        source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source, ignore_errors=True)
+        with open(os.path.join(source, 'IN000_photo.pdf'), 'wb') as f:
+            f.write(self.pdf)
+
+        call_command('ingest_documents', source, '--dry-run', '--workers', '1', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(StudentDocument.objects.count(), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'documents')))
+
+    def test_bulk_upload_view_imports_zip(self):
+        """Test the admin upload of a ZIP, including a file repeated in the archive"""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('IN000_photo.pdf', self.pdf)
+            archive.writestr('copies/IN000_photo.pdf', self.pdf)
+            archive.writestr('IN001_photo.txt', b'notes')
+        self.client.login(username='adminuser', password='adminpass')
+
+        response = self.client.post(reverse('documents:bulk_upload'), {
+            'archive': SimpleUploadedFile('docs.zip', buffer.getvalue(), content_type='application/zip'),
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.statuses(response.context['report']), {
+            'IN000_photo.pdf': IMPORTED,
+            'copies/IN000_photo.pdf': DUPLICATE,
+            'IN001_photo.txt': INVALID,
+        })
+        self.assertTrue(StudentDocument.objects.filter(student=self.students[0], document_type=self.photo).exists())
+
+    def test_bulk_upload_rejects_non_zip(self):
+        """Test that an upload that is not a ZIP is reported on the form"""
+        self.client.login(username='adminuser', password='adminpass')
+        response = self.client.post(reverse('documents:bulk_upload'), {
+            'archive': SimpleUploadedFile('docs.pdf', self.pdf, content_type='application/pdf'),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('archive', response.context['form'].errors)
+
+
+class DocumentArchiveTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        os.makedirs(os.path.join(self.media_root, 'documents'))
+
+        User.objects.create_user(username='adminuser', password='adminpass', is_staff=True)
+        self.birth = DocumentType.objects.create(name='Birth Certificate')
+        self.photo = DocumentType.objects.create(name='Photo')
+        self.contents = {}
+        for i, class_name in enumerate(['4', '4', '6']):
+            student = Student.objects.create(
+                first_name=f'Zip{i}',
+                last_name='Test',
+                roll_number=f'ZP{i:03d}',
+                date_of_birth=date(2010, 1, 1),
+                gender='F',
+                class_name=class_name,
+                address='Test Address',
+                phone_number='1234567890',
+                parent_name='Parent Name',
+                parent_phone='1234567890'
+            )
+            for doc_type in (self.birth, self.photo):
+                name = f'documents/{student.roll_number}_{doc_type.pk}.pdf'
+                content = b'%PDF-1.4 ' + os.urandom(100 * 1024)
+                with open(os.path.join(self.media_root, name), 'wb') as f:
+                    f.write(content)
+                StudentDocument.objects.create(student=student, document_type=doc_type, file=name)
+                self.contents[name] = content
+        self.client.login(username='adminuser', password='adminpass')
+
+    def download(self, **params):
+        response = self.client.get(reverse('documents:download_zip'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        chunks = list(response.streaming_content)
+        return chunks, zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+
+    def test_class_archive_streams_in_small_chunks(self):
+        """Test that a class archive holds its documents and is sent a chunk at a time"""
+        chunks, archive = self.download(class_name='4')
+
+        self.assertEqual(archive.namelist(), [
+            'ZP000_birth_certificate.pdf', 'ZP000_photo.pdf', 'ZP001_birth_certificate.pdf', 'ZP001_photo.pdf',
+        ])
+        self.assertEqual(archive.read('ZP001_photo.pdf'), self.contents[f'documents/ZP001_{self.photo.pk}.pdf'])
+        self.assertIsNone(archive.testzip())
+        # Never more than one file chunk plus zip headers is held in memory
+        self.assertLess(max(len(chunk) for chunk in chunks), CHUNK_SIZE + 1024)
+
+    def test_metadata_is_one_query(self):
+        """Test that the archive's documents are fetched with a single query"""
+        with CaptureQueriesContext(connection) as captured:
+            chunks, archive = self.download(document_type=self.photo.pk)
+        queries = [q['sql'] for q in captured.captured_queries if 'documents_studentdocument' in q['sql']]
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(len(archive.namelist()), 3)
+
+    def test_missing_files_are_listed(self):
+        """Test that a document whose file is gone is named in MISSING.txt"""
+        student = Student.objects.get(roll_number='ZP002')
+        os.remove(os.path.join(self.media_root, f'documents/ZP002_{self.birth.pk}.pdf'))
+
+        _, archive = self.download(student=student.pk)
+
+        self.assertEqual(archive.namelist(), ['ZP002_photo.pdf', 'MISSING.txt'])
+        self.assertIn(f'ZP002_{self.birth.pk}.pdf', archive.read('MISSING.txt').decode())
+
+    def test_requires_a_filter(self):
+        """Test that an archive of every document is not offered"""
+        response = self.client.get(reverse('documents:download_zip'))
+        self.assertRedirects(response, reverse('documents:document_matrix'))
@@ -20,4 +20,6 @@ urlpatterns = [
     path('view/<int:document_id>/', views.view_document_view, name='view_document'),
     path('download/<int:document_id>/', views.download_document_view, name='download_document'),
     path('delete/<int:document_id>/', views.delete_document_view, name='delete_document'),
+    path('bulk-upload/', views.bulk_upload_view, name='bulk_upload'),
+    path('download-zip/', views.download_zip_view, name='download_zip'),
 ] 
\ No newline at end of file
@@ -4,15 +4,23 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.http import HttpResponseRedirect, FileResponse, Http404
+from django.http import HttpResponseRedirect, Http404, StreamingHttpResponse
 from django.db import IntegrityError
 from django.db import models
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.core.cache import cache
+from django.utils.text import get_valid_filename
+from core.caching import DOCUMENTS, cached
+from core.file_serving import make_etag, serve_file
 
+from .matrix import build_matrix, completion_summary
 from .models import DocumentType, StudentDocument
-from .forms import DocumentTypeForm, StudentDocumentForm
+from .archive import stream_zip
+from .forms import BulkUploadForm, DocumentTypeForm, StudentDocumentForm
+from .ingest import IMPORTED, ingest
 from students.models import Student
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Helper functions
 def is_admin(user):
@@ -79,11 +87,8 @@ def document_matrix_view(request):
     """
     Display the matrix of students and document types
     """
-    # Clear cache to ensure we're getting the latest data
-    cache.clear()
-    
-    # Get all active document types
-    document_types = DocumentType.objects.filter(active=True)
+    # Get all active document types; document writes invalidate the 'documents' cache namespace
+    document_types = cached(DOCUMENTS, ('active_types',), lambda: list(DocumentType.objects.filter(active=True)))
     
     # Get all students
     students_list = Student.objects.all().order_by('first_name', 'last_name')
@@ -110,27 +115,19 @@ def document_matrix_view(request):
     except EmptyPage:
         students = paginator.page(paginator.num_pages)
     
-    # Get all documents for the students on the current page
-    # This provides better performance than querying for each cell in the template
-    student_ids = [student.id for student in students]
-    all_documents = StudentDocument.objects.filter(student_id__in=student_ids).select_related('student', 'document_type')
-    
-    # Create a lookup dictionary for quick document retrieval
-    # Key format: "student_id_document_type_id"
-    document_lookup = {}
-    for doc in all_documents:
-        key = f"{doc.student.id}_{doc.document_type.id}"
-        document_lookup[key] = doc
+    # One query for every cell on the page and one aggregate for the per-type completion
+    rows, document_lookup = build_matrix(students, document_types)
+    type_summaries, missing_required = completion_summary(students_list, document_types, paginator.count)
     
-    # For debugging
-    print(f"Found {len(document_lookup)} documents for {len(student_ids)} students")
-    for key, doc in document_lookup.items():
-        print(f"Document mapping: {key} -> {doc.student.first_name} {doc.student.last_name} - {doc.document_type.name}")
+    logger.debug("Found %s documents for %s students", len(document_lookup), len(rows))
     
     context = {
         'document_types': document_types,
         'students': students,
+        'rows': rows,
         'document_lookup': document_lookup,
+        'type_summaries': type_summaries,
+        'missing_required': missing_required,
         'search_query': search_query,
     }
     
@@ -161,12 +158,7 @@ def upload_document_view(request, student_id, doc_type_id):
             document.uploaded_by = request.user
             document.save()
             
-            # Verify the document was saved correctly
-            saved_doc = StudentDocument.objects.filter(student=student, document_type=document_type).first()
-            if saved_doc:
-                print(f"Successfully saved document: ID {saved_doc.id}, {student.first_name} {student.last_name} - {document_type.name}")
-            else:
-                print(f"WARNING: Document save operation reported success but document not found in database.")
+            logger.info("Saved document %s for student %s (%s)", document.id, student.id, document_type.name)
                 
             messages.success(request, f'{document_type.name} uploaded successfully for {student.first_name} {student.last_name}')
             
@@ -231,22 +223,87 @@ def view_document_view(request, document_id):
 @user_passes_test(is_admin)
 def download_document_view(request, document_id):
     """
-    View to download a document
+    View to download a document. Repeat downloads get a 304 from the
+    document's updated_at, and with FILE_SERVING_MODE set the web server
+    sends the file (see core.file_serving).
     """
     document = get_object_or_404(StudentDocument, id=document_id)
     
     try:
-        # Open the file in binary mode
-        file_path = document.file.path
-        response = FileResponse(open(file_path, 'rb'))
-        # Set the Content-Disposition header to force download
-        filename = document.filename()
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        return serve_file(
+            request,
+            document.file,
+            document.filename(),
+            etag=make_etag(document.pk, document.updated_at),
+            last_modified=document.updated_at,
+        )
     except Exception as e:
         messages.error(request, f'Error downloading file: {str(e)}')
         return redirect('documents:view_document', document_id=document_id)
 
+@login_required
+@user_passes_test(is_admin)
+def download_zip_view(request):
+    """
+    Stream a ZIP of the documents of a student (?student=<id>), a class
+    (?class_name=<class>) and/or a document type (?document_type=<id>)
+    """
+    filters = {}
+    name_parts = []
+    if request.GET.get('student', '').isdigit():
+        filters['student_id'] = request.GET['student']
+        name_parts.append(f"student_{request.GET['student']}")
+    if request.GET.get('class_name'):
+        filters['student__class_name'] = request.GET['class_name']
+        name_parts.append(f"class_{request.GET['class_name']}")
+    if request.GET.get('document_type', '').isdigit():
+        filters['document_type_id'] = request.GET['document_type']
+        name_parts.append(f"type_{request.GET['document_type']}")
+    if not filters:
+        messages.error(request, 'Choose a student, class or document type to download.')
+        return redirect('documents:document_matrix')
+    
+    # One query for the metadata; the files are read one chunk at a time while the ZIP streams
+    documents = list(
+        StudentDocument.objects.filter(**filters).select_related('student', 'document_type')
+        .order_by('student__roll_number', 'document_type__name')
+    )
+    if not documents:
+        messages.warning(request, 'There are no documents to download.')
+        return redirect('documents:document_matrix')
+    
+    logger.info("Streaming ZIP of %s documents (%s) for %s", len(documents), ', '.join(name_parts), request.user)
+    response = StreamingHttpResponse(stream_zip(documents), content_type='application/zip')
+    filename = get_valid_filename(f'documents_{"_".join(name_parts)}.zip')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@login_required
+@user_passes_test(is_admin)
+def bulk_upload_view(request):
+    """
+    Import a ZIP of student documents and show the per-file report
+    (see documents.ingest; large imports are better run with `manage.py ingest_documents`)
+    """
+    report = None
+    if request.method == 'POST':
+        form = BulkUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                # No process pool inside a web worker: the upload is checked in-process
+                report = ingest(form.cleaned_data['archive'], uploaded_by=request.user, workers=1,
+                                dry_run=form.cleaned_data['dry_run'])
+            except ValueError:
+                form.add_error('archive', 'Please upload a ZIP file.')
+            else:
+                imported = sum(1 for entry in report if entry['status'] == IMPORTED)
+                logger.info("Bulk upload by %s: %s of %s files imported", request.user, imported, len(report))
+                messages.success(request, f'{imported} of {len(report)} documents imported.')
+    else:
+        form = BulkUploadForm()
+    
+    return render(request, 'documents/bulk_upload.html', {'form': form, 'report': report})
+
 @login_required
 @user_passes_test(is_admin)
 def delete_document_view(request, document_id):
@@ -22,6 +22,7 @@ class Event(models.Model):
     
     class Meta:
         ordering = ['-start_date']
+        indexes = [models.Index(fields=['start_date', 'end_date'], name='event_dates_idx')]
     
     def __str__(self):
         return self.title
@@ -1,5 +1,30 @@
 from django.contrib import admin
-from .models import FeeTransaction
+from .models import FeeCollectionTotal, FeeTransaction, PaymentReceipt, StudentFeeBalance, WebhookEvent
 
 # Register your models here.
 admin.site.register(FeeTransaction)
+
+@admin.register(PaymentReceipt)
+class PaymentReceiptAdmin(admin.ModelAdmin):
+    list_display = ('transaction', 'delivery_status', 'emailed_to', 'emailed_at', 'updated_at')
+    list_filter = ('delivery_status',)
+    readonly_fields = ('content_hash', 'emailed_at', 'delivery_error')
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'event_type', 'status', 'attempts', 'received_at', 'processed_at')
+    list_filter = ('event_type', 'status')
+    search_fields = ('event_id',)
+    readonly_fields = ('event_id', 'event_type', 'payload', 'attempts', 'error', 'received_at', 'processed_at')
+
+@admin.register(StudentFeeBalance)
+class StudentFeeBalanceAdmin(admin.ModelAdmin):
+    list_display = ('student', 'total_paid', 'outstanding', 'total_refunded', 'paid_count', 'last_payment_at')
+    search_fields = ('student__roll_number', 'student__first_name', 'student__last_name')
+    readonly_fields = ('student', 'total_paid', 'total_refunded', 'outstanding', 'paid_count', 'last_payment_at')
+
+@admin.register(FeeCollectionTotal)
+class FeeCollectionTotalAdmin(admin.ModelAdmin):
+    list_display = ('period', 'period_start', 'collected', 'refunded', 'payment_count', 'refund_count')
+    list_filter = ('period',)
+    date_hierarchy = 'period_start'
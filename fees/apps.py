@@ -13,4 +13,6 @@ class FeesConfig(AppConfig):
         # We'll keep the logger setup but remove the log message
         # logger = logging.getLogger('fees')
         # logger.info("Fees module initialized")
-        pass
+        
+        # Maintain the fee ledger and track receipt email delivery from the outbox
+        from . import signals  # noqa: F401
@@ -0,0 +1,228 @@
+"""
+Maintenance and queries for the fee ledger: per-student balances
+(StudentFeeBalance) and per-day/per-month collection totals
+(FeeCollectionTotal).
+
+Each FeeTransaction counts towards a few ledger rows depending on its
+status, amount and dates. A single save or delete moves the difference
+between its old and new contributions with F() updates, in the same
+database transaction as the write (see fees.signals). Bulk writes that
+bypass signals call record_transitions() themselves, and
+rebuild_ledger() recomputes every row from the transactions.
+"""
+from collections import defaultdict, namedtuple
+
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Count, DateField, F, Max, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import FeeCollectionTotal, FeeTransaction, StudentFeeBalance
+
+SETTLED_STATUSES = ('completed', 'refunded')
+BALANCE = 'balance'
+
+LedgerState = namedtuple('LedgerState', 'student_id status amount completed_at refunded_at')
+
+
+def ledger_state(instance):
+    """
+    The values of a transaction that decide what it contributes to the ledger.
+    """
+    return LedgerState(
+        instance.student_id,
+        instance.status,
+        FeeTransaction._meta.get_field('amount').to_python(instance.amount),
+        instance.completed_at,
+        instance.refunded_at,
+    )
+
+
+def previous_ledger_state(instance):
+    """
+    The ledger state of a transaction as currently stored, or None for a new one.
+    """
+    if not instance.pk:
+        return None
+    row = FeeTransaction.objects.filter(pk=instance.pk).values(*LedgerState._fields).first()
+    return row and LedgerState(**row)
+
+
+def stamp_status_times(instance, now=None):
+    """
+    Record when a transaction completed and when it was refunded, the dates
+    its amount is collected and refunded on.
+    """
+    now = now or timezone.now()
+    if instance.status in SETTLED_STATUSES and instance.completed_at is None:
+        instance.completed_at = now
+    if instance.status == 'refunded' and instance.refunded_at is None:
+        instance.refunded_at = now
+
+
+def period_keys(day):
+    return [(FeeCollectionTotal.DAY, day), (FeeCollectionTotal.MONTH, day.replace(day=1))]
+
+
+def contributions(state):
+    """
+    {target: {field: amount}} that one transaction state adds to the ledger,
+    where a target is (BALANCE, student_id) or (period, period_start).
+    """
+    result = defaultdict(dict)
+    if state is None:
+        return result
+
+    if state.status == 'pending':
+        result[(BALANCE, state.student_id)] = {'outstanding': state.amount}
+    elif state.status == 'completed':
+        result[(BALANCE, state.student_id)] = {'total_paid': state.amount, 'paid_count': 1}
+    elif state.status == 'refunded':
+        result[(BALANCE, state.student_id)] = {'total_refunded': state.amount}
+
+    if state.status in SETTLED_STATUSES and state.completed_at:
+        for key in period_keys(timezone.localdate(state.completed_at)):
+            result[key].update(collected=state.amount, payment_count=1)
+    if state.status == 'refunded' and state.refunded_at:
+        for key in period_keys(timezone.localdate(state.refunded_at)):
+            result[key].update(refunded=state.amount, refund_count=1)
+    return result
+
+
+def _apply(model, lookup, deltas):
+    """
+    Add {'<field>': delta} to one ledger row, creating it if needed, with a
+    single UPDATE in the common case.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+
+    rows = model.objects.filter(**lookup)
+    if rows.update(**changes) or all(delta < 0 for delta in deltas.values()):
+        return
+    try:
+        with db_transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Another request created the row first
+        rows.update(**changes)
+
+
+def record_transitions(transitions):
+    """
+    Apply [(before, after), ...] ledger state changes; either side may be None
+    for a created or deleted transaction. Deltas for the same row are combined.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    last_payment = {}
+    for before, after in transitions:
+        for sign, state in ((-1, before), (1, after)):
+            for target, fields in contributions(state).items():
+                for field, value in fields.items():
+                    deltas[target][field] += sign * value
+        if after and after.status in SETTLED_STATUSES and after.completed_at:
+            current = last_payment.get(after.student_id)
+            last_payment[after.student_id] = max(current, after.completed_at) if current else after.completed_at
+
+    with db_transaction.atomic():
+        for (kind, key), fields in deltas.items():
+            if kind == BALANCE:
+                _apply(StudentFeeBalance, {'student_id': key}, fields)
+            else:
+                _apply(FeeCollectionTotal, {'period': kind, 'period_start': key}, fields)
+        for student_id, paid_at in last_payment.items():
+            StudentFeeBalance.objects.filter(student_id=student_id).filter(
+                Q(last_payment_at__isnull=True) | Q(last_payment_at__lt=paid_at)
+            ).update(last_payment_at=paid_at)
+
+
+def rebuild_ledger():
+    """
+    Recompute every balance and period total from the transactions with a
+    few grouped queries. Returns (balances, period totals) written.
+    """
+    settled = Q(status__in=SETTLED_STATUSES, completed_at__isnull=False)
+    refunded = Q(status='refunded', refunded_at__isnull=False)
+
+    with db_transaction.atomic():
+        StudentFeeBalance.objects.all().delete()
+        FeeCollectionTotal.objects.all().delete()
+
+        balances = [
+            StudentFeeBalance(
+                student_id=row['student_id'],
+                total_paid=row['total_paid'] or 0,
+                total_refunded=row['total_refunded'] or 0,
+                outstanding=row['outstanding'] or 0,
+                paid_count=row['paid_count'],
+                last_payment_at=row['last_payment_at'],
+            )
+            for row in FeeTransaction.objects.values('student_id').annotate(
+                total_paid=Sum('amount', filter=Q(status='completed')),
+                total_refunded=Sum('amount', filter=Q(status='refunded')),
+                outstanding=Sum('amount', filter=Q(status='pending')),
+                paid_count=Count('pk', filter=Q(status='completed')),
+                last_payment_at=Max('completed_at', filter=settled),
+            ).order_by()
+        ]
+        StudentFeeBalance.objects.bulk_create(balances, batch_size=1000)
+
+        totals = {}
+        for period, trunc in ((FeeCollectionTotal.DAY, TruncDate), (FeeCollectionTotal.MONTH, TruncMonth)):
+            for condition, date_field, amount_field, count_field in (
+                (settled, 'completed_at', 'collected', 'payment_count'),
+                (refunded, 'refunded_at', 'refunded', 'refund_count'),
+            ):
+                rows = FeeTransaction.objects.filter(condition).annotate(
+                    start=trunc(date_field, output_field=DateField())
+                ).values('start').annotate(amount=Sum('amount'), count=Count('pk')).order_by()
+                for row in rows:
+                    total = totals.setdefault(
+                        (period, row['start']), FeeCollectionTotal(period=period, period_start=row['start'])
+                    )
+                    setattr(total, amount_field, row['amount'])
+                    setattr(total, count_field, row['count'])
+        FeeCollectionTotal.objects.bulk_create(totals.values(), batch_size=1000)
+    return len(balances), len(totals)
+
+
+def get_balance(student):
+    """
+    The student's ledger balance; an unsaved zero balance if they have no transactions.
+    """
+    try:
+        return student.fee_balance
+    except StudentFeeBalance.DoesNotExist:
+        return StudentFeeBalance(student=student)
+
+
+def collection_totals(day=None):
+    """
+    Today's and this month's totals as {'day': row, 'month': row} (unsaved
+    zero rows for periods without payments), read with one query.
+    """
+    day = day or timezone.localdate()
+    keys = period_keys(day)
+    rows = {
+        (row.period, row.period_start): row
+        for row in FeeCollectionTotal.objects.filter(
+            Q(period=keys[0][0], period_start=keys[0][1]) | Q(period=keys[1][0], period_start=keys[1][1])
+        )
+    }
+    return {
+        period: rows.get((period, start)) or FeeCollectionTotal(period=period, period_start=start)
+        for period, start in keys
+    }
+
+
+def total_revenue():
+    """
+    Money currently held: everything collected minus everything refunded,
+    summed over the monthly totals.
+    """
+    totals = FeeCollectionTotal.objects.filter(period=FeeCollectionTotal.MONTH).aggregate(
+        collected=Sum('collected'), refunded=Sum('refunded')
+    )
+    return (totals['collected'] or 0) - (totals['refunded'] or 0)
@@ -4,6 +4,7 @@ Management command to check payment status between Razorpay and local database
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from fees.models import FeeTransaction
+from fees.reconciliation import fetch_payments
 from fees.utils.logging import logger, log_payment_error
 import razorpay
 import json
@@ -105,11 +106,6 @@ class Command(BaseCommand):
         # Get start and end dates for filter
         end_date = datetime.now()
         start_date = end_date - timedelta(days=days)
-        
-        # Convert to Unix timestamps as required by Razorpay API
-        from_timestamp = int(start_date.timestamp())
-        to_timestamp = int(end_date.timestamp())
-        
         self.stdout.write(f"Checking payments from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
         
         try:
@@ -123,20 +119,26 @@ class Command(BaseCommand):
                 except Exception as e:
                     self.stdout.write(self.style.ERROR(f"Error fetching payment {payment_id}: {str(e)}"))
             
-            # Otherwise get all payments for the period - without date filter first
-            payments = razorpay_client.payment.all({'count': 50})
+            # Otherwise page through every payment in the period
+            payments = fetch_payments(razorpay_client, start_date, end_date)
             
-            if not payments or 'items' not in payments or not payments['items']:
+            if not payments:
                 self.stdout.write("No payments found in Razorpay dashboard.")
                 return
                 
             self.stdout.write(self.style.SUCCESS(
-                f"Found {len(payments['items'])} payments in Razorpay dashboard."
+                f"Found {len(payments)} payments in Razorpay dashboard."
             ))
             
+            # Look up every local match in one query
+            ids = {p.get('id') for p in payments} | {p.get('order_id') for p in payments if p.get('order_id')}
+            local = {}
+            for t in FeeTransaction.objects.filter(transaction_id__in=ids).select_related('student'):
+                local.setdefault(t.transaction_id, []).append(t)
+            
             matching_payments = []
             
-            for payment in payments['items']:
+            for payment in payments:
                 payment_amount = float(payment.get('amount', 0)) / 100
                 
                 # If filtering by amount, only show matching payments
@@ -147,7 +149,7 @@ class Command(BaseCommand):
                 self.print_payment_details(payment)
                 
                 # Cross-reference with our database
-                self.check_payment_in_local_db(payment)
+                self.check_payment_in_local_db(payment, local)
                 
             if amount and not matching_payments:
                 self.stdout.write(self.style.WARNING(f"No payments with amount {amount} found in Razorpay dashboard."))
@@ -227,15 +229,15 @@ class Command(BaseCommand):
             created_datetime = datetime.fromtimestamp(created_at)
             self.stdout.write(f"Created At: {created_datetime.strftime('%Y-%m-%d %H:%M:%S')}")
     
-    def check_payment_in_local_db(self, payment):
+    def check_payment_in_local_db(self, payment, local):
         """Check if a Razorpay payment exists in our local database"""
         payment_id = payment.get('id')
         order_id = payment.get('order_id')
         
-        # Try to find a transaction with this payment ID or order ID
-        transactions = FeeTransaction.objects.filter(transaction_id__in=[payment_id, order_id])
+        # Transactions with this payment ID or order ID, from the prefetched lookup
+        transactions = local.get(payment_id, []) + local.get(order_id, [])
         
-        if transactions.exists():
+        if transactions:
             self.stdout.write(self.style.SUCCESS("Found in local database:"))
             for t in transactions:
                 self.stdout.write(f"Local ID: {t.id}")
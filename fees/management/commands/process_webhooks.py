@@ -0,0 +1,55 @@
+"""
+Management command that applies stored Razorpay webhook events (see fees.webhooks)
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from fees.models import WebhookEvent
+from fees.webhooks import process_batch, release_stale_claims
+
+
+class Command(BaseCommand):
+    help = 'Apply received Razorpay webhook events in batches, polling for new ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the received events and exit')
+        parser.add_argument('--batch-size', type=int, default=50, help='Events per batch (default: 50)')
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1.0,
+            help='Seconds to wait between polls of an empty inbox (default: 1)'
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=10,
+            help='Requeue events claimed by a worker more than this many minutes ago (default: 10)'
+        )
+
+    def handle(self, *args, **options):
+        released = release_stale_claims(timedelta(minutes=options['stale_after']))
+        if released:
+            self.stdout.write(self.style.WARNING(f'Requeued {released} events left in processing'))
+
+        totals = {WebhookEvent.PROCESSED: 0, WebhookEvent.IGNORED: 0, WebhookEvent.FAILED: 0}
+        while True:
+            counts = process_batch(options['batch_size'])
+            for key, value in counts.items():
+                totals[key] += value
+            if any(counts.values()):
+                self.stdout.write(
+                    f"Processed {counts['processed']}, ignored {counts['ignored']}, failed {counts['failed']}"
+                )
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+
+        message = (
+            f"Processed {totals['processed']} webhook events "
+            f"({totals['ignored']} ignored, {totals['failed']} failed)"
+        )
+        self.stdout.write(self.style.WARNING(message) if totals['failed'] else self.style.SUCCESS(message))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from fees.ledger import rebuild_ledger
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the fee ledger (student balances and daily/monthly collection totals) from fee transactions'
+
+    def handle(self, *args, **options):
+        balances, totals = rebuild_ledger()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {balances} student fee balances and {totals} collection totals'
+        ))
@@ -0,0 +1,128 @@
+"""
+Management command to reconcile fee transactions with Razorpay (see fees.reconciliation)
+"""
+import json
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from fees.reconciliation import (
+    DEFAULT_WORKERS,
+    apply_changes,
+    get_gateway_client,
+    reconcile,
+    sweep_pending,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare local fee transactions with Razorpay, fix drifted statuses in bulk and '
+        'print the differences as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Reconcile payments from the last N days (default: 7)')
+        parser.add_argument('--from', dest='start', help='Start date (YYYY-MM-DD), instead of --days')
+        parser.add_argument('--to', dest='end', help='End date (YYYY-MM-DD, inclusive; default: now)')
+        parser.add_argument(
+            '--window-hours',
+            type=int,
+            default=24,
+            help='Hours of gateway payments fetched per request window (default: 24)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=DEFAULT_WORKERS,
+            help=f'Concurrent gateway requests (default: {DEFAULT_WORKERS})'
+        )
+        parser.add_argument(
+            '--sweep-pending',
+            action='store_true',
+            help='Resolve stale pending transactions from their orders instead of scanning a date range'
+        )
+        parser.add_argument(
+            '--pending-minutes',
+            type=int,
+            default=30,
+            help='With --sweep-pending, only check transactions pending for this long (default: 30)'
+        )
+        parser.add_argument(
+            '--expire-hours',
+            type=int,
+            default=24,
+            help='With --sweep-pending, fail orders with no payment after this many hours (default: 24)'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Report the differences without changing anything')
+        parser.add_argument('--output', help='Write the JSON diff to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['window_hours'] < 1:
+            raise CommandError('--workers and --window-hours must be at least 1')
+
+        client = get_gateway_client()
+        if options['sweep_pending']:
+            scope = {
+                'mode': 'sweep_pending',
+                'pending_minutes': options['pending_minutes'],
+                'expire_hours': options['expire_hours'],
+            }
+            diff = sweep_pending(
+                client,
+                older_than=timedelta(minutes=options['pending_minutes']),
+                expire_after=timedelta(hours=options['expire_hours']),
+                workers=options['workers'],
+            )
+        else:
+            start, end = self.date_range(options)
+            scope = {'mode': 'range', 'from': start.isoformat(), 'to': end.isoformat()}
+            diff = reconcile(
+                client, start, end,
+                window=timedelta(hours=options['window_hours']),
+                workers=options['workers'],
+            )
+
+        applied = [] if options['dry_run'] else apply_changes(diff)
+        applied_ids = {entry['transaction'] for entry in applied}
+        for entry in diff:
+            entry['applied'] = entry['transaction'] in applied_ids
+
+        report = {
+            **scope,
+            'dry_run': options['dry_run'],
+            'summary': dict(Counter(entry['action'] for entry in diff), applied=len(applied)),
+            'changes': diff,
+        }
+        document = json.dumps(report, indent=2)
+        summary = (
+            f"{len(diff)} differences, {len(applied)} applied"
+            + (' (dry run)' if options['dry_run'] else '')
+        )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(document + '\n')
+            self.stdout.write(self.style.SUCCESS(f"{summary}; diff written to {options['output']}"))
+        else:
+            # Keep stdout machine-readable
+            self.stdout.write(document)
+            self.stderr.write(summary)
+
+    def date_range(self, options):
+        try:
+            if options['start']:
+                start = timezone.make_aware(datetime.combine(datetime.strptime(options['start'], '%Y-%m-%d'), time.min))
+            else:
+                start = timezone.now() - timedelta(days=options['days'])
+            if options['end']:
+                end_date = datetime.strptime(options['end'], '%Y-%m-%d') + timedelta(days=1)
+                end = timezone.make_aware(datetime.combine(end_date, time.min))
+            else:
+                end = timezone.now()
+        except ValueError:
+            raise CommandError('Dates must be in YYYY-MM-DD format')
+        if start >= end:
+            raise CommandError('--from must be before --to')
+        return start, end
@@ -0,0 +1,57 @@
+"""
+Management command to replay stored Razorpay webhook events
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from fees.models import WebhookEvent
+from fees.webhooks import process_batch, requeue_events
+
+
+class Command(BaseCommand):
+    help = (
+        'Put stored webhook events back in the inbox so they are applied again. '
+        'Replaying is safe: transactions that are already completed are not changed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_ids', nargs='*', help='Razorpay event ids to replay')
+        parser.add_argument('--failed', action='store_true', help='Replay every failed event')
+        parser.add_argument('--hours', type=int, help='Only replay events received in the last N hours')
+        parser.add_argument(
+            '--process',
+            action='store_true',
+            help='Apply the replayed events now instead of leaving them for process_webhooks'
+        )
+
+    def handle(self, *args, **options):
+        if not (options['event_ids'] or options['failed']):
+            raise CommandError('Give event ids to replay or use --failed')
+
+        events = WebhookEvent.objects.all()
+        if options['event_ids']:
+            events = events.filter(event_id__in=options['event_ids'])
+            missing = set(options['event_ids']) - set(events.values_list('event_id', flat=True))
+            if missing:
+                raise CommandError(f"Unknown events: {', '.join(sorted(missing))}")
+        if options['failed']:
+            events = events.filter(status=WebhookEvent.FAILED)
+        if options['hours']:
+            events = events.filter(received_at__gte=timezone.now() - timedelta(hours=options['hours']))
+
+        requeued = requeue_events(events)
+        self.stdout.write(self.style.SUCCESS(f'Requeued {requeued} webhook events'))
+
+        if options['process']:
+            totals = {WebhookEvent.PROCESSED: 0, WebhookEvent.IGNORED: 0, WebhookEvent.FAILED: 0}
+            while True:
+                counts = process_batch()
+                if not any(counts.values()):
+                    break
+                for key, value in counts.items():
+                    totals[key] += value
+            self.stdout.write(self.style.SUCCESS(
+                f"Processed {totals['processed']} ({totals['ignored']} ignored, {totals['failed']} failed)"
+            ))
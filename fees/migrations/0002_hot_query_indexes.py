@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fees', '0001_initial'),
+        ('students', '0002_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='feetransaction',
+            name='transaction_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='feetransaction',
+            index=models.Index(fields=['student', 'status'], name='feetxn_student_status_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-18 12:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_outboxemail'),
+        ('fees', '0003_paymentreceipt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentreceipt',
+            name='email',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.outboxemail'),
+        ),
+    ]
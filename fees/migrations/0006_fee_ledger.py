@@ -0,0 +1,104 @@
+# Generated by Django 5.2 on 2026-10-18 12:37
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+from django.utils import timezone
+
+
+def backfill_ledger(apps, schema_editor):
+    FeeTransaction = apps.get_model('fees', 'FeeTransaction')
+    StudentFeeBalance = apps.get_model('fees', 'StudentFeeBalance')
+    FeeCollectionTotal = apps.get_model('fees', 'FeeCollectionTotal')
+
+    # The last change is the best record of when existing payments settled
+    FeeTransaction.objects.filter(status__in=['completed', 'refunded']).update(completed_at=F('updated_at'))
+    FeeTransaction.objects.filter(status='refunded').update(refunded_at=F('updated_at'))
+
+    balances = defaultdict(lambda: {
+        'total_paid': 0, 'total_refunded': 0, 'outstanding': 0, 'paid_count': 0, 'last_payment_at': None
+    })
+    totals = defaultdict(lambda: {'collected': 0, 'refunded': 0, 'payment_count': 0, 'refund_count': 0})
+    rows = FeeTransaction.objects.values_list('student_id', 'status', 'amount', 'completed_at', 'refunded_at')
+    for student_id, status, amount, completed_at, refunded_at in rows.iterator():
+        balance = balances[student_id]
+        if status == 'pending':
+            balance['outstanding'] += amount
+        elif status == 'completed':
+            balance['total_paid'] += amount
+            balance['paid_count'] += 1
+        elif status == 'refunded':
+            balance['total_refunded'] += amount
+        if completed_at:
+            if balance['last_payment_at'] is None or completed_at > balance['last_payment_at']:
+                balance['last_payment_at'] = completed_at
+            day = timezone.localdate(completed_at)
+            for key in (('day', day), ('month', day.replace(day=1))):
+                totals[key]['collected'] += amount
+                totals[key]['payment_count'] += 1
+        if refunded_at:
+            day = timezone.localdate(refunded_at)
+            for key in (('day', day), ('month', day.replace(day=1))):
+                totals[key]['refunded'] += amount
+                totals[key]['refund_count'] += 1
+
+    StudentFeeBalance.objects.bulk_create(
+        [StudentFeeBalance(student_id=student_id, **values) for student_id, values in balances.items()],
+        batch_size=1000
+    )
+    FeeCollectionTotal.objects.bulk_create(
+        [FeeCollectionTotal(period=period, period_start=start, **values) for (period, start), values in totals.items()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fees', '0005_webhookevent'),
+        ('students', '0002_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feetransaction',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='feetransaction',
+            name='refunded_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='FeeCollectionTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('collected', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('refunded', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('refund_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-period_start'],
+                'unique_together': {('period', 'period_start')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentFeeBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_paid', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_refunded', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('outstanding', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('paid_count', models.IntegerField(default=0)),
+                ('last_payment_at', models.DateTimeField(blank=True, null=True)),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fee_balance', to='students.student')),
+            ],
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
@@ -13,11 +13,139 @@ class FeeTransaction(models.Model):
         ('refunded', 'Refunded'),
     )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
-    transaction_id = models.CharField(max_length=100, null=True, blank=True)
+    transaction_id = models.CharField(max_length=100, null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     description = models.TextField(blank=True, null=True)
     receipt_number = models.CharField(max_length=50, unique=True, null=True, blank=True)
+    # Set when the status first becomes completed/refunded (see fees.ledger)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    refunded_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['student', 'status'], name='feetxn_student_status_idx')]
 
     def __str__(self):
         return f"{self.student.first_name} {self.student.last_name} - {self.amount} - {self.status}"
+
+
+class StudentFeeBalance(models.Model):
+    """
+    A student's fee totals, kept up to date by the signal handlers in
+    fees.signals: amounts currently completed, refunded and still pending.
+    Dashboards read this row instead of summing the student's transactions.
+    Rebuild with `manage.py rebuild_fee_ledger`.
+    """
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, related_name='fee_balance')
+    total_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_refunded = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    outstanding = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    paid_count = models.IntegerField(default=0)
+    last_payment_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.student} - paid {self.total_paid}, outstanding {self.outstanding}"
+
+
+class FeeCollectionTotal(models.Model):
+    """
+    Money collected and refunded per day and per month, kept up to date
+    alongside StudentFeeBalance. A payment counts on the day it completed
+    and a refund on the day it was refunded, so collected - refunded over
+    all months is the school's current revenue.
+    """
+    DAY = 'day'
+    MONTH = 'month'
+    PERIOD_CHOICES = [
+        (DAY, 'Day'),
+        (MONTH, 'Month'),
+    ]
+
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    collected = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    refunded = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payment_count = models.IntegerField(default=0)
+    refund_count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-period_start']
+        unique_together = ['period', 'period_start']
+
+    def __str__(self):
+        return f"{self.get_period_display()} {self.period_start} - collected {self.collected}"
+
+
+class PaymentReceipt(models.Model):
+    """
+    The stored PDF receipt of a transaction and whether it has been emailed.
+
+    content_hash covers every value printed on the receipt, so the file is
+    re-rendered only when one of them changes; delivery_status makes sure
+    the receipt email is queued once however many times it is requested,
+    and follows the queued OutboxEmail to sent or failed (see fees.signals).
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    DELIVERY_STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    transaction = models.OneToOneField(FeeTransaction, on_delete=models.CASCADE, related_name='receipt')
+    content_hash = models.CharField(max_length=64)
+    file = models.FileField(upload_to='receipts/')
+    delivery_status = models.CharField(max_length=10, choices=DELIVERY_STATUS_CHOICES, default=PENDING)
+    email = models.ForeignKey(
+        'core.OutboxEmail', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    emailed_to = models.EmailField(blank=True)
+    emailed_at = models.DateTimeField(null=True, blank=True)
+    delivery_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Receipt for transaction {self.transaction_id} - {self.delivery_status}"
+
+
+class WebhookEvent(models.Model):
+    """
+    A verified Razorpay webhook delivery, stored before it is acted on.
+
+    The gateway retries deliveries it does not see acknowledged quickly and
+    may send the same event more than once; event_id is unique, so each
+    event is stored and processed once (see fees.webhooks).
+    """
+    RECEIVED = 'received'
+    PROCESSING = 'processing'
+    PROCESSED = 'processed'
+    IGNORED = 'ignored'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (RECEIVED, 'Received'),
+        (PROCESSING, 'Processing'),
+        (PROCESSED, 'Processed'),
+        (IGNORED, 'Ignored'),
+        (FAILED, 'Failed'),
+    )
+
+    event_id = models.CharField(max_length=100, unique=True)
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=RECEIVED)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'received_at'], name='webhook_status_received_idx')]
+
+    def __str__(self):
+        return f"{self.event_type} {self.event_id} - {self.status}"
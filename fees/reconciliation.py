@@ -0,0 +1,285 @@
+"""
+Reconcile local fee transactions with the Razorpay gateway.
+
+reconcile() pages through the gateway's payments in from/to windows,
+fetched concurrently by a bounded thread pool, and matches them to local
+transactions with one transaction_id__in query (transaction_id holds the
+Razorpay order id). sweep_pending() does the same for stale pending
+transactions, asking the gateway for each order's payments. Both return a
+list of JSON-serialisable diff entries; apply_changes() writes the status
+updates with bulk_update.
+
+Only the gateway calls run in the pool; all database work stays on the
+calling thread.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+import razorpay
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from core.dashboard import invalidate_dashboard
+from students.models import Student
+
+from .ledger import ledger_state, record_transitions, stamp_status_times
+from .models import FeeTransaction
+from .utils.receipts import send_receipt_email
+
+logger = logging.getLogger('fees')
+
+# Razorpay returns at most 100 items per request
+PAGE_SIZE = 100
+DEFAULT_WORKERS = 4
+
+# Local status changes the gateway is allowed to cause
+ALLOWED_TRANSITIONS = {
+    'pending': {'completed', 'failed', 'refunded'},
+    'failed': {'completed', 'refunded'},
+    'completed': {'refunded'},
+}
+
+UPDATE = 'update'
+AMOUNT_MISMATCH = 'amount_mismatch'
+UNMATCHED = 'unmatched'
+EXPIRED = 'expired'
+
+
+def get_gateway_client():
+    return razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+
+
+def time_windows(start, end, window):
+    """
+    Split [start, end) into (from, to) Unix timestamp pairs of at most `window`.
+    """
+    windows = []
+    while start < end:
+        stop = min(start + window, end)
+        windows.append((int(start.timestamp()), int(stop.timestamp())))
+        start = stop
+    return windows
+
+
+def fetch_window(client, window, page_size=PAGE_SIZE):
+    """
+    All gateway payments created in one (from, to) window, page by page.
+    """
+    from_ts, to_ts = window
+    payments, skip = [], 0
+    while True:
+        page = client.payment.all({'from': from_ts, 'to': to_ts, 'count': page_size, 'skip': skip})
+        items = page.get('items', [])
+        payments.extend(items)
+        if len(items) < page_size:
+            return payments
+        skip += page_size
+
+
+def fetch_payments(client, start, end, window=timedelta(days=1), workers=DEFAULT_WORKERS):
+    """
+    Gateway payments created between start and end, windows fetched in parallel.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pages = pool.map(lambda w: fetch_window(client, w), time_windows(start, end, window))
+        payments = {payment['id']: payment for page in pages for payment in page}
+    return list(payments.values())
+
+
+def fetch_order_payments(client, order_ids, workers=DEFAULT_WORKERS):
+    """
+    Map each order id to its gateway payments, fetched in parallel.
+    """
+    def fetch(order_id):
+        return order_id, client.order.payments(order_id).get('items', [])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(fetch, order_ids))
+
+
+def gateway_status(payments):
+    """
+    The local status the gateway's payments for one order imply, or None
+    while the order is still open (created or only authorized).
+    """
+    statuses = {payment.get('status') for payment in payments}
+    if 'refunded' in statuses:
+        return 'refunded'
+    if 'captured' in statuses:
+        return 'completed'
+    if statuses == {'failed'}:
+        return 'failed'
+    return None
+
+
+def settled_payment(payments):
+    """
+    The payment that decided the order: refunded or captured first.
+    """
+    for status in ('refunded', 'captured', 'failed'):
+        for payment in payments:
+            if payment.get('status') == status:
+                return payment
+    return None
+
+
+def compare(transaction, payments):
+    """
+    Diff entry for one local transaction and its order's payments, or None
+    if they agree.
+    """
+    target = gateway_status(payments)
+    if target is None or target == transaction.status:
+        return None
+
+    payment = settled_payment(payments)
+    gateway_amount = Decimal(payment.get('amount', 0)) / 100
+    entry = {
+        'transaction': transaction.pk,
+        'order_id': transaction.transaction_id,
+        'payment_id': payment.get('id'),
+        'roll_number': transaction.student.roll_number,
+        'amount': str(transaction.amount),
+        'gateway_amount': str(gateway_amount),
+        'local_status': transaction.status,
+        'gateway_status': payment.get('status'),
+        'new_status': target,
+        'action': UPDATE,
+    }
+    if target not in ALLOWED_TRANSITIONS.get(transaction.status, ()):
+        entry.update(action=UNMATCHED, new_status=None)
+    elif target != 'failed' and gateway_amount != transaction.amount:
+        # Never mark a payment of the wrong amount as settled automatically
+        entry.update(action=AMOUNT_MISMATCH, new_status=None)
+    return entry
+
+
+def group_by_order(payments):
+    by_order = {}
+    for payment in payments:
+        if payment.get('order_id'):
+            by_order.setdefault(payment['order_id'], []).append(payment)
+    return by_order
+
+
+def reconcile(client, start, end, window=timedelta(days=1), workers=DEFAULT_WORKERS):
+    """
+    Diff the gateway's payments between start and end against local rows.
+    Settled gateway orders with no local transaction are reported as unmatched.
+    """
+    by_order = group_by_order(fetch_payments(client, start, end, window, workers))
+    transactions = FeeTransaction.objects.filter(transaction_id__in=list(by_order)).select_related('student')
+
+    diff, seen = [], set()
+    for transaction in transactions:
+        seen.add(transaction.transaction_id)
+        entry = compare(transaction, by_order[transaction.transaction_id])
+        if entry:
+            diff.append(entry)
+
+    for order_id in sorted(set(by_order) - seen):
+        payment = settled_payment(by_order[order_id])
+        if payment and payment.get('status') in ('captured', 'refunded'):
+            diff.append({
+                'transaction': None,
+                'order_id': order_id,
+                'payment_id': payment.get('id'),
+                'gateway_amount': str(Decimal(payment.get('amount', 0)) / 100),
+                'gateway_status': payment.get('status'),
+                'new_status': None,
+                'action': UNMATCHED,
+            })
+    return diff
+
+
+def sweep_pending(client, older_than=timedelta(minutes=30), expire_after=timedelta(hours=24),
+                  workers=DEFAULT_WORKERS):
+    """
+    Resolve pending transactions older than `older_than` from their orders'
+    payments. Orders that never saw a payment are failed once they are older
+    than `expire_after`.
+    """
+    now = timezone.now()
+    transactions = list(
+        FeeTransaction.objects.filter(status='pending', created_at__lt=now - older_than)
+        .exclude(transaction_id__isnull=True).exclude(transaction_id='')
+        .select_related('student')
+    )
+    order_payments = fetch_order_payments(client, [t.transaction_id for t in transactions], workers)
+
+    diff = []
+    for transaction in transactions:
+        payments = order_payments[transaction.transaction_id]
+        entry = compare(transaction, payments)
+        if entry is None and not payments and transaction.created_at < now - expire_after:
+            entry = {
+                'transaction': transaction.pk,
+                'order_id': transaction.transaction_id,
+                'payment_id': None,
+                'roll_number': transaction.student.roll_number,
+                'amount': str(transaction.amount),
+                'local_status': transaction.status,
+                'gateway_status': None,
+                'new_status': 'failed',
+                'action': EXPIRED,
+            }
+        if entry:
+            diff.append(entry)
+    return diff
+
+
+def apply_changes(diff):
+    """
+    Write the status changes in `diff` with bulk updates. Rows whose status
+    moved since the diff was taken are skipped. Returns the applied entries.
+    """
+    changes = {entry['transaction']: entry for entry in diff if entry['action'] in (UPDATE, EXPIRED)}
+    if not changes:
+        return []
+
+    now = timezone.now()
+    applied, students = [], []
+    with db_transaction.atomic():
+        locked = FeeTransaction.objects.select_for_update().select_related('student').filter(pk__in=list(changes))
+        transactions, transitions = [], []
+        for transaction in locked:
+            entry = changes[transaction.pk]
+            if transaction.status != entry['local_status']:
+                continue
+            before = ledger_state(transaction)
+            transaction.status = entry['new_status']
+            transaction.updated_at = now
+            stamp_status_times(transaction, now)
+            transactions.append(transaction)
+            transitions.append((before, ledger_state(transaction)))
+            applied.append(entry)
+            if transaction.status == 'completed':
+                student = transaction.student
+                student.fee_status = 'paid'
+                student.last_payment_date = now.date()
+                student.transaction_id = entry['payment_id']
+                student.updated_at = now
+                students.append(student)
+        FeeTransaction.objects.bulk_update(transactions, ['status', 'updated_at', 'completed_at', 'refunded_at'])
+        Student.objects.bulk_update(students, ['fee_status', 'last_payment_date', 'transaction_id', 'updated_at'])
+        record_transitions(transitions)
+
+    # bulk_update sends no post_save, so the ledger and dashboard caches are updated here
+    invalidate_dashboard('revenue')
+    if students:
+        invalidate_dashboard('students')
+
+    for entry in applied:
+        logger.info(
+            "Reconciled transaction %s (%s): %s -> %s",
+            entry['transaction'], entry['order_id'], entry['local_status'], entry['new_status']
+        )
+        if entry['new_status'] == 'completed':
+            try:
+                send_receipt_email(entry['transaction'])
+            except Exception as e:
+                logger.error(f"Could not queue receipt for transaction {entry['transaction']}: {str(e)}")
+    return applied
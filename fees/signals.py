@@ -0,0 +1,51 @@
+"""
+Keep the fee ledger in step with transaction writes, and follow queued
+receipt emails through the outbox to their final state.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.models import OutboxEmail
+from core.outbox import email_dead, email_sent
+
+from .ledger import ledger_state, previous_ledger_state, record_transitions, stamp_status_times
+from .models import FeeTransaction, PaymentReceipt
+
+
+@receiver(pre_save, sender=FeeTransaction)
+def remember_previous_ledger_state(sender, instance, raw=False, **kwargs):
+    if not raw:
+        stamp_status_times(instance)
+    instance._previous_ledger_state = previous_ledger_state(instance)
+
+
+@receiver(post_save, sender=FeeTransaction)
+def update_ledger_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_ledger_state', None)
+    current = ledger_state(instance)
+    if previous != current:
+        record_transitions([(previous, current)])
+
+
+@receiver(post_delete, sender=FeeTransaction)
+def update_ledger_on_delete(sender, instance, **kwargs):
+    record_transitions([(ledger_state(instance), None)])
+
+
+@receiver(email_sent, sender=OutboxEmail)
+def receipt_email_sent(sender, email, **kwargs):
+    PaymentReceipt.objects.filter(email=email).update(
+        delivery_status=PaymentReceipt.SENT,
+        emailed_at=email.sent_at
+    )
+
+
+@receiver(email_dead, sender=OutboxEmail)
+def receipt_email_dead(sender, email, **kwargs):
+    # A later send_receipt_email() call may queue it again
+    PaymentReceipt.objects.filter(email=email).update(
+        delivery_status=PaymentReceipt.FAILED,
+        delivery_error=email.last_error
+    )
@@ -4,11 +4,26 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 from decimal import Decimal
 import json
+from collections import Counter
 from unittest.mock import patch, MagicMock
-from datetime import date
+from datetime import date, timedelta
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import override_settings
+import shutil
+import tempfile
+from io import StringIO
+
+import razorpay
 
 from students.models import Student
-from .models import FeeTransaction
+from .models import FeeCollectionTotal, FeeTransaction, PaymentReceipt, StudentFeeBalance, WebhookEvent
+from .webhooks import process_batch
+from . import ledger, reconciliation
+from .utils import receipts
+from core.models import OutboxEmail
+from core.outbox import deliver_batch
 from django.conf import settings
 
 class FeeModelsTest(TestCase):
@@ -246,9 +261,31 @@ class FeePaymentViewsTest(TestCase):
         self.student.refresh_from_db()
         self.assertEqual(self.student.fee_status, 'pending')
 
+class StubRazorpayUtility:
+    def verify_webhook_signature(self, body, signature, secret):
+        if signature != 'valid_signature':
+            raise razorpay.errors.SignatureVerificationError('Razorpay Signature Verification Failed')
+        return True
+
+
+class StubRazorpayClient:
+    """Stands in for razorpay.Client; only signature checks are used by the webhook"""
+    def __init__(self):
+        self.utility = StubRazorpayUtility()
+
+
 class WebhookTests(TestCase):
     def setUp(self):
         self.client = Client()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        stub = patch('fees.views.razorpay_client', StubRazorpayClient())
+        stub.start()
+        self.addCleanup(stub.stop)
         
         # Create test student
         self.user = User.objects.create_user(
@@ -280,21 +317,426 @@ class WebhookTests(TestCase):
             transaction_id='order_webhook123',
             description='Webhook Test Payment'
         )
+
+    def post_event(self, event_id='evt_1', order_id='order_webhook123', status='captured',
+                   signature='valid_signature'):
+        payload = {
+            'entity': 'event',
+            'event': 'payment.captured',
+            'payload': {'payment': {'entity': {'id': 'pay_webhook123', 'order_id': order_id, 'status': status}}},
+        }
+        return self.client.post(
+            reverse('fees:webhook_handler'),
+            data=json.dumps(payload),
+            content_type='application/json',
+            HTTP_X_RAZORPAY_SIGNATURE=signature,
+            HTTP_X_RAZORPAY_EVENT_ID=event_id
+        )
     
-    # Skip webhook tests until we have better mocking in place
-    # The tests require more complex mocking of the request body
-    # and signature verification
-    @patch('razorpay.Client')
-    def test_webhook_handler(self, mock_razorpay):
-        """Simplified test for webhook handler"""
-        self.transaction.status = 'completed'
-        self.transaction.save()
+    def test_webhook_handler(self):
+        """Test that the webhook is acknowledged at once and applied by the worker"""
+        response = self.post_event()
+
+        self.assertEqual(response.status_code, 200)
+        event = WebhookEvent.objects.get()
+        self.assertEqual((event.event_id, event.status), ('evt_1', WebhookEvent.RECEIVED))
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'pending')
+
+        out = StringIO()
+        call_command('process_webhooks', '--once', stdout=out)
+        self.assertIn('Processed 1 webhook events', out.getvalue())
+
         self.transaction.refresh_from_db()
+        self.student.refresh_from_db()
+        event.refresh_from_db()
         self.assertEqual(self.transaction.status, 'completed')
+        self.assertEqual((self.student.fee_status, self.student.transaction_id), ('paid', 'pay_webhook123'))
+        self.assertEqual((event.status, event.attempts), (WebhookEvent.PROCESSED, 1))
+        self.assertEqual(OutboxEmail.objects.filter(kind='receipt').count(), 1)
     
-    @patch('razorpay.Client')
-    def test_webhook_signature_failure(self, mock_razorpay):
-        """Simplified test for webhook signature failure"""
-        # Transaction status should remain pending
+    def test_webhook_signature_failure(self):
+        """Test that events with a bad signature are rejected and not stored"""
+        response = self.post_event(signature='forged')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
         self.transaction.refresh_from_db()
         self.assertEqual(self.transaction.status, 'pending')
+
+    def test_redelivered_event_is_processed_once(self):
+        """Test that gateway retries of the same event id are stored and applied once"""
+        for _ in range(3):
+            self.assertEqual(self.post_event().status_code, 200)
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+        self.assertEqual(process_batch(), {'processed': 1, 'ignored': 0, 'failed': 0})
+        self.assertEqual(process_batch(), {'processed': 0, 'ignored': 0, 'failed': 0})
+        self.assertEqual(OutboxEmail.objects.filter(kind='receipt').count(), 1)
+
+    def test_unmatched_event_fails_and_can_be_replayed(self):
+        """Test that an event for an unknown order fails and is applied once the order exists"""
+        self.post_event(order_id='order_late')
+        self.post_event(event_id='evt_2', status='failed')
+        self.assertEqual(process_batch(), {'processed': 0, 'ignored': 1, 'failed': 1})
+
+        event = WebhookEvent.objects.get(event_id='evt_1')
+        self.assertEqual(event.status, WebhookEvent.FAILED)
+        self.assertIn('order_late', event.error)
+
+        self.transaction.transaction_id = 'order_late'
+        self.transaction.save()
+        out = StringIO()
+        call_command('replay_webhook_events', '--failed', '--process', stdout=out)
+        self.assertIn('Requeued 1 webhook events', out.getvalue())
+
+        event.refresh_from_db()
+        self.transaction.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), (WebhookEvent.PROCESSED, 2))
+        self.assertEqual(self.transaction.status, 'completed')
+
+        # Replaying a processed event changes nothing
+        call_command('replay_webhook_events', 'evt_1', '--process', stdout=StringIO())
+        self.assertEqual(OutboxEmail.objects.filter(kind='receipt').count(), 1)
+        self.assertEqual(WebhookEvent.objects.get(event_id='evt_1').status, WebhookEvent.PROCESSED)
+
+
+class PaymentReceiptTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.admin_user = User.objects.create_user(
+            username='adminuser',
+            password='adminpass',
+            is_staff=True
+        )
+        self.student = Student.objects.create(
+            first_name='Receipt',
+            last_name='Student',
+            roll_number='RC001',
+            email='receipt@example.com',
+            date_of_birth=date(2000, 1, 1),
+            gender='F',
+            class_name='1',
+            address='Test Address',
+            phone_number='1234567890',
+            parent_name='Parent Name'
+        )
+        self.transaction = FeeTransaction.objects.create(
+            student=self.student,
+            amount=Decimal('2500.00'),
+            status='completed',
+            transaction_id='order_receipt123',
+            description='Term Fee'
+        )
+        self.render = patch.object(receipts, 'render_receipt_pdf', wraps=receipts.render_receipt_pdf)
+        self.render_mock = self.render.start()
+        self.addCleanup(self.render.stop)
+
+    def test_receipt_is_emailed_once(self):
+        """Test that repeated sends reuse the stored PDF and queue one email"""
+        self.assertEqual(receipts.send_receipt_email(self.transaction.id)[0], True)
+        success, message = receipts.send_receipt_email(self.transaction.id)
+
+        self.assertTrue(success)
+        self.assertIn('already queued', message)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+
+        deliver_batch()
+        self.assertIn('already sent', receipts.send_receipt_email(self.transaction.id)[1])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].attachments[0][0], f'payment_receipt_{self.transaction.id}.pdf')
+        self.assertEqual(self.render_mock.call_count, 1)
+        receipt = PaymentReceipt.objects.get(transaction=self.transaction)
+        self.assertEqual((receipt.delivery_status, receipt.emailed_to), (PaymentReceipt.SENT, 'receipt@example.com'))
+
+    def test_success_page_refresh_does_not_resend(self):
+        """Test that reloading the success page neither re-renders nor re-sends"""
+        self.client.login(username='adminuser', password='adminpass')
+        for _ in range(3):
+            response = self.client.get(reverse('fees:payment_success', args=[self.transaction.id]))
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(len(mail.outbox), 0)
+        deliver_batch()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(self.render_mock.call_count, 1)
+
+    def test_changed_transaction_rerenders_without_resending(self):
+        """Test that the receipt is re-rendered when a printed value changes"""
+        receipts.send_receipt_email(self.transaction.id)
+        first = PaymentReceipt.objects.get(transaction=self.transaction)
+
+        self.transaction.description = 'Term Fee (corrected)'
+        self.transaction.save()
+        receipt, _ = receipts.get_receipt(self.transaction.id)
+
+        self.assertNotEqual(receipt.content_hash, first.content_hash)
+        self.assertEqual(self.render_mock.call_count, 2)
+        self.assertFalse(receipt.file.storage.exists(first.file.name))
+        receipts.send_receipt_email(self.transaction.id)
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=1)
+    def test_dead_lettered_receipt_can_be_requeued(self):
+        """Test that a dead-lettered receipt is marked failed and a later call queues it again"""
+        receipts.send_receipt_email(self.transaction.id)
+        with patch('django.core.mail.EmailMessage.send', side_effect=OSError('SMTP down')):
+            deliver_batch()
+        receipt = PaymentReceipt.objects.get()
+        self.assertEqual((receipt.delivery_status, receipt.delivery_error), (PaymentReceipt.FAILED, 'SMTP down'))
+
+        self.assertTrue(receipts.send_receipt_email(self.transaction.id)[0])
+        deliver_batch()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(PaymentReceipt.objects.get().delivery_status, PaymentReceipt.SENT)
+
+    def test_download_serves_stored_receipt(self):
+        """Test that the download endpoint serves the cached PDF"""
+        self.client.login(username='adminuser', password='adminpass')
+        for _ in range(2):
+            response = self.client.get(reverse('fees:download_receipt', args=[self.transaction.id]))
+            self.assertEqual(response['Content-Type'], 'application/pdf')
+            self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+        self.assertEqual(self.render_mock.call_count, 1)
+
+
+class FakeGateway:
+    """
+    In-memory stand-in for razorpay.Client covering the calls the
+    reconciliation engine makes: payment.all (with from/to/count/skip)
+    and order.payments.
+    """
+    def __init__(self, payments):
+        self.records = payments
+        self.requests = []
+        self.payment = self
+        self.order = self
+
+    def all(self, params):
+        self.requests.append(params)
+        items = [p for p in self.records if params['from'] <= p['created_at'] < params['to']]
+        return {'items': items[params['skip']:params['skip'] + params['count']]}
+
+    def payments(self, order_id):
+        return {'items': [p for p in self.records if p['order_id'] == order_id]}
+
+
+class ReconciliationTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = User.objects.create_user(username='reconcile', password='testpass', email='rec@example.com')
+        self.student = Student.objects.create(
+            user=self.user,
+            first_name='Reconcile',
+            last_name='Test',
+            roll_number='RC001',
+            email='rec@example.com',
+            fee_status='pending',
+            date_of_birth=date(2000, 1, 1),
+            gender='M',
+            class_name='1',
+            address='Test Address',
+            phone_number='1234567890',
+            parent_name='Parent Name'
+        )
+        self.now = int(timezone.now().timestamp())
+
+    def transaction(self, order_id, amount='1000.00', status='pending'):
+        return FeeTransaction.objects.create(
+            student=self.student, amount=Decimal(amount), status=status, transaction_id=order_id
+        )
+
+    def payment(self, payment_id, order_id, status, amount=100000, age=3600):
+        return {
+            'id': payment_id, 'order_id': order_id, 'status': status,
+            'amount': amount, 'created_at': self.now - age,
+        }
+
+    def run_command(self, gateway, *args):
+        out = StringIO()
+        with patch('fees.management.commands.reconcile_payments.get_gateway_client', return_value=gateway):
+            call_command('reconcile_payments', *args, stdout=out, stderr=StringIO())
+        return json.loads(out.getvalue())
+
+    def test_reconcile_range(self):
+        """Test that gateway pages are matched in one query and drift is fixed in bulk"""
+        captured = self.transaction('order_captured')
+        failed = self.transaction('order_failed')
+        short = self.transaction('order_short')
+        done = self.transaction('order_done', status='completed')
+        # 120 open orders in the first window force a second page
+        payments = [self.payment(f'pay_open{i}', f'order_open{i}', 'created') for i in range(120)]
+        payments += [
+            self.payment('pay_captured', 'order_captured', 'captured', age=30 * 3600),
+            self.payment('pay_failed', 'order_failed', 'failed'),
+            self.payment('pay_short', 'order_short', 'captured', amount=50000),
+            self.payment('pay_done', 'order_done', 'captured'),
+            self.payment('pay_stray', 'order_stray', 'captured'),
+        ]
+        gateway = FakeGateway(payments)
+
+        report = self.run_command(gateway, '--days', '2')
+
+        # Windows of at most 24 hours; the recent one is fetched in two pages
+        windows = Counter(r['from'] for r in gateway.requests)
+        self.assertGreaterEqual(len(windows), 2)
+        self.assertEqual(max(windows.values()), 2)
+        self.assertTrue(all(r['to'] - r['from'] <= 24 * 3600 for r in gateway.requests))
+        self.assertEqual(max(r['skip'] for r in gateway.requests), 100)
+
+        changes = {entry['order_id']: entry for entry in report['changes']}
+        self.assertEqual(set(changes), {'order_captured', 'order_failed', 'order_short', 'order_stray'})
+        self.assertEqual((changes['order_captured']['action'], changes['order_captured']['applied']), ('update', True))
+        self.assertEqual(changes['order_short']['action'], 'amount_mismatch')
+        self.assertEqual(changes['order_stray']['action'], 'unmatched')
+        self.assertEqual(report['summary'], {'update': 2, 'amount_mismatch': 1, 'unmatched': 1, 'applied': 2})
+
+        for transaction, status in ((captured, 'completed'), (failed, 'failed'), (short, 'pending'), (done, 'completed')):
+            transaction.refresh_from_db()
+            self.assertEqual(transaction.status, status)
+        self.student.refresh_from_db()
+        self.assertEqual((self.student.fee_status, self.student.transaction_id), ('paid', 'pay_captured'))
+        self.assertEqual(OutboxEmail.objects.filter(kind='receipt').count(), 1)
+
+        # The bulk update moved the amounts in the fee ledger as well
+        balance = StudentFeeBalance.objects.get(student=self.student)
+        self.assertEqual((balance.total_paid, balance.outstanding), (Decimal('2000.00'), Decimal('1000.00')))
+
+    def test_matching_uses_one_query(self):
+        """Test that local rows are looked up with a single query however many payments there are"""
+        for i in range(5):
+            self.transaction(f'order_{i}')
+        gateway = FakeGateway([self.payment(f'pay_{i}', f'order_{i}', 'captured') for i in range(5)])
+
+        with self.assertNumQueries(1):
+            diff = reconciliation.reconcile(gateway, timezone.now() - timedelta(days=1), timezone.now())
+        self.assertEqual(len(diff), 5)
+
+    def test_dry_run_changes_nothing(self):
+        """Test that --dry-run reports the drift without updating rows"""
+        transaction = self.transaction('order_captured')
+        gateway = FakeGateway([self.payment('pay_captured', 'order_captured', 'captured')])
+
+        report = self.run_command(gateway, '--days', '1', '--dry-run')
+
+        self.assertEqual(report['summary'], {'update': 1, 'applied': 0})
+        self.assertFalse(report['changes'][0]['applied'])
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.status, 'pending')
+
+    def test_sweep_pending(self):
+        """Test that stale pending transactions are resolved from their orders"""
+        paid = self.transaction('order_paid')
+        abandoned = self.transaction('order_abandoned')
+        recent = self.transaction('order_recent')
+        FeeTransaction.objects.filter(pk=paid.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        FeeTransaction.objects.filter(pk=abandoned.pk).update(created_at=timezone.now() - timedelta(days=2))
+        gateway = FakeGateway([
+            self.payment('pay_paid', 'order_paid', 'captured'),
+            self.payment('pay_recent', 'order_recent', 'captured'),
+        ])
+
+        report = self.run_command(gateway, '--sweep-pending')
+
+        self.assertEqual(report['mode'], 'sweep_pending')
+        self.assertEqual(
+            sorted((entry['order_id'], entry['action']) for entry in report['changes']),
+            [('order_abandoned', 'expired'), ('order_paid', 'update')]
+        )
+        for transaction, status in ((paid, 'completed'), (abandoned, 'failed'), (recent, 'pending')):
+            transaction.refresh_from_db()
+            self.assertEqual(transaction.status, status)
+
+
+class FeeLedgerTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ledger', password='ledgerpass', email='ledger@example.com')
+        self.student = Student.objects.create(
+            user=self.user,
+            first_name='Ledger',
+            last_name='Test',
+            roll_number='LG001',
+            email='ledger@example.com',
+            date_of_birth=date(2000, 1, 1),
+            gender='M',
+            class_name='1',
+            address='Test Address',
+            phone_number='1234567890',
+            parent_name='Parent Name'
+        )
+
+    def snapshot(self):
+        balances = list(StudentFeeBalance.objects.values_list(
+            'student_id', 'total_paid', 'total_refunded', 'outstanding', 'paid_count', 'last_payment_at'
+        ))
+        totals = sorted(FeeCollectionTotal.objects.values_list(
+            'period', 'period_start', 'collected', 'refunded', 'payment_count', 'refund_count'
+        ))
+        return balances, totals
+
+    def test_balance_follows_transaction_status(self):
+        """Test that completing and refunding a transaction moves its amount in the ledger"""
+        transaction = FeeTransaction.objects.create(student=self.student, amount=Decimal('2500.00'), status='pending')
+        self.assertEqual(ledger.get_balance(self.student).outstanding, Decimal('2500.00'))
+
+        transaction.status = 'completed'
+        transaction.save()
+        self.student.refresh_from_db()
+        balance = ledger.get_balance(self.student)
+        self.assertEqual((balance.total_paid, balance.outstanding, balance.paid_count), (Decimal('2500.00'), 0, 1))
+        self.assertEqual(balance.last_payment_at, transaction.completed_at)
+        totals = ledger.collection_totals()
+        self.assertEqual((totals['day'].collected, totals['month'].payment_count), (Decimal('2500.00'), 1))
+        self.assertEqual(ledger.total_revenue(), Decimal('2500.00'))
+
+        transaction.status = 'refunded'
+        transaction.save()
+        self.student.refresh_from_db()
+        balance = ledger.get_balance(self.student)
+        self.assertEqual((balance.total_paid, balance.total_refunded), (0, Decimal('2500.00')))
+        self.assertEqual(ledger.collection_totals()['day'].refunded, Decimal('2500.00'))
+        self.assertEqual(ledger.total_revenue(), 0)
+
+        transaction.delete()
+        balance = StudentFeeBalance.objects.get(student=self.student)
+        self.assertEqual((balance.total_paid, balance.total_refunded, balance.outstanding), (0, 0, 0))
+        self.assertFalse(FeeCollectionTotal.objects.exclude(collected=0, refunded=0).exists())
+
+    def test_rebuild_matches_incremental_updates(self):
+        """Test that rebuild_fee_ledger reproduces the incrementally maintained rows"""
+        for amount, status in (('1000', 'completed'), ('1500', 'completed'), ('500', 'pending'),
+                               ('700', 'failed'), ('900', 'refunded')):
+            FeeTransaction.objects.create(student=self.student, amount=Decimal(amount), status=status)
+        incremental = self.snapshot()
+
+        out = StringIO()
+        call_command('rebuild_fee_ledger', stdout=out)
+
+        self.assertIn('Rebuilt 1 student fee balances and 2 collection totals', out.getvalue())
+        self.assertEqual(self.snapshot(), incremental)
+        self.assertEqual(incremental[0][0][1:5], (Decimal('2500.00'), Decimal('900.00'), Decimal('500.00'), 2))
+
+    def test_fee_list_reads_ledger(self):
+        """Test that the fees list shows ledger totals without summing transactions"""
+        FeeTransaction.objects.create(student=self.student, amount=Decimal('1200.00'), status='completed')
+        FeeTransaction.objects.create(student=self.student, amount=Decimal('300.00'), status='pending')
+
+        self.client.login(username='ledger', password='ledgerpass')
+        response = self.client.get(reverse('fees:fee_payment_list'))
+
+        self.assertEqual(response.status_code, 200)
+        balance = response.context['balance']
+        self.assertEqual((balance.total_paid, balance.outstanding), (Decimal('1200.00'), Decimal('300.00')))
+        self.assertContains(response, '₹1200.00')
@@ -11,4 +11,5 @@ urlpatterns = [
     path('webhook/', views.webhook_handler, name='webhook_handler'),
     path('payment_success/<int:transaction_id>/', views.payment_success, name='payment_success'),
     path('payment_failure/', views.payment_failure, name='payment_failure'),
+    path('receipt/<int:transaction_id>/', views.download_receipt, name='download_receipt'),
 ] 
\ No newline at end of file
@@ -2,7 +2,6 @@
 Specialized logging utilities for the fees module
 """
 import logging
-import json
 import traceback
 from datetime import datetime
 
@@ -19,8 +18,8 @@ def log_payment_attempt(student_id, amount, user_id=None):
         user_id: ID of the user initiating the payment (if different from student)
     """
     logger.info(
-        f"Payment attempt initiated | Student ID: {student_id} | "
-        f"Amount: {amount} | User ID: {user_id or 'Same as student'}"
+        "Payment attempt initiated | Student ID: %s | Amount: %s | User ID: %s",
+        student_id, amount, user_id or 'Same as student'
     )
 
 def log_payment_success(transaction_id, payment_id, order_id, amount):
@@ -34,8 +33,8 @@ def log_payment_success(transaction_id, payment_id, order_id, amount):
         amount: Payment amount
     """
     logger.info(
-        f"Payment successful | Transaction ID: {transaction_id} | "
-        f"Payment ID: {payment_id} | Order ID: {order_id} | Amount: {amount}"
+        "Payment successful | Transaction ID: %s | Payment ID: %s | Order ID: %s | Amount: %s",
+        transaction_id, payment_id, order_id, amount
     )
 
 def log_payment_error(error_type, error_message, transaction_id=None, additional_data=None):
@@ -62,8 +61,8 @@ def log_payment_error(error_type, error_message, transaction_id=None, additional
     # Get the current traceback
     error_data['traceback'] = traceback.format_exc()
     
-    # Log as JSON for better parsing
-    logger.error(f"Payment error: {json.dumps(error_data, indent=2)}")
+    # Attach the error data as structured fields on a single-line record
+    logger.error("Payment error: %s - %s", error_type, error_message, extra={'payment_error': error_data})
 
 def log_webhook_event(event_type, event_id, order_id=None, status=None, raw_data=None):
     """
@@ -77,11 +76,10 @@ def log_webhook_event(event_type, event_id, order_id=None, status=None, raw_data
         raw_data: Raw webhook data (will be logged at debug level only)
     """
     logger.info(
-        f"Webhook event received | Type: {event_type} | "
-        f"Event ID: {event_id} | Order ID: {order_id or 'N/A'} | "
-        f"Status: {status or 'N/A'}"
+        "Webhook event received | Type: %s | Event ID: %s | Order ID: %s | Status: %s",
+        event_type, event_id, order_id or 'N/A', status or 'N/A'
     )
     
     if raw_data:
         # Log raw data at debug level to avoid cluttering normal logs
-        logger.debug(f"Webhook raw data: {json.dumps(raw_data, indent=2)}") 
\ No newline at end of file
+        logger.debug("Webhook raw data for event %s", event_id, extra={'raw_data': raw_data}) 
\ No newline at end of file
@@ -2,228 +2,280 @@ from io import BytesIO
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
-from django.core.mail import EmailMessage
+from django.core.files.base import ContentFile
 from django.conf import settings
-from django.utils import timezone
-from ..models import FeeTransaction
+from django.db import IntegrityError, transaction as db_transaction
+from ..models import FeeTransaction, PaymentReceipt
 from fees.utils.logging import log_payment_error
+from core.outbox import enqueue_email
+import hashlib
+import json
 import os
 
+# Bump when the receipt layout changes so stored receipts are re-rendered
+RECEIPT_LAYOUT_VERSION = 1
 
-def generate_payment_receipt(transaction_id):
+
+def render_receipt_pdf(transaction):
     """
-    Generate a professionally designed PDF payment receipt for a given transaction
+    Draw the PDF payment receipt of a transaction
     
     Args:
-        transaction_id: ID of the FeeTransaction
+        transaction: FeeTransaction, with its student
         
     Returns:
-        tuple: (BytesIO buffer with PDF content, transaction object)
+        BytesIO buffer with PDF content
     """
-    try:
-        transaction = FeeTransaction.objects.get(id=transaction_id)
-        student = transaction.student
-        
-        # Create PDF buffer with higher quality settings
-        buffer = BytesIO()
-        p = canvas.Canvas(buffer, pagesize=A4)
-        p.setTitle(f"Payment Receipt - {transaction.receipt_number or f'RCPT-{transaction.id}'}")
-        width, height = A4
-        
-        # Set up colors
-        primary_color = colors.HexColor('#1E5288')  # Deeper blue for headings
-        secondary_color = colors.HexColor('#4A90E2')  # Lighter blue for accents
-        border_color = colors.HexColor('#E0E0E0')  # Light gray for borders
-        
-        # Background design elements
-        # Subtle top header background
-        p.setFillColor(colors.HexColor('#F5F8FB'))
-        p.rect(0, height - 120, width, 120, fill=True, stroke=False)
-        
-        # Accent line at top
-        p.setFillColor(secondary_color)
-        p.rect(0, height - 10, width, 10, fill=True, stroke=False)
-        
-        # School logo/header
-        if hasattr(settings, 'SCHOOL_LOGO_PATH') and os.path.exists(settings.SCHOOL_LOGO_PATH):
-            # Add logo if available
-            p.drawImage(settings.SCHOOL_LOGO_PATH, 50, height - 100, width=80, height=80, mask='auto')
-            header_start = 150
-        else:
-            header_start = 50
-            
-        # School header with better typography
-        p.setFillColor(primary_color)
-        p.setFont("Helvetica-Bold", 24)
-        p.drawString(header_start, height - 50, "School Management System")
-        
-        # Add subtle watermark
-        p.saveState()
-        p.setFillColor(colors.HexColor('#F8F8F8'))
-        p.setFont("Helvetica-Bold", 80)
-        p.rotate(45)
-        p.drawCentredString(350, 100, "PAID")
-        p.restoreState()
-        
-        # Receipt title with better visual distinction
-        p.setFillColor(secondary_color)
-        p.setFont("Helvetica-Bold", 18)
-        p.drawString(header_start, height - 80, "PAYMENT RECEIPT")
-        
-        # Draw styled receipt box
-        content_top = height - 130
-        content_bottom = 100
-        content_width = width - 100
-        
-        # Receipt outline with rounded corners
-        p.setStrokeColor(border_color)
-        p.setLineWidth(1)
-        p.roundRect(50, content_bottom, content_width, content_top - content_bottom, 10, stroke=True, fill=False)
-        
-        # Receipt details in better layout (2-column design)
+    student = transaction.student
+    
+    # Create PDF buffer with higher quality settings
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4)
+    p.setTitle(f"Payment Receipt - {transaction.receipt_number or f'RCPT-{transaction.id}'}")
+    width, height = A4
+    
+    # Set up colors
+    primary_color = colors.HexColor('#1E5288')  # Deeper blue for headings
+    secondary_color = colors.HexColor('#4A90E2')  # Lighter blue for accents
+    border_color = colors.HexColor('#E0E0E0')  # Light gray for borders
+    
+    # Background design elements
+    # Subtle top header background
+    p.setFillColor(colors.HexColor('#F5F8FB'))
+    p.rect(0, height - 120, width, 120, fill=True, stroke=False)
+    
+    # Accent line at top
+    p.setFillColor(secondary_color)
+    p.rect(0, height - 10, width, 10, fill=True, stroke=False)
+    
+    # School logo/header
+    if hasattr(settings, 'SCHOOL_LOGO_PATH') and os.path.exists(settings.SCHOOL_LOGO_PATH):
+        # Add logo if available
+        p.drawImage(settings.SCHOOL_LOGO_PATH, 50, height - 100, width=80, height=80, mask='auto')
+        header_start = 150
+    else:
+        header_start = 50
+        
+    # School header with better typography
+    p.setFillColor(primary_color)
+    p.setFont("Helvetica-Bold", 24)
+    p.drawString(header_start, height - 50, "School Management System")
+    
+    # Add subtle watermark
+    p.saveState()
+    p.setFillColor(colors.HexColor('#F8F8F8'))
+    p.setFont("Helvetica-Bold", 80)
+    p.rotate(45)
+    p.drawCentredString(350, 100, "PAID")
+    p.restoreState()
+    
+    # Receipt title with better visual distinction
+    p.setFillColor(secondary_color)
+    p.setFont("Helvetica-Bold", 18)
+    p.drawString(header_start, height - 80, "PAYMENT RECEIPT")
+    
+    # Draw styled receipt box
+    content_top = height - 130
+    content_bottom = 100
+    content_width = width - 100
+    
+    # Receipt outline with rounded corners
+    p.setStrokeColor(border_color)
+    p.setLineWidth(1)
+    p.roundRect(50, content_bottom, content_width, content_top - content_bottom, 10, stroke=True, fill=False)
+    
+    # Receipt details in better layout (2-column design)
+    p.setFont("Helvetica-Bold", 11)
+    p.setFillColor(colors.black)
+    
+    # Receipt number and date in visually distinct area
+    p.setFillColor(colors.HexColor('#F8F8F8'))
+    p.rect(51, content_top - 40, content_width - 2, 40, fill=True, stroke=False)
+    
+    p.setFillColor(primary_color)
+    p.drawString(70, content_top - 15, "Receipt No:")
+    p.drawString(350, content_top - 15, "Date:")
+    
+    p.setFillColor(colors.black)
+    p.setFont("Helvetica", 11)
+    p.drawString(140, content_top - 15, f"{transaction.receipt_number or f'RCPT-{transaction.id}'}")
+    p.drawString(390, content_top - 15, f"{transaction.created_at.strftime('%d %b %Y, %I:%M %p')}")
+    
+    # Divider
+    p.setStrokeColor(border_color)
+    p.setLineWidth(1)
+    p.line(51, content_top - 60, content_width + 49, content_top - 60)
+    
+    # Two-column layout for student and payment details
+    left_col_x = 70
+    right_col_x = width/2 + 20
+    
+    # Student details - Left column
+    p.setFillColor(primary_color)
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(left_col_x, content_top - 85, "Student Details")
+    
+    p.setFillColor(colors.black)
+    details = [
+        ("Name:", f"{student.first_name} {student.last_name}"),
+        ("Roll Number:", f"{student.roll_number}"),
+        ("Class:", f"{student.get_class_name_display()}"),
+        ("Email:", f"{student.email or student.parent_email or 'N/A'}"),
+    ]
+    
+    y_position = content_top - 115
+    for label, value in details:
         p.setFont("Helvetica-Bold", 11)
-        p.setFillColor(colors.black)
-        
-        # Receipt number and date in visually distinct area
-        p.setFillColor(colors.HexColor('#F8F8F8'))
-        p.rect(51, content_top - 40, content_width - 2, 40, fill=True, stroke=False)
-        
-        p.setFillColor(primary_color)
-        p.drawString(70, content_top - 15, "Receipt No:")
-        p.drawString(350, content_top - 15, "Date:")
-        
-        p.setFillColor(colors.black)
+        p.setFillColor(colors.HexColor('#555555'))
+        p.drawString(left_col_x, y_position, label)
         p.setFont("Helvetica", 11)
-        p.drawString(140, content_top - 15, f"{transaction.receipt_number or f'RCPT-{transaction.id}'}")
-        p.drawString(390, content_top - 15, f"{transaction.created_at.strftime('%d %b %Y, %I:%M %p')}")
-        
-        # Divider
-        p.setStrokeColor(border_color)
-        p.setLineWidth(1)
-        p.line(51, content_top - 60, content_width + 49, content_top - 60)
-        
-        # Two-column layout for student and payment details
-        left_col_x = 70
-        right_col_x = width/2 + 20
-        
-        # Student details - Left column
-        p.setFillColor(primary_color)
-        p.setFont("Helvetica-Bold", 14)
-        p.drawString(left_col_x, content_top - 85, "Student Details")
-        
         p.setFillColor(colors.black)
-        details = [
-            ("Name:", f"{student.first_name} {student.last_name}"),
-            ("Roll Number:", f"{student.roll_number}"),
-            ("Class:", f"{student.get_class_name_display()}"),
-            ("Email:", f"{student.email or student.parent_email or 'N/A'}"),
-        ]
-        
-        y_position = content_top - 115
-        for label, value in details:
-            p.setFont("Helvetica-Bold", 11)
-            p.setFillColor(colors.HexColor('#555555'))
-            p.drawString(left_col_x, y_position, label)
-            p.setFont("Helvetica", 11)
-            p.setFillColor(colors.black)
-            p.drawString(left_col_x + 85, y_position, value)
-            y_position -= 25
-        
-        # Payment details - Right column
-        p.setFillColor(primary_color)
-        p.setFont("Helvetica-Bold", 14)
-        p.drawString(right_col_x, content_top - 85, "Payment Details")
-        
-        payment_details = [
-            ("Amount Paid:", f"₹{transaction.amount:,}"),
-            ("Transaction ID:", f"{transaction.transaction_id}"),
-            ("Payment Status:", "Completed"),
-            ("Payment Date:", f"{transaction.created_at.strftime('%d %b %Y')}"),
-        ]
-        
-        y_position = content_top - 115
-        for label, value in payment_details:
-            p.setFont("Helvetica-Bold", 11)
-            p.setFillColor(colors.HexColor('#555555'))
-            p.drawString(right_col_x, y_position, label)
-            p.setFont("Helvetica", 11)
-            p.setFillColor(colors.black)
-            p.drawString(right_col_x + 100, y_position, value)
-            y_position -= 25
-        
-        # Description in full width
+        p.drawString(left_col_x + 85, y_position, value)
+        y_position -= 25
+    
+    # Payment details - Right column
+    p.setFillColor(primary_color)
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(right_col_x, content_top - 85, "Payment Details")
+    
+    payment_details = [
+        ("Amount Paid:", f"₹{transaction.amount:,}"),
+        ("Transaction ID:", f"{transaction.transaction_id}"),
+        ("Payment Status:", "Completed"),
+        ("Payment Date:", f"{transaction.created_at.strftime('%d %b %Y')}"),
+    ]
+    
+    y_position = content_top - 115
+    for label, value in payment_details:
         p.setFont("Helvetica-Bold", 11)
         p.setFillColor(colors.HexColor('#555555'))
-        p.drawString(70, content_top - 225, "Description:")
+        p.drawString(right_col_x, y_position, label)
         p.setFont("Helvetica", 11)
         p.setFillColor(colors.black)
-        
-        # Handle multiline description
-        description = transaction.description or 'School Fee Payment'
-        description_width = content_width - 100
-        description_lines = []
-        
-        # Simple text wrapping
-        words = description.split()
-        current_line = ""
-        
-        for word in words:
-            test_line = current_line + " " + word if current_line else word
-            if p.stringWidth(test_line, "Helvetica", 11) < description_width:
-                current_line = test_line
-            else:
-                description_lines.append(current_line)
-                current_line = word
-                
-        if current_line:
+        p.drawString(right_col_x + 100, y_position, value)
+        y_position -= 25
+    
+    # Description in full width
+    p.setFont("Helvetica-Bold", 11)
+    p.setFillColor(colors.HexColor('#555555'))
+    p.drawString(70, content_top - 225, "Description:")
+    p.setFont("Helvetica", 11)
+    p.setFillColor(colors.black)
+    
+    # Handle multiline description
+    description = transaction.description or 'School Fee Payment'
+    description_width = content_width - 100
+    description_lines = []
+    
+    # Simple text wrapping
+    words = description.split()
+    current_line = ""
+    
+    for word in words:
+        test_line = current_line + " " + word if current_line else word
+        if p.stringWidth(test_line, "Helvetica", 11) < description_width:
+            current_line = test_line
+        else:
             description_lines.append(current_line)
+            current_line = word
             
-        desc_y = content_top - 225
-        for line in description_lines:
-            p.drawString(160, desc_y, line)
-            desc_y -= 20
-        
-       
-        
-        # Verification text
-        p.setFont("Helvetica", 9)
-        p.drawCentredString(width - 90, content_bottom + 10, "Scan to verify")
-        
-        # Footer with improved layout
-        p.setFillColor(colors.HexColor('#F5F8FB'))
-        p.rect(0, 0, width, 80, fill=True, stroke=False)
-        
-        p.setFillColor(colors.HexColor('#555555'))
-        p.setFont("Helvetica-Bold", 9)
-        p.drawString(60, 55, "This is a computer-generated receipt and does not require a signature.")
+    if current_line:
+        description_lines.append(current_line)
         
-        p.setFont("Helvetica", 9)
-        p.drawString(60, 40, "For any queries, please contact the school administration at:")
-        p.setFillColor(secondary_color)
-        p.drawString(60, 25, getattr(settings, 'SCHOOL_CONTACT_EMAIL', 'kotadiyavaidik10@gmail.com'))
-        
-        # School stamp/seal (placeholder circle)
-        p.setStrokeColor(secondary_color)
-        p.setLineWidth(1.5)
-        p.circle(width - 100, 40, 25, stroke=True, fill=False)
-        p.setFont("Helvetica-Bold", 7)
-        p.setFillColor(secondary_color)
-        p.drawCentredString(width - 100, 42, "SCHOOL")
-        p.drawCentredString(width - 100, 35, "SEAL")
-        
-        # Draw a subtle bottom border
-        p.setFillColor(secondary_color)
-        p.rect(0, 0, width, 5, fill=True, stroke=False)
-        
-        # Save PDF
-        p.showPage()
-        p.save()
-        buffer.seek(0)
-        
-        return buffer, transaction
+    desc_y = content_top - 225
+    for line in description_lines:
+        p.drawString(160, desc_y, line)
+        desc_y -= 20
+    
+   
+    
+    # Verification text
+    p.setFont("Helvetica", 9)
+    p.drawCentredString(width - 90, content_bottom + 10, "Scan to verify")
+    
+    # Footer with improved layout
+    p.setFillColor(colors.HexColor('#F5F8FB'))
+    p.rect(0, 0, width, 80, fill=True, stroke=False)
     
+    p.setFillColor(colors.HexColor('#555555'))
+    p.setFont("Helvetica-Bold", 9)
+    p.drawString(60, 55, "This is a computer-generated receipt and does not require a signature.")
+    
+    p.setFont("Helvetica", 9)
+    p.drawString(60, 40, "For any queries, please contact the school administration at:")
+    p.setFillColor(secondary_color)
+    p.drawString(60, 25, getattr(settings, 'SCHOOL_CONTACT_EMAIL', 'kotadiyavaidik10@gmail.com'))
+    
+    # School stamp/seal (placeholder circle)
+    p.setStrokeColor(secondary_color)
+    p.setLineWidth(1.5)
+    p.circle(width - 100, 40, 25, stroke=True, fill=False)
+    p.setFont("Helvetica-Bold", 7)
+    p.setFillColor(secondary_color)
+    p.drawCentredString(width - 100, 42, "SCHOOL")
+    p.drawCentredString(width - 100, 35, "SEAL")
+    
+    # Draw a subtle bottom border
+    p.setFillColor(secondary_color)
+    p.rect(0, 0, width, 5, fill=True, stroke=False)
+    
+    # Save PDF
+    p.showPage()
+    p.save()
+    buffer.seek(0)
+    
+    return buffer
+
+def receipt_content_hash(transaction):
+    """
+    SHA-256 of every value printed on a transaction's receipt
+    """
+    student = transaction.student
+    values = [
+        RECEIPT_LAYOUT_VERSION,
+        transaction.id,
+        transaction.receipt_number,
+        transaction.created_at.isoformat(),
+        str(transaction.amount),
+        transaction.transaction_id,
+        transaction.description,
+        student.first_name,
+        student.last_name,
+        student.roll_number,
+        student.class_name,
+        student.email or student.parent_email,
+        getattr(settings, 'SCHOOL_CONTACT_EMAIL', None),
+        getattr(settings, 'SCHOOL_LOGO_PATH', None),
+    ]
+    return hashlib.sha256(json.dumps(values).encode()).hexdigest()
+
+def get_receipt(transaction_id):
+    """
+    Return the stored receipt of a transaction, rendering it only if it does
+    not exist yet or something printed on it has changed
+    
+    Args:
+        transaction_id: ID of the FeeTransaction
+        
+    Returns:
+        tuple: (PaymentReceipt, transaction object)
+    """
+    try:
+        transaction = FeeTransaction.objects.select_related('student', 'receipt').get(id=transaction_id)
     except FeeTransaction.DoesNotExist:
         raise ValueError(f"Transaction with ID {transaction_id} not found")
+    
+    content_hash = receipt_content_hash(transaction)
+    try:
+        receipt = transaction.receipt
+    except PaymentReceipt.DoesNotExist:
+        receipt = PaymentReceipt(transaction=transaction)
+    
+    if receipt.pk and receipt.content_hash == content_hash and receipt.file.storage.exists(receipt.file.name):
+        return receipt, transaction
+    
+    try:
+        buffer = render_receipt_pdf(transaction)
     except Exception as e:
         log_payment_error(
             error_type='receipt_generation',
@@ -231,19 +283,43 @@ def generate_payment_receipt(transaction_id):
             transaction_id=transaction_id
         )
         raise
+    
+    old_name = receipt.file.name
+    receipt.content_hash = content_hash
+    receipt.file.save(f'receipt_{transaction.id}_{content_hash[:16]}.pdf', ContentFile(buffer.getvalue()), save=False)
+    try:
+        with db_transaction.atomic():
+            receipt.save()
+    except IntegrityError:
+        # Rendered concurrently by another request; keep the stored one
+        receipt.file.storage.delete(receipt.file.name)
+        return PaymentReceipt.objects.get(transaction=transaction), transaction
+    
+    if old_name and old_name != receipt.file.name:
+        receipt.file.storage.delete(old_name)
+    return receipt, transaction
 
 def send_receipt_email(transaction_id):
     """
-    Generate and send a receipt email for a transaction
+    Queue the receipt email for a transaction, once
+    
+    The stored receipt is attached and the email outbox delivers it (see
+    core.outbox). Later calls, for example from a refresh of the success
+    page or from the webhook, do not queue it again.
     
     Args:
         transaction_id: ID of the FeeTransaction
         
     Returns:
-        bool: True if email was sent successfully, False otherwise
+        tuple: (True if the receipt is sent or on its way, message)
     """
     try:
-        buffer, transaction = generate_payment_receipt(transaction_id)
+        receipt, transaction = get_receipt(transaction_id)
+        if receipt.delivery_status == PaymentReceipt.SENT:
+            return True, f"Receipt already sent to {receipt.emailed_to}"
+        if receipt.delivery_status == PaymentReceipt.SENDING:
+            return True, f"Receipt already queued for {receipt.emailed_to}"
+        
         student = transaction.student
         
         # Determine recipient email
@@ -251,21 +327,25 @@ def send_receipt_email(transaction_id):
         if not recipient_email:
             return False, "No email address available for student"
         
-        # Create email
-        subject = f"Payment Receipt - {student.first_name} {student.last_name}"
-        email_message = EmailMessage(
-            subject=subject,
-            body=f"Dear {student.first_name} {student.last_name},\n\nThank you for your payment. Please find attached the receipt for your recent fee payment of ₹{transaction.amount}.\n\nRegards,\nSchool Management System",
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[recipient_email],
-        )
-        
-        # Attach PDF
-        email_message.attach(f'payment_receipt_{transaction.id}.pdf', buffer.getvalue(), 'application/pdf')
-        
-        # Send email
-        email_message.send(fail_silently=False)
-        return True, f"Receipt sent to {recipient_email}"
+        with db_transaction.atomic():
+            # Claim the delivery so concurrent callers do not queue it twice
+            claimed = PaymentReceipt.objects.filter(
+                pk=receipt.pk,
+                delivery_status__in=[PaymentReceipt.PENDING, PaymentReceipt.FAILED]
+            ).update(delivery_status=PaymentReceipt.SENDING, emailed_to=recipient_email)
+            if not claimed:
+                return True, "Receipt is already being sent"
+            
+            with receipt.file.open('rb') as pdf:
+                email = enqueue_email(
+                    subject=f"Payment Receipt - {student.first_name} {student.last_name}",
+                    body=f"Dear {student.first_name} {student.last_name},\n\nThank you for your payment. Please find attached the receipt for your recent fee payment of ₹{transaction.amount}.\n\nRegards,\nSchool Management System",
+                    to=[recipient_email],
+                    attachment=(f'payment_receipt_{transaction.id}.pdf', pdf.read(), 'application/pdf'),
+                    kind='receipt',
+                )
+            PaymentReceipt.objects.filter(pk=receipt.pk).update(email=email, delivery_error='')
+        return True, f"Receipt queued for {recipient_email}"
     
     except Exception as e:
         log_payment_error(
@@ -273,4 +353,4 @@ def send_receipt_email(transaction_id):
             error_message=str(e),
             transaction_id=transaction_id
         )
-        return False, str(e) 
\ No newline at end of file
+        return False, str(e)
@@ -1,5 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
@@ -7,6 +7,7 @@ from django.contrib import messages
 from django.utils import timezone
 from django.urls import reverse
 from django.contrib.auth import authenticate, login
+from django.db import transaction as db_transaction
 
 from .models import FeeTransaction
 from students.models import Student
@@ -17,7 +18,9 @@ from fees.utils.logging import (
     log_payment_error,
     log_webhook_event
 )
-from .utils.receipts import send_receipt_email
+from .ledger import collection_totals, get_balance
+from .utils.receipts import get_receipt, send_receipt_email
+from .webhooks import event_id_for, store_event
 
 import razorpay
 import json
@@ -40,11 +43,15 @@ def fee_payment_list(request):
     if hasattr(request, 'user_type') and request.user_type == 'student':
         student = request.student
         transactions = FeeTransaction.objects.filter(student=student).order_by('-created_at')
+        # Totals come from the fee ledger rather than summing the transactions
+        context = {'balance': get_balance(student)}
     else:
         # For teachers and admins, show all transactions
         transactions = FeeTransaction.objects.all().order_by('-created_at')
+        context = {'collections': collection_totals()}
     
-    return render(request, 'fees/transaction_list.html', {'transactions': transactions})
+    context['transactions'] = transactions
+    return render(request, 'fees/transaction_list.html', context)
 
 @login_required
 def initiate_payment(request, student_id=None):
@@ -218,16 +225,16 @@ def payment_callback(request):
                         messages.error(request, 'Transaction not found')
                         return redirect('fees:payment_failure')
                 
-                # Update transaction
-                transaction.status = 'completed'
-                transaction.save()
-                
-                # Update student fee status
-                student = transaction.student
-                student.fee_status = 'paid'
-                student.last_payment_date = timezone.now().date()
-                student.transaction_id = razorpay_payment_id
-                student.save()
+                # Update transaction, student fee status and the fee ledger together
+                with db_transaction.atomic():
+                    transaction.status = 'completed'
+                    transaction.save()
+                    
+                    student = transaction.student
+                    student.fee_status = 'paid'
+                    student.last_payment_date = timezone.now().date()
+                    student.transaction_id = razorpay_payment_id
+                    student.save()
                 
                 # Log successful payment
                 log_payment_success(
@@ -271,8 +278,9 @@ def payment_callback(request):
 @csrf_exempt
 def webhook_handler(request):
     """
-    Webhook handler for direct server notifications from Razorpay
-    This provides a more reliable way to capture payment status
+    Webhook handler for direct server notifications from Razorpay.
+    Verified events are stored in the webhook inbox and acknowledged at once;
+    the process_webhooks command applies them (see fees.webhooks).
     """
     if request.method == 'POST':
         try:
@@ -281,7 +289,7 @@ def webhook_handler(request):
             
             # Extract key information for logging
             event_type = data.get('event', 'unknown')
-            event_id = data.get('id', 'no_id')
+            event_id = event_id_for(request.body, data, request.headers.get('X-Razorpay-Event-Id', ''))
             
             # Log webhook event
             log_webhook_event(
@@ -304,7 +312,6 @@ def webhook_handler(request):
                     webhook_signature, 
                     settings.RAZORPAY_WEBHOOK_SECRET
                 )
-                logger.info("Webhook signature verified successfully")
             except Exception as e:
                 log_payment_error(
                     error_type='webhook_signature_verification',
@@ -316,81 +323,10 @@ def webhook_handler(request):
                 )
                 return HttpResponse('Invalid signature', status=400)
             
-            # Process payment event
-            logger.info(f"Processing webhook event: {event_type}")
-            
-            if event_type == 'payment.authorized' or event_type == 'payment.captured':
-                payment_entity = data.get('payload', {}).get('payment', {}).get('entity', {})
-                order_id = payment_entity.get('order_id')
-                payment_id = payment_entity.get('id')
-                status = payment_entity.get('status')
-                
-                # Update log with more payment details
-                log_webhook_event(
-                    event_type=event_type,
-                    event_id=event_id,
-                    order_id=order_id,
-                    status=status
-                )
-                
-                if status == 'captured' and order_id:
-                    try:
-                        # Update transaction
-                        transaction = FeeTransaction.objects.get(transaction_id=order_id)
-                        if transaction.status != 'completed':
-                            transaction.status = 'completed'
-                            transaction.save()
-                            
-                            # Update student fee status
-                            student = transaction.student
-                            student.fee_status = 'paid'
-                            student.last_payment_date = timezone.now().date()
-                            student.transaction_id = payment_id
-                            student.save()
-                            
-                            # Log successful payment
-                            log_payment_success(
-                                transaction_id=transaction.id,
-                                payment_id=payment_id,
-                                order_id=order_id,
-                                amount=transaction.amount
-                            )
-                            
-                            # Generate and send payment receipt via email
-                            try:
-                                success, message = send_receipt_email(transaction.id)
-                                if success:
-                                    logger.info(f"Webhook: Payment receipt sent for transaction {transaction.id}: {message}")
-                                else:
-                                    logger.warning(f"Webhook: Could not send receipt for transaction {transaction.id}: {message}")
-                            except Exception as e:
-                                # Just log the error, don't interrupt webhook processing
-                                log_payment_error(
-                                    error_type='webhook_receipt_sending',
-                                    error_message=str(e),
-                                    transaction_id=transaction.id
-                                )
-                                logger.error(f"Failed to send receipt in webhook: {str(e)}")
-                            
-                            # Return a success response
-                            response_data = {
-                                'status': 'success',
-                                'message': 'Payment successfully processed',
-                                'transaction_id': transaction.id
-                            }
-                        else:
-                            logger.info(f"Transaction {transaction.id} already completed")
-                    except FeeTransaction.DoesNotExist:
-                        log_payment_error(
-                            error_type='webhook_transaction_not_found',
-                            error_message=f"Transaction with order ID {order_id} not found",
-                            additional_data={
-                                'event_type': event_type,
-                                'event_id': event_id,
-                                'order_id': order_id,
-                                'payment_id': payment_id
-                            }
-                        )
+            # Store the event once; redeliveries are acknowledged without processing again
+            event, created = store_event(event_id, data)
+            if not created:
+                logger.info(f"Webhook event {event_id} already received ({event.status})")
             
             return HttpResponse('Webhook received', status=200)
             
@@ -410,11 +346,11 @@ def webhook_handler(request):
 def payment_success(request, transaction_id):
     transaction = get_object_or_404(FeeTransaction, id=transaction_id)
     
-    # Try to send payment receipt
+    # Send the payment receipt; the stored receipt is emailed only once
     try:
         success, message = send_receipt_email(transaction_id)
         if success:
-            messages.success(request, f"Payment receipt has been sent to your email.")
+            messages.success(request, f"Your payment receipt will be emailed to you shortly.")
         else:
             messages.warning(request, f"Payment successful, but receipt could not be sent: {message}")
     except Exception as e:
@@ -427,6 +363,30 @@ def payment_success(request, transaction_id):
     
     return render(request, 'fees/payment_success.html', {'transaction': transaction})
 
+@login_required
+def download_receipt(request, transaction_id):
+    """Download the stored PDF receipt of a completed transaction"""
+    transaction = get_object_or_404(FeeTransaction, id=transaction_id, status='completed')
+    
+    # Students may only download their own receipts
+    if hasattr(request, 'user_type') and request.user_type == 'student':
+        if transaction.student_id != request.student.id:
+            messages.error(request, "You can only download your own receipts.")
+            return redirect('fees:fee_payment_list')
+    
+    try:
+        receipt, transaction = get_receipt(transaction.id)
+    except Exception as e:
+        messages.error(request, f"Could not generate the receipt: {str(e)}")
+        return redirect('fees:fee_payment_list')
+    
+    return FileResponse(
+        receipt.file.open('rb'),
+        as_attachment=True,
+        filename=f'payment_receipt_{transaction.id}.pdf',
+        content_type='application/pdf'
+    )
+
 @login_required
 def payment_failure(request):
     logger.info("Displaying payment failure page")
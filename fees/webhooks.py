@@ -0,0 +1,172 @@
+"""
+Razorpay webhook inbox: the view stores, the process_webhooks worker acts.
+
+webhook_handler verifies the signature, records the event with
+store_event() and answers 200 straight away, so the gateway never times
+out and retries. process_batch() claims received events and applies them
+with the fee transaction row locked; a transaction that is already
+completed is left alone, so replaying an event is harmless.
+"""
+import hashlib
+import logging
+
+from django.db import connection, transaction as db_transaction
+from django.utils import timezone
+
+from .models import FeeTransaction, WebhookEvent
+from .utils.logging import log_payment_error, log_payment_success, log_webhook_event
+from .utils.receipts import send_receipt_email
+
+logger = logging.getLogger('fees')
+
+PAYMENT_EVENTS = ('payment.authorized', 'payment.captured')
+
+
+class EventNotApplicable(Exception):
+    """The event is valid but there is nothing to do for it"""
+
+
+def event_id_for(body, data, header_id=''):
+    """
+    Razorpay sends the event id in the X-Razorpay-Event-Id header; fall back
+    to an id in the payload, then to a hash of the body so that identical
+    redeliveries still collapse into one event.
+    """
+    return header_id or data.get('id') or f"sha256:{hashlib.sha256(body).hexdigest()}"
+
+
+def store_event(event_id, data):
+    """
+    Record a verified event. Returns (event, created); a redelivered event
+    returns the stored row with created=False.
+    """
+    return WebhookEvent.objects.get_or_create(
+        event_id=event_id,
+        defaults={'event_type': data.get('event', 'unknown'), 'payload': data},
+    )
+
+
+def release_stale_claims(older_than):
+    """
+    Put events left in 'processing' by a worker that died back on the queue.
+    """
+    return WebhookEvent.objects.filter(
+        status=WebhookEvent.PROCESSING, claimed_at__lt=timezone.now() - older_than
+    ).update(status=WebhookEvent.RECEIVED)
+
+
+def claim_batch(batch_size):
+    """
+    Mark up to `batch_size` received events as processing and return them,
+    oldest first. Rows locked by another worker are skipped where supported.
+    """
+    now = timezone.now()
+    with db_transaction.atomic():
+        pending = WebhookEvent.objects.filter(status=WebhookEvent.RECEIVED).order_by('received_at', 'pk')
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        ids = list(pending.values_list('pk', flat=True)[:batch_size])
+        WebhookEvent.objects.filter(pk__in=ids).update(status=WebhookEvent.PROCESSING, claimed_at=now)
+    return list(WebhookEvent.objects.filter(pk__in=ids).order_by('received_at', 'pk'))
+
+
+def apply_payment_event(event):
+    """
+    Complete the transaction of a captured payment. Returns the transaction
+    if this event completed it, or None if it was already completed.
+    """
+    payment = event.payload.get('payload', {}).get('payment', {}).get('entity', {})
+    order_id = payment.get('order_id')
+    payment_id = payment.get('id')
+    status = payment.get('status')
+
+    log_webhook_event(event_type=event.event_type, event_id=event.event_id, order_id=order_id, status=status)
+    if status != 'captured' or not order_id:
+        raise EventNotApplicable(f"Payment status is {status or 'missing'}")
+
+    with db_transaction.atomic():
+        try:
+            transaction = FeeTransaction.objects.select_for_update().get(transaction_id=order_id)
+        except FeeTransaction.DoesNotExist:
+            raise LookupError(f"Transaction with order ID {order_id} not found")
+        if transaction.status == 'completed':
+            logger.info(f"Transaction {transaction.id} already completed")
+            return None
+
+        transaction.status = 'completed'
+        transaction.save()
+
+        student = transaction.student
+        student.fee_status = 'paid'
+        student.last_payment_date = timezone.now().date()
+        student.transaction_id = payment_id
+        student.save()
+
+    log_payment_success(
+        transaction_id=transaction.id,
+        payment_id=payment_id,
+        order_id=order_id,
+        amount=transaction.amount
+    )
+    return transaction
+
+
+def process_event(event):
+    """
+    Apply one claimed event and record the outcome on it.
+    """
+    event.attempts += 1
+    event.error = ''
+    try:
+        if event.event_type not in PAYMENT_EVENTS:
+            raise EventNotApplicable(f"No handler for {event.event_type}")
+        transaction = apply_payment_event(event)
+    except EventNotApplicable as e:
+        event.status = WebhookEvent.IGNORED
+        event.error = str(e)
+    except Exception as e:
+        event.status = WebhookEvent.FAILED
+        event.error = str(e)
+        log_payment_error(
+            error_type='webhook_processing',
+            error_message=str(e),
+            additional_data={'event_type': event.event_type, 'event_id': event.event_id}
+        )
+    else:
+        event.status = WebhookEvent.PROCESSED
+        if transaction is not None:
+            # Queues the email; send_receipt_email never queues a receipt twice
+            try:
+                success, message = send_receipt_email(transaction.id)
+                if not success:
+                    logger.warning(f"Webhook: Could not send receipt for transaction {transaction.id}: {message}")
+            except Exception as e:
+                log_payment_error(
+                    error_type='webhook_receipt_sending',
+                    error_message=str(e),
+                    transaction_id=transaction.id
+                )
+    event.processed_at = timezone.now()
+    event.save(update_fields=['status', 'attempts', 'error', 'processed_at'])
+    return event.status
+
+
+def process_batch(batch_size=50):
+    """
+    Process one batch of received events. Returns the number of events that
+    ended in each status.
+    """
+    counts = {WebhookEvent.PROCESSED: 0, WebhookEvent.IGNORED: 0, WebhookEvent.FAILED: 0}
+    for event in claim_batch(batch_size):
+        counts[process_event(event)] += 1
+    return counts
+
+
+def requeue_events(events):
+    """
+    Put processed, ignored or failed events back on the queue for replay.
+    Returns the number of events requeued.
+    """
+    return events.exclude(status=WebhookEvent.PROCESSING).update(
+        status=WebhookEvent.RECEIVED, claimed_at=None, processed_at=None
+    )
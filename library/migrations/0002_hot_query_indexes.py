@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 12:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0001_initial'),
+        ('school_teachers', '0001_initial'),
+        ('students', '0002_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookissue',
+            index=models.Index(fields=['status', 'due_date'], name='bookissue_status_due_idx'),
+        ),
+    ]
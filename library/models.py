@@ -83,3 +83,5 @@ class BookIssue(models.Model):
 
     class Meta:
         ordering = ['-issue_date']
+        # Overdue lookups filter on status and due date
+        indexes = [models.Index(fields=['status', 'due_date'], name='bookissue_status_due_idx')]
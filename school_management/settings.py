@@ -100,6 +100,30 @@ DATABASES = {
 }
 print('DATABASE_URL:', os.environ.get('DATABASE_URL'))
 
+# Cache shared by all workers (see core.caching for the namespaced keys).
+# With REDIS_URL set (needs the redis package) the networked Redis backend is
+# used; otherwise CACHE_BACKEND/CACHE_LOCATION pick a local one, the file
+# cache by default, or DatabaseCache with a table made by `createcachetable`.
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHE_BACKEND = 'django.core.cache.backends.redis.RedisCache'
+    CACHE_LOCATION = REDIS_URL
+else:
+    CACHE_BACKEND = config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache')
+    CACHE_LOCATION = config('CACHE_LOCATION', default=os.path.join(BASE_DIR, 'cache'))
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+        'KEY_PREFIX': config('CACHE_KEY_PREFIX', default='school'),
+        'TIMEOUT': 5 * 60,
+    }
+}
+
+# Runs the tests against a fresh in-memory cache (see core.test_runner)
+TEST_RUNNER = 'core.test_runner.LocMemCacheTestRunner'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -137,6 +161,12 @@ WHITENOISE_MAX_AGE = 31536000  # 1 year
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Who sends protected files such as student documents (core.file_serving):
+# 'django' streams them from the worker, 'nginx' hands them to an internal
+# nginx location with X-Accel-Redirect, 'sendfile' uses X-Sendfile
+FILE_SERVING_MODE = config('FILE_SERVING_MODE', default='django')
+FILE_SERVING_INTERNAL_PREFIX = config('FILE_SERVING_INTERNAL_PREFIX', default='/protected-media/')
+
 # Authentication
 USE_X_FORWARDED_HOST = True
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -150,7 +180,10 @@ SESSION_SAVE_EVERY_REQUEST = True
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 
 # Email configuration
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Use django.core.mail.backends.console.EmailBackend or .filebased.EmailBackend
+# (with EMAIL_FILE_PATH) to run the outbox worker without SMTP
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=os.path.join(BASE_DIR, 'sent_emails'))
 EMAIL_HOST = 'smtp.gmail.com'  
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -159,7 +192,26 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL')  
 ADMIN_EMAIL = config('ADMIN_EMAIL')
 
+# Email outbox: requests only queue mail, `manage.py send_queued_email` delivers it
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5  # then the message is dead-lettered
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = 30  # doubles after every failed attempt
+EMAIL_OUTBOX_RETRY_MAX_SECONDS = 60 * 60
+
+# Signup and password reset OTPs (core.otp); `manage.py sweep_otps` removes expired ones
+OTP_TTL_SECONDS = 10 * 60
+OTP_MAX_ATTEMPTS = 5
+
 # Logging
+# File handlers are queue based: request threads only enqueue records and a
+# background listener writes them, one JSON object per line, to rotating files.
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024  # 10 MB
+LOG_FILE_BACKUP_COUNT = 5
+
+APP_LOGGERS = (
+    'core', 'students', 'school_teachers', 'subjects', 'events', 'timetable',
+    'library', 'attendance', 'documents', 'user_type',
+)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -168,15 +220,42 @@ LOGGING = {
             'format': '%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(funcName)s - %(message)s',
             'datefmt': '%Y-%m-%d %H:%M:%S',
         },
+        'json': {
+            '()': 'core.logging_handlers.JSONFormatter',
+        },
     },
     'handlers': {
         'fees_file': {
-            'class': 'logging.FileHandler',
+            'class': 'core.logging_handlers.QueuedRotatingFileHandler',
             'filename': os.path.join(LOGS_DIR, 'fees.log'),
-            'formatter': 'fees_formatter',
+            'formatter': 'json',
             'level': 'DEBUG',
-            'encoding': 'utf-8',
-            'mode': 'a',
+            'maxBytes': LOG_FILE_MAX_BYTES,
+            'backupCount': LOG_FILE_BACKUP_COUNT,
+        },
+        'api_file': {
+            'class': 'core.logging_handlers.QueuedRotatingFileHandler',
+            'filename': os.path.join(LOGS_DIR, 'api.log'),
+            'formatter': 'json',
+            'level': 'INFO',
+            'maxBytes': LOG_FILE_MAX_BYTES,
+            'backupCount': LOG_FILE_BACKUP_COUNT,
+        },
+        'slow_requests_file': {
+            'class': 'core.logging_handlers.QueuedRotatingFileHandler',
+            'filename': os.path.join(LOGS_DIR, 'slow_requests.log'),
+            'formatter': 'json',
+            'level': 'WARNING',
+            'maxBytes': 5 * 1024 * 1024,  # 5 MB
+            'backupCount': 3,
+        },
+        'app_file': {
+            'class': 'core.logging_handlers.QueuedRotatingFileHandler',
+            'filename': os.path.join(LOGS_DIR, 'app.log'),
+            'formatter': 'json',
+            'level': 'INFO',
+            'maxBytes': LOG_FILE_MAX_BYTES,
+            'backupCount': LOG_FILE_BACKUP_COUNT,
         },
         'fees_console': {
             'class': 'logging.StreamHandler',
@@ -190,13 +269,43 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        'api': {
+            'handlers': ['api_file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'api.slow_requests': {
+            'handlers': ['slow_requests_file'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        **{
+            name: {
+                'handlers': ['app_file'],
+                'level': config('APP_LOG_LEVEL', default='INFO'),
+                'propagate': False,
+            }
+            for name in APP_LOGGERS
+        },
     },
     'root': {
-        'handlers': [],
+        'handlers': ['app_file'],
         'level': 'WARNING',
     },
 }
 
+# Requests slower than this (in milliseconds) are written to logs/slow_requests.log
+SLOW_REQUEST_THRESHOLD_MS = config('SLOW_REQUEST_THRESHOLD_MS', default=500, cast=int)
+
+# How much each attendance status counts towards attendance percentages
+# (used by attendance.stats for every report, calendar and dashboard)
+ATTENDANCE_PERCENTAGE_POLICY = {
+    'present': 1,
+    'late': 1,
+    'half_day': 0.5,
+    'absent': 0,
+}
+
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -230,5 +339,6 @@ SIMPLE_JWT = {
 # Razorpay Configuration
 RAZORPAY_KEY_ID = config('RAZORPAY_KEY_ID') 
 RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET')  
+RAZORPAY_WEBHOOK_SECRET = config('RAZORPAY_WEBHOOK_SECRET', default='')
 RAZORPAY_CURRENCY = config('RAZORPAY_CURRENCY', default='INR')
 RAZORPAY_DEBUG = config('RAZORPAY_DEBUG', default=False, cast=bool)
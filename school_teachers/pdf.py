@@ -0,0 +1,86 @@
+"""
+ReportLab rendering of the all-teachers roster.
+
+Rendered by the background PDF worker (see core.pdf_jobs), not in the request.
+"""
+from io import BytesIO
+
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle
+
+from .models import Teacher
+
+
+def render_all_teachers_pdf():
+    """
+    Return the all-teachers report as PDF bytes.
+    """
+    teachers = Teacher.objects.all().order_by('first_name')
+    
+    # Create a BytesIO buffer for the PDF
+    buffer = BytesIO()
+    width, height = A4
+    margin = 50
+    p = canvas.Canvas(buffer, pagesize=A4)
+
+    # Define color palette
+    primary_color = colors.HexColor('#2B579A')    # School blue
+    light_gray = colors.HexColor('#F2F2F2')       # Background gray
+
+    # Title and header
+    p.setFillColor(primary_color)
+    p.setFont("Helvetica-Bold", 24)
+    p.drawString(margin, height - 60, "All Teachers Report")
+    p.setFont("Helvetica", 14)
+    p.drawString(margin, height - 80, f"Generated on: {timezone.now().strftime('%d %B %Y %H:%M')}")
+    p.drawString(margin, height - 100, f"Total Teachers: {teachers.count()}")
+
+    # Table data
+    data = [["ID", "Name", "Employee ID", "Specialization", "Email", "Phone"]]
+    
+    for teacher in teachers:
+        data.append([
+            str(teacher.id),
+            f"{teacher.first_name} {teacher.last_name}",
+            teacher.employee_id,
+            teacher.specialization,
+            teacher.email,
+            teacher.phone_number
+        ])
+    
+    # Set up table
+    table = Table(data, colWidths=[30, 100, 80, 100, 120, 100])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), primary_color),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 10),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, light_gray])
+    ]))
+    
+    # Draw table
+    table.wrapOn(p, width - 2*margin, height)
+    table.drawOn(p, margin, height - 150)
+    
+    # Footer
+    p.setFont("Helvetica", 8)
+    p.drawString(margin, 20, "This is a computer-generated document. For official records only.")
+    
+    # Finalize and save PDF
+    p.showPage()
+    p.save()
+    
+    pdf = buffer.getvalue()
+    buffer.close()
+    
+    return pdf
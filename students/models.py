@@ -76,3 +76,4 @@ class Student(models.Model):
 
     class Meta:
         ordering = ['class_name', 'roll_number']
+        indexes = [models.Index(fields=['class_name', 'is_active'], name='student_class_active_idx')]
@@ -12,13 +12,14 @@ from reportlab.lib.units import inch
 from django.utils import timezone
 import os
 from django.conf import settings
-from reportlab.platypus import Table, TableStyle
 from reportlab.lib.utils import ImageReader
 import qrcode
 from io import BytesIO
 from django.db.models import Count, Q
 from datetime import date, timedelta, datetime
 from core.decorators import teacher_required, student_required, admin_required
+from core.models import PDFJob
+from core.pdf_jobs import pdf_job_redirect, request_pdf
 
 
 
@@ -214,74 +215,6 @@ def generate_student_pdf(request, pk):
 
 @login_required
 def generate_all_students_pdf(request):
-    students = Student.objects.all().order_by('class_name', 'first_name')
-    
-    # Create a BytesIO buffer for the PDF
-    buffer = BytesIO()
-    width, height = A4
-    margin = 50
-    p = canvas.Canvas(buffer, pagesize=A4)
-
-    # Define color palette
-    primary_color = colors.HexColor('#2B579A')    # School blue
-    light_gray = colors.HexColor('#F2F2F2')       # Background gray
-
-    # Title and header
-    p.setFillColor(primary_color)
-    p.setFont("Helvetica-Bold", 24)
-    p.drawString(margin, height - 60, "All Students Report")
-    p.setFont("Helvetica", 14)
-    p.drawString(margin, height - 80, f"Generated on: {timezone.now().strftime('%d %B %Y %H:%M')}")
-    p.drawString(margin, height - 100, f"Total Students: {students.count()}")
-
-    # Table data
-    data = [["ID", "Name", "Roll Number", "Class", "Gender", "Phone"]]
-    
-    for student in students:
-        data.append([
-            str(student.id),
-            f"{student.first_name} {student.last_name}",
-            student.roll_number,
-            student.get_class_name_display(),
-            student.get_gender_display(),
-            student.phone_number
-        ])
-    
-    # Set up table
-    table = Table(data, colWidths=[30, 120, 80, 60, 60, 100])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), primary_color),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, light_gray])
-    ]))
-    
-    # Draw table
-    table.wrapOn(p, width - 2*margin, height)
-    table.drawOn(p, margin, height - 150)
-    
-    # Footer
-    p.setFont("Helvetica", 8)
-    p.drawString(margin, 20, "This is a computer-generated document. For official records only.")
-    
-    # Finalize and save PDF
-    p.showPage()
-    p.save()
-    
-    pdf = buffer.getvalue()
-    buffer.close()
-    
-    # Create response
-    filename = f"all_students_report_{timezone.now().strftime('%Y%m%d')}.pdf"
-    response = HttpResponse(pdf, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    # Rendered by the run_pdf_jobs worker; an unchanged roster is served from the stored file
+    job = request_pdf(PDFJob.STUDENTS_ALL, user=request.user)
+    return pdf_job_redirect(job)
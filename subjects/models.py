@@ -50,8 +50,11 @@ class StudentMark(models.Model):
     def __str__(self):
         return f"{self.student.first_name} {self.student.last_name} - {self.subject.name} - {self.marks_obtained}/{self.total_marks}"
     
-    def save(self, *args, **kwargs):
-        # Calculate percentage
+    def calculate_result(self):
+        """
+        Set percentage and grade from marks_obtained and total_marks.
+        Called from save(); bulk inserts call it directly since they bypass save().
+        """
         if self.total_marks > 0:
             # Convert to float for the calculation to ensure proper division
             marks_float = float(self.marks_obtained)
@@ -75,5 +78,7 @@ class StudentMark(models.Model):
         else:
             self.percentage = 0
             self.grade = 'E'
-            
+
+    def save(self, *args, **kwargs):
+        self.calculate_result()
         super().save(*args, **kwargs)
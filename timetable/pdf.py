@@ -0,0 +1,302 @@
+"""
+ReportLab rendering of the class and teacher timetables.
+
+Rendered by the background PDF worker (see core.pdf_jobs), not in the request.
+"""
+from io import BytesIO
+
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle, Paragraph
+
+from .models import TimeTable
+
+
+def group_by_day(timetables):
+    """
+    {day: {period: entry}} for easy display.
+    """
+    timetable_by_day = {}
+    for entry in timetables:
+        if entry.day not in timetable_by_day:
+            timetable_by_day[entry.day] = {}
+        timetable_by_day[entry.day][entry.period] = entry
+    return timetable_by_day
+
+
+def render_class_timetable_pdf(class_name):
+    """
+    Return the weekly timetable of one class as PDF bytes.
+    """
+    timetables = TimeTable.objects.filter(class_name=class_name).select_related(
+        'subject', 'teacher'
+    ).order_by('day', 'period')
+    timetable_by_day = group_by_day(timetables)
+    
+    # Get the class name display value
+    class_display = dict(TimeTable.CLASS_CHOICES).get(class_name, class_name)
+    
+    buffer = BytesIO()
+    width, height = landscape(A4)  # Use landscape for timetable
+    margin = 50
+    p = canvas.Canvas(buffer, pagesize=landscape(A4))
+    
+    # Define styles for cell content
+    styles = getSampleStyleSheet()
+    cell_style = ParagraphStyle(
+        'CellStyle',
+        parent=styles['Normal'],
+        fontSize=8,
+        alignment=TA_CENTER,
+        leading=10  # Line spacing
+    )
+    
+    # Define color palette
+    primary_color = colors.HexColor('#2B579A')    # School blue
+    light_gray = colors.HexColor('#F2F2F2')       # Background gray
+    header_bg = colors.HexColor('#2B579A')        # Header background
+    header_text = colors.white                    # Header text color
+    
+    # Add an eye-catching header at the top of the page
+    # Draw a colored rectangle as background for the header
+    p.setFillColor(header_bg)
+    p.rect(0, height - 100, width, 100, fill=1, stroke=0)
+    
+    # Add title text on the colored background
+    p.setFillColor(header_text)
+    p.setFont("Helvetica-Bold", 32)
+    p.drawCentredString(width/2, height - 45, "CLASS TIMETABLE")
+    p.setFont("Helvetica-Bold", 24)
+    p.drawCentredString(width/2, height - 75, f"{class_display}")
+    
+    # Add a thin decorative line under the header
+    p.setStrokeColor(colors.HexColor('#FFD700'))  # Gold color line
+    p.setLineWidth(3)
+    p.line(margin, height - 110, width - margin, height - 110)
+    
+    # Title and info section with prominent class name
+    p.setFillColor(primary_color)
+    p.setFont("Helvetica-Bold", 18)
+    p.drawString(margin, height - 140, f"Schedule for Class {class_display}")
+    
+    # Add school name and section
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(margin, height - 160, "School Management System")
+    
+    # Add generation details
+    p.setFont("Helvetica", 10)
+    p.drawString(margin, height - 180, f"Generated on: {timezone.now().strftime('%d %B %Y %H:%M')}")
+    
+    # Create table header (period, days)
+    data = [["Period"]]
+    for day_id, day_name in TimeTable.DAY_CHOICES:
+        data[0].append(day_name)
+    
+    # Fill table data with Paragraph objects for proper text wrapping
+    for period_id, period_name in TimeTable.PERIOD_CHOICES:
+        row = [period_name]
+        for day_id, day_name in TimeTable.DAY_CHOICES:
+            entry = timetable_by_day.get(day_id, {}).get(period_id, None)
+            if entry:
+                cell_text = f"{entry.subject.name}<br/>{entry.teacher.first_name} {entry.teacher.last_name}<br/>Room: {entry.room_number}<br/>{entry.start_time.strftime('%H:%M')} - {entry.end_time.strftime('%H:%M')}"
+                row.append(Paragraph(cell_text, cell_style))
+            else:
+                row.append(Paragraph("-", cell_style))
+        data.append(row)
+    
+    # Set up table with appropriate dimensions
+    # Calculate available space
+    available_height = height - 200  # Top margin + header
+    
+    # Calculate row heights and column widths dynamically
+    num_rows = len(data)
+    row_height = min(50, available_height / (num_rows + 1))  # +1 for header
+    
+    col_widths = [60]  # Period column
+    day_width = (width - 2*margin - 60) / len(TimeTable.DAY_CHOICES)
+    col_widths.extend([day_width] * len(TimeTable.DAY_CHOICES))
+    
+    # Set row heights
+    row_heights = [30]  # Header row
+    row_heights.extend([row_height] * (len(data) - 1))
+    
+    # Create the table
+    table = Table(data, colWidths=col_widths, rowHeights=row_heights)
+    
+    # Style the table
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), primary_color),
+        ('BACKGROUND', (0, 1), (0, -1), primary_color),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('TEXTCOLOR', (0, 1), (0, -1), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('FONTSIZE', (0, 1), (0, -1), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ROWBACKGROUNDS', (1, 1), (-1, -1), [colors.white, light_gray])
+    ]))
+    
+    # Position at the top of the space, leaving room for header
+    y_position = height - 200 - (row_height * num_rows)
+    y_position = max(y_position, 50)  # Ensure it doesn't go below bottom margin
+    
+    # Draw table
+    table.wrapOn(p, width - 2*margin, height)
+    table.drawOn(p, margin, y_position)
+    
+    # Footer
+    p.setFont("Helvetica", 8)
+    p.drawString(margin, 30, "This is a computer-generated document. For official records only.")
+    p.drawString(width - 150, 30, f"Class {class_display} Timetable")
+    
+    # Finalize and save PDF
+    p.showPage()
+    p.save()
+    
+    pdf = buffer.getvalue()
+    buffer.close()
+    
+    return pdf
+
+
+def render_teacher_timetable_pdf(teacher):
+    """
+    Return the weekly timetable of one teacher as PDF bytes.
+    """
+    timetables = TimeTable.objects.filter(teacher=teacher).select_related('subject').order_by('day', 'period')
+    timetable_by_day = group_by_day(timetables)
+    
+    buffer = BytesIO()
+    width, height = landscape(A4)  # Use landscape for timetable
+    margin = 50
+    p = canvas.Canvas(buffer, pagesize=landscape(A4))
+    
+    # Define styles for cell content
+    styles = getSampleStyleSheet()
+    cell_style = ParagraphStyle(
+        'CellStyle',
+        parent=styles['Normal'],
+        fontSize=8,
+        alignment=TA_CENTER,
+        leading=10  # Line spacing
+    )
+    
+    # Define color palette
+    primary_color = colors.HexColor('#2B579A')    # School blue
+    light_gray = colors.HexColor('#F2F2F2')       # Background gray
+    header_bg = colors.HexColor('#2B579A')        # Header background
+    header_text = colors.white                    # Header text color
+    
+    # Add an eye-catching header at the top of the page
+    # Draw a colored rectangle as background for the header
+    p.setFillColor(header_bg)
+    p.rect(0, height - 100, width, 100, fill=1, stroke=0)
+    
+    # Add title text on the colored background
+    p.setFillColor(header_text)
+    p.setFont("Helvetica-Bold", 32)
+    teacher_name = f"{teacher.first_name} {teacher.last_name}".upper()
+    p.drawCentredString(width/2, height - 45, "TEACHER TIMETABLE")
+    p.setFont("Helvetica-Bold", 24)
+    p.drawCentredString(width/2, height - 75, f"{teacher_name}")
+    
+    # Add a thin decorative line under the header
+    p.setStrokeColor(colors.HexColor('#FFD700'))  # Gold color line
+    p.setLineWidth(3)
+    p.line(margin, height - 110, width - margin, height - 110)
+    
+    # Title and info section with prominent teacher name
+    p.setFillColor(primary_color)
+    p.setFont("Helvetica-Bold", 18)
+    p.drawString(margin, height - 140, f"Schedule for {teacher.first_name} {teacher.last_name}")
+    
+    # Add school name and teacher details
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(margin, height - 160, "School Management System")
+    
+    # Add teacher role and ID
+    p.setFont("Helvetica", 10)
+    p.drawString(margin, height - 180, f"Teacher ID: {teacher.employee_id}")
+    p.drawString(margin, height - 195, f"Specialization: {teacher.specialization}")
+    p.drawString(margin + 350, height - 180, f"Generated on: {timezone.now().strftime('%d %B %Y %H:%M')}")
+    
+    # Create table header (period, days)
+    data = [["Period"]]
+    for day_id, day_name in TimeTable.DAY_CHOICES:
+        data[0].append(day_name)
+    
+    # Fill table data with Paragraph objects for proper text wrapping
+    for period_id, period_name in TimeTable.PERIOD_CHOICES:
+        row = [period_name]
+        for day_id, day_name in TimeTable.DAY_CHOICES:
+            entry = timetable_by_day.get(day_id, {}).get(period_id, None)
+            if entry:
+                cell_text = f"Class: {entry.get_class_name_display()}<br/>{entry.subject.name}<br/>Room: {entry.room_number}<br/>{entry.start_time.strftime('%H:%M')} - {entry.end_time.strftime('%H:%M')}"
+                row.append(Paragraph(cell_text, cell_style))
+            else:
+                row.append(Paragraph("-", cell_style))
+        data.append(row)
+    
+    # Set up table with appropriate dimensions
+    # Calculate available space
+    available_height = height - 210  # Top margin + header + teacher info
+    
+    # Calculate row heights and column widths dynamically
+    num_rows = len(data)
+    row_height = min(50, available_height / (num_rows + 1))  # +1 for header
+    
+    col_widths = [60]  # Period column
+    day_width = (width - 2*margin - 60) / len(TimeTable.DAY_CHOICES)
+    col_widths.extend([day_width] * len(TimeTable.DAY_CHOICES))
+    
+    # Set row heights
+    row_heights = [30]  # Header row
+    row_heights.extend([row_height] * (len(data) - 1))
+    
+    # Create the table
+    table = Table(data, colWidths=col_widths, rowHeights=row_heights)
+    
+    # Style the table
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), primary_color),
+        ('BACKGROUND', (0, 1), (0, -1), primary_color),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('TEXTCOLOR', (0, 1), (0, -1), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('FONTSIZE', (0, 1), (0, -1), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ROWBACKGROUNDS', (1, 1), (-1, -1), [colors.white, light_gray])
+    ]))
+    
+    # Position at the top of the space, leaving room for header and teacher info
+    y_position = height - 210 - (row_height * num_rows)
+    y_position = max(y_position, 50)  # Ensure it doesn't go below bottom margin
+    
+    # Draw table
+    table.wrapOn(p, width - 2*margin, height)
+    table.drawOn(p, margin, y_position)
+    
+    # Footer
+    p.setFont("Helvetica", 8)
+    p.drawString(margin, 30, "This is a computer-generated document. For official records only.")
+    p.drawString(width - 200, 30, f"{teacher.first_name} {teacher.last_name}'s Timetable")
+    
+    # Finalize and save PDF
+    p.showPage()
+    p.save()
+    
+    pdf = buffer.getvalue()
+    buffer.close()
+    
+    return pdf